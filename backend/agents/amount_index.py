@@ -0,0 +1,52 @@
+# File: backend/agents/amount_index.py
+import numpy as np
+from typing import Dict
+
+
+class AmountIndex:
+    """
+    Sorted integer-cents index over a set of rows. Range queries (exact,
+    absolute or percentage tolerance) are two binary searches, O(log n).
+    """
+
+    def __init__(self, cents: np.ndarray, rows: np.ndarray = None):
+        # `rows` are the positions the amounts belong to (all rows by default)
+        cents = np.asarray(cents, dtype=np.int64)
+        rows = np.arange(len(cents)) if rows is None else np.asarray(rows)
+        order = np.argsort(cents, kind="stable")
+        self.cents = cents[order]
+        self.rows = rows[order]
+
+    def __len__(self) -> int:
+        return len(self.cents)
+
+    def range(self, lo: int, hi: int) -> np.ndarray:
+        """
+        Returns the rows whose amount lies in [lo, hi] cents, ordered by amount.
+        """
+        start = np.searchsorted(self.cents, lo, side="left")
+        end = np.searchsorted(self.cents, hi, side="right")
+        return self.rows[start:end]
+
+    def near(self, cents: int, tolerance_cents: int) -> np.ndarray:
+        return self.range(cents - tolerance_cents, cents + tolerance_cents)
+
+
+def partition(keys: np.ndarray, cents: np.ndarray, rows: np.ndarray) -> Dict[int, AmountIndex]:
+    """
+    One AmountIndex per distinct key (e.g. a vendor/currency code), so a
+    range query only returns rows with the caller's key.
+    """
+    order = np.argsort(keys, kind="stable")
+    keys, cents, rows = keys[order], cents[order], rows[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else []
+    ends = np.r_[starts[1:], len(keys)] if len(keys) else []
+    return {int(keys[s]): AmountIndex(cents[s:e], rows[s:e]) for s, e in zip(starts, ends)}
+
+
+def tolerance_cents(cents: int, abs_tolerance: float, pct_tolerance: float) -> int:
+    """
+    Allowed difference for an amount: the larger of the absolute tolerance
+    (currency units) and the percentage tolerance of the amount.
+    """
+    return max(int(round(abs_tolerance * 100)), int(abs(cents) * pct_tolerance / 100))
@@ -1,19 +1,72 @@
 # File: backend/agents/audit_agent.py
 from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 from .models import ReconciliationState
+from .audit_sink import AGENT_VERSION, AuditSink, hash_prompt
 
 class AuditAgent:
-    def record_activity(self, state: ReconciliationState):
+    def __init__(self, sink: Optional[AuditSink] = None):
+        # Without a sink the trail is only kept on the state
+        self.sink = sink
+
+    def item_statuses(self, customer_id: str,
+                      matches: List[Dict[str, Any]]) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """
+        Current status of the invoices and payments in `matches` (those not
+        persisted yet), as ({invoice_id: status}, {payment_id: status}).
+        """
+        from db.connection import pooled_connection
+
+        wanted = [m for m in matches if m.get('status') != 'PERSISTED']
+        found = ({}, {})
+        with pooled_connection() as conn:
+            with conn.cursor() as cursor:
+                for statuses, table, column, default in ((found[0], "invoices", "invoice_id", "PENDING"),
+                                                         (found[1], "payments", "payment_id", "UNMATCHED")):
+                    ids = sorted({m[column] for m in wanted})
+                    for start in range(0, len(ids), 500):
+                        binds = {f"id{n}": i for n, i in enumerate(ids[start:start + 500])}
+                        cursor.execute(
+                            f"SELECT {column}, NVL(status, '{default}') FROM {table} WHERE customer_id = :cid "
+                            f"AND {column} IN ({', '.join(':' + name for name in binds)})",
+                            {"cid": customer_id, **binds}
+                        )
+                        statuses.update(cursor.fetchall())
+        return found
+
+    def record_activity(self, state: ReconciliationState,
+                        statuses: Optional[Tuple[Dict[str, str], Dict[str, str]]] = None):
         """
         Creates an immutable-ready record of all agent decisions.
+        `statuses` (see item_statuses) are recorded as each match's
+        previous_state.
         """
-        # This would normally write to the Oracle 'audit_trail' table
+        # The rules and settings that produced this run's decisions
+        decision_hash = hash_prompt(state.context.settings.model_dump_json())
         for match in state.matches:
+            # Already audited when it was persisted
+            if match.get('status') == 'PERSISTED': continue
+            entity_id = f"{match['invoice_id']}:{match['payment_id']}"
             state.audit_trail.append({
                 "entity_type": "MATCH",
-                "entity_id": f"{match['invoice_id']}:{match['payment_id']}",
+                "entity_id": entity_id,
                 "action": "AUTO_MATCH",
                 "confidence": match['confidence'],
+                "agent_version": AGENT_VERSION,
                 "timestamp": str(datetime.now())
             })
+            if self.sink is not None:
+                # Buffered; written to the Oracle 'audit_trail' table off this thread
+                self.sink.record(
+                    customer_id=state.context.customer_id,
+                    entity_type="MATCH",
+                    entity_id=entity_id,
+                    action="AUTO_MATCH",
+                    previous_state=None if statuses is None else {
+                        "invoice_status": statuses[0].get(match['invoice_id']),
+                        "payment_status": statuses[1].get(match['payment_id']),
+                    },
+                    new_state=dict(match),
+                    prompt_hash=decision_hash,
+                )
         return state
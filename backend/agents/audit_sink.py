@@ -0,0 +1,326 @@
+# File: backend/agents/audit_sink.py
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+# Stored in audit_trail.agent_version for every agent-written record
+AGENT_VERSION = "1.4.0"
+
+INSERT_AUDIT_SQL = (
+    "INSERT INTO audit_trail (customer_id, entity_type, entity_id, action, operator_id, previous_state, new_state, "
+    "agent_version, prompt_hash, timestamp, chain_hash) "
+    "VALUES (:cid, :etype, :eid, :action, :op, :prev, :new, :ver, :phash, :ts, :chain)"
+)
+
+# audit_chain_heads holds each customer's newest chain_hash. Writers lock the
+# row (the UPDATE) before reading it and move it in the same transaction, so
+# concurrent writers in any process append to the chain one at a time.
+LOCK_HEAD_SQL = "UPDATE audit_chain_heads SET updated_at = CURRENT_TIMESTAMP WHERE customer_id = :1"
+SEED_HEAD_SQL = (
+    "INSERT INTO audit_chain_heads (customer_id, chain_hash) VALUES (:1, "
+    "(SELECT chain_hash FROM audit_trail WHERE customer_id = :2 AND chain_hash IS NOT NULL "
+    "ORDER BY audit_id DESC FETCH FIRST 1 ROWS ONLY))"
+)
+SELECT_HEAD_SQL = "SELECT chain_hash FROM audit_chain_heads WHERE customer_id = :1"
+MOVE_HEAD_SQL = "UPDATE audit_chain_heads SET chain_hash = :1 WHERE customer_id = :2"
+
+# Chained fields, in hashing order
+CHAIN_FIELDS = ("customer_id", "entity_type", "entity_id", "action", "operator_id",
+                "previous_state", "new_state", "agent_version", "prompt_hash", "timestamp")
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def canonical_json(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        # JSON columns come back as text from some drivers
+        value = json.loads(value)
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=_json_default)
+
+
+def hash_prompt(text: str) -> str:
+    """
+    SHA-256 of the prompt (or rule configuration) that produced a decision.
+    """
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def chain_hash(previous_hash: Optional[str], record: Dict[str, Any]) -> str:
+    """
+    Hash of a record linked to the hash of the customer's previous record,
+    so changing or deleting any row breaks every hash after it.
+    """
+    payload = [previous_hash or ""]
+    for field in CHAIN_FIELDS:
+        value = record.get(field)
+        if field in ("previous_state", "new_state"):
+            value = canonical_json(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat(" ")
+        payload.append(value)
+    return hashlib.sha256(json.dumps(payload, separators=(",", ":")).encode()).hexdigest()
+
+
+def make_record(customer_id: str, entity_type: str, entity_id: str, action: str,
+                operator_id: str = "system-agent", previous_state: Optional[dict] = None,
+                new_state: Optional[dict] = None, prompt_hash: Optional[str] = None,
+                agent_version: str = AGENT_VERSION) -> Dict[str, Any]:
+    return {
+        "customer_id": customer_id,
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "action": action,
+        "operator_id": operator_id,
+        "previous_state": previous_state,
+        "new_state": new_state,
+        "agent_version": agent_version,
+        "prompt_hash": prompt_hash,
+        # Set here (not by the database) so it is part of the chained content
+        "timestamp": datetime.now(),
+    }
+
+
+def _lock_heads(cursor, customer_ids) -> Dict[str, Optional[str]]:
+    """
+    Locks the chain head of each customer (in a fixed order, so two writers
+    cannot deadlock) until the caller's commit or rollback, and returns the
+    hashes to chain from. A missing head is seeded from the customer's
+    newest chained record.
+    """
+    last = {}
+    for cid in sorted(customer_ids):
+        cursor.execute(LOCK_HEAD_SQL, [cid])
+        if cursor.rowcount == 0:
+            try:
+                cursor.execute(SEED_HEAD_SQL, [cid, cid])
+            except Exception:
+                # Another writer seeded it first; wait for its lock instead
+                cursor.execute(LOCK_HEAD_SQL, [cid])
+                if cursor.rowcount == 0:
+                    raise
+        cursor.execute(SELECT_HEAD_SQL, [cid])
+        last[cid] = cursor.fetchone()[0]
+    return last
+
+
+def write_records(cursor, records: List[Dict[str, Any]], chunk_size: int = 1000) -> int:
+    """
+    Chains `records` (see make_record) onto each customer's newest stored
+    record and inserts them on `cursor`, in order. Every audit_trail write
+    goes through here; the caller commits, so records can share a
+    transaction with the change they describe.
+    """
+    if not records:
+        return 0
+    last = _lock_heads(cursor, {r["customer_id"] for r in records})
+    rows = []
+    for r in records:
+        last[r["customer_id"]] = chain = chain_hash(last[r["customer_id"]], r)
+        rows.append({
+            "cid": r["customer_id"], "etype": r["entity_type"], "eid": r["entity_id"],
+            "action": r["action"], "op": r["operator_id"],
+            "prev": canonical_json(r["previous_state"]), "new": canonical_json(r["new_state"]),
+            "ver": r["agent_version"], "phash": r["prompt_hash"], "ts": r["timestamp"],
+            "chain": chain,
+        })
+    for start in range(0, len(rows), chunk_size):
+        cursor.executemany(INSERT_AUDIT_SQL, rows[start:start + chunk_size])
+    cursor.executemany(MOVE_HEAD_SQL, [[chain, cid] for cid, chain in last.items()])
+    return len(rows)
+
+
+class AuditSink:
+    """
+    Buffers audit records and writes them to `audit_trail` in array inserts
+    from a background thread, when `max_batch` records are waiting or the
+    oldest has waited `flush_interval_s`. `flush()` writes everything
+    buffered so far; call it at the end of a run.
+
+    Each record's `chain_hash` covers its content and the previous chained
+    record of the same customer, so a tamper check can start from any
+    trusted hash instead of rescanning the table (see verify_chain).
+    """
+
+    def __init__(self, max_batch: int = 1000, flush_interval_s: float = 1.0):
+        self.max_batch = max_batch
+        self.flush_interval_s = flush_interval_s
+        self._buffer: List[Dict[str, Any]] = []
+        self._oldest: Optional[float] = None
+        self._cond = threading.Condition()
+        # Serialises flushes so records are chained and inserted in order
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self.stats = {"recorded": 0, "written": 0, "flushes": 0, "errors": 0, "last_error": None}
+        self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+        self._thread.start()
+
+    def record(self, customer_id: str, entity_type: str, entity_id: str, action: str,
+               operator_id: str = "system-agent", previous_state: Optional[dict] = None,
+               new_state: Optional[dict] = None, prompt_hash: Optional[str] = None,
+               agent_version: str = AGENT_VERSION) -> Dict[str, Any]:
+        """
+        Queues one record; never touches the database on the caller's thread.
+        """
+        rec = make_record(customer_id, entity_type, entity_id, action, operator_id, previous_state,
+                          new_state, prompt_hash, agent_version)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Audit sink is closed")
+            self._buffer.append(rec)
+            self.stats["recorded"] += 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if len(self._buffer) >= self.max_batch:
+                self._cond.notify()
+        return rec
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._buffer)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if len(self._buffer) >= self.max_batch:
+                        break
+                    if self._oldest is not None:
+                        wait = self._oldest + self.flush_interval_s - time.monotonic()
+                        if wait <= 0:
+                            break
+                    else:
+                        wait = None
+                    self._cond.wait(wait)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception:
+                # Kept in the buffer and retried; see stats["last_error"]
+                time.sleep(self.flush_interval_s)
+
+    def flush(self) -> int:
+        """
+        Writes every buffered record (chunks of `max_batch`) in one
+        transaction. On failure the records stay buffered and the error is
+        re-raised. Returns the number of records written.
+        """
+        from db.connection import pooled_connection
+
+        with self._flush_lock:
+            with self._cond:
+                batch, self._buffer, self._oldest = self._buffer, [], None
+            if not batch:
+                return 0
+            try:
+                with pooled_connection() as conn:
+                    with conn.cursor() as cursor:
+                        write_records(cursor, batch, self.max_batch)
+                    conn.commit()
+            except Exception as e:
+                with self._cond:
+                    self._buffer[:0] = batch
+                    if self._oldest is None:
+                        self._oldest = time.monotonic()
+                self.stats["errors"] += 1
+                self.stats["last_error"] = str(e)
+                print(f"Audit flush failed ({len(batch)} records kept): {e}")
+                raise
+            self.stats["written"] += len(batch)
+            self.stats["flushes"] += 1
+            return len(batch)
+
+    def close(self):
+        """
+        Stops the background thread after a final flush.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+
+
+def verify_chain(customer_id: str, after_audit_id: Optional[int] = None,
+                 previous_hash: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Recomputes the customer's chain from a checkpoint (`after_audit_id` and
+    its trusted `previous_hash`; by default from the first record) and
+    reports the first record whose stored hash does not match. Records
+    without a chain_hash are only accepted before the chain starts (rows
+    written before chaining existed); after that they fail the check.
+    """
+    from db.connection import iter_query
+
+    query = ("SELECT audit_id, customer_id, entity_type, entity_id, action, operator_id, previous_state, new_state, "
+             "agent_version, prompt_hash, timestamp, chain_hash FROM audit_trail "
+             "WHERE customer_id = :cid")
+    params = {"cid": customer_id}
+    if after_audit_id is not None:
+        query += " AND audit_id > :after"
+        params["after"] = after_audit_id
+    query += " ORDER BY audit_id"
+
+    checked, last_id = 0, after_audit_id
+    started = after_audit_id is not None
+    for rows in iter_query(query, params):
+        for row in rows:
+            record = dict(zip(("audit_id",) + CHAIN_FIELDS + ("chain_hash",), row))
+            if record["chain_hash"] is None and not started:
+                continue
+            started = True
+            expected = chain_hash(previous_hash, record)
+            if expected != record["chain_hash"]:
+                return {"valid": False, "checked": checked, "broken_at": record["audit_id"], "last_valid_id": last_id,
+                        "reason": "unchained record" if record["chain_hash"] is None else "hash mismatch"}
+            previous_hash, last_id = expected, record["audit_id"]
+            checked += 1
+    return {"valid": True, "checked": checked, "last_audit_id": last_id, "last_hash": previous_hash}
+
+
+_sink: Optional[AuditSink] = None
+_sink_lock = threading.Lock()
+
+
+def get_audit_sink() -> AuditSink:
+    """
+    Returns the process-wide audit sink, starting it on first use.
+    AUDIT_BATCH_SIZE and AUDIT_FLUSH_INTERVAL_S tune the flush thresholds.
+    """
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = AuditSink(
+                    max_batch=int(os.getenv("AUDIT_BATCH_SIZE", "1000")),
+                    flush_interval_s=float(os.getenv("AUDIT_FLUSH_INTERVAL_S", "1.0")),
+                )
+    return _sink
+
+
+def close_audit_sink():
+    global _sink
+    with _sink_lock:
+        sink, _sink = _sink, None
+    if sink is not None:
+        sink.close()
+
+
+# Records buffered when the process exits normally are still written
+atexit.register(close_audit_sink)
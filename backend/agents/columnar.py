@@ -0,0 +1,266 @@
+# File: backend/agents/columnar.py
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Sequence
+import numpy as np
+
+from .models import Invoice, Payment
+
+# Dates are kept at microsecond precision so they round-trip to `datetime`
+DATE_DTYPE = "datetime64[us]"
+
+
+def to_cents(amounts: Sequence[float]) -> np.ndarray:
+    """
+    Converts decimal amounts to int64 cents.
+    """
+    return np.rint(np.asarray(amounts, dtype=np.float64) * 100).astype(np.int64)
+
+
+@dataclass
+class DictionaryColumn:
+    """
+    Dictionary-encoded string column: one int32 code per row pointing into
+    an array of distinct values. Code -1 marks a missing (None) value.
+    """
+    codes: np.ndarray
+    values: np.ndarray
+
+    @classmethod
+    def encode(cls, items: Iterable[Optional[str]]) -> "DictionaryColumn":
+        lookup = {}
+        codes = np.fromiter(
+            (-1 if v is None else lookup.setdefault(v, len(lookup)) for v in items),
+            dtype=np.int32
+        )
+        values = np.empty(len(lookup), dtype=object)
+        values[:] = list(lookup)
+        return cls(codes=codes, values=values)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        code = self.codes[i]
+        return None if code < 0 else self.values[code]
+
+    def decode(self) -> np.ndarray:
+        """
+        Returns an object array of the row values (None where missing).
+        The strings are shared with `values`, not copied.
+        """
+        table = np.empty(len(self.values) + 1, dtype=object)
+        table[:-1] = self.values
+        return table[self.codes]
+
+    def tolist(self) -> List[Optional[str]]:
+        return self.decode().tolist()
+
+    def take(self, rows: np.ndarray) -> "DictionaryColumn":
+        """
+        Returns the given rows, sharing this column's dictionary.
+        """
+        return DictionaryColumn(codes=self.codes[rows], values=self.values)
+
+    def codes_for(self, items: Iterable[str]) -> np.ndarray:
+        """
+        Returns the codes of the given strings that occur in this column.
+        """
+        lookup = {v: i for i, v in enumerate(self.values)}
+        return np.array([lookup[v] for v in items if v in lookup], dtype=np.int32)
+
+    @classmethod
+    def concat(cls, columns: Sequence["DictionaryColumn"]) -> "DictionaryColumn":
+        """
+        Concatenates columns, merging their dictionaries.
+        """
+        lookup = {}
+        parts = []
+        for col in columns:
+            remap = np.empty(len(col.values) + 1, dtype=np.int32)
+            remap[:-1] = [lookup.setdefault(v, len(lookup)) for v in col.values]
+            remap[-1] = -1 # code -1 (missing) indexes the last slot
+            parts.append(remap[col.codes])
+        values = np.empty(len(lookup), dtype=object)
+        values[:] = list(lookup)
+        codes = np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+        return cls(codes=codes, values=values)
+
+    def map_values(self, fn: Callable[[str], str]) -> "DictionaryColumn":
+        """
+        Applies `fn` once per distinct value instead of once per row.
+        """
+        values = np.empty(len(self.values), dtype=object)
+        values[:] = [fn(v) for v in self.values]
+        return DictionaryColumn(codes=self.codes, values=values)
+
+
+@dataclass
+class InvoiceBatch:
+    """
+    Columnar representation of a tenant's invoices.
+    """
+    invoice_id: DictionaryColumn
+    amount_cents: np.ndarray
+    currency: DictionaryColumn
+    vendor_name: DictionaryColumn
+    po_number: DictionaryColumn
+    invoice_date: np.ndarray
+
+    # Column order of the intake query
+    FIELDS = ("invoice_id", "amount", "currency", "vendor_name", "po_number", "invoice_date")
+
+    def __len__(self) -> int:
+        return len(self.amount_cents)
+
+    @property
+    def amount(self) -> np.ndarray:
+        return self.amount_cents / 100
+
+    @classmethod
+    def from_columns(cls, invoice_id, amount, currency, vendor_name, po_number, invoice_date,
+                     cents: bool = False) -> "InvoiceBatch":
+        return cls(
+            invoice_id=DictionaryColumn.encode(invoice_id),
+            amount_cents=np.asarray(amount, dtype=np.int64) if cents else to_cents(amount),
+            currency=DictionaryColumn.encode(currency),
+            vendor_name=DictionaryColumn.encode(vendor_name),
+            po_number=DictionaryColumn.encode(po_number),
+            invoice_date=np.array(invoice_date, dtype=DATE_DTYPE),
+        )
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[tuple], cents: bool = False) -> "InvoiceBatch":
+        """
+        Builds a batch from intake query rows (see FIELDS) without creating
+        one model per row. `cents=True` when the amount column is already
+        integer cents.
+        """
+        columns = list(zip(*rows)) if rows else [()] * len(cls.FIELDS)
+        return cls.from_columns(*columns, cents=cents)
+
+    @classmethod
+    def concat(cls, batches: Sequence["InvoiceBatch"]) -> "InvoiceBatch":
+        """
+        Concatenates batches (e.g. streamed intake chunks) into one.
+        """
+        return cls(**{
+            name: DictionaryColumn.concat([getattr(b, name) for b in batches])
+            if isinstance(getattr(batches[0], name), DictionaryColumn)
+            else np.concatenate([getattr(b, name) for b in batches])
+            for name in cls.__dataclass_fields__
+        }) if batches else cls.from_rows([])
+
+    def take(self, rows: Sequence[int]) -> "InvoiceBatch":
+        """
+        Sub-batch of the given row positions (e.g. one page of a result).
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        return InvoiceBatch(**{
+            name: getattr(self, name).take(rows) if isinstance(getattr(self, name), DictionaryColumn)
+            else getattr(self, name)[rows]
+            for name in self.__dataclass_fields__
+        })
+
+    @classmethod
+    def from_models(cls, invoices: Sequence[Invoice]) -> "InvoiceBatch":
+        return cls.from_columns(
+            [i.invoice_id for i in invoices], [i.amount for i in invoices], [i.currency for i in invoices],
+            [i.vendor_name for i in invoices], [i.po_number for i in invoices], [i.invoice_date for i in invoices]
+        )
+
+    def to_models(self) -> List[Invoice]:
+        return [Invoice(
+            invoice_id=iid, amount=amt, currency=cur, vendor_name=vname,
+            po_number=pno, invoice_date=idat
+        ) for iid, amt, cur, vname, pno, idat in zip(
+            self.invoice_id.tolist(), self.amount.tolist(), self.currency.tolist(),
+            self.vendor_name.tolist(), self.po_number.tolist(), self.invoice_date.astype(object).tolist()
+        )]
+
+
+@dataclass
+class PaymentBatch:
+    """
+    Columnar representation of a tenant's payments.
+    """
+    payment_id: DictionaryColumn
+    amount_cents: np.ndarray
+    currency: DictionaryColumn
+    sender_name: DictionaryColumn
+    trace_id: DictionaryColumn
+    remittance_raw: DictionaryColumn
+    payment_date: np.ndarray
+
+    # Column order of the intake query
+    FIELDS = ("payment_id", "amount", "currency", "sender_name", "trace_id", "remittance_raw", "payment_date")
+
+    def __len__(self) -> int:
+        return len(self.amount_cents)
+
+    @property
+    def amount(self) -> np.ndarray:
+        return self.amount_cents / 100
+
+    @classmethod
+    def from_columns(cls, payment_id, amount, currency, sender_name, trace_id, remittance_raw, payment_date,
+                     cents: bool = False) -> "PaymentBatch":
+        return cls(
+            payment_id=DictionaryColumn.encode(payment_id),
+            amount_cents=np.asarray(amount, dtype=np.int64) if cents else to_cents(amount),
+            currency=DictionaryColumn.encode(currency),
+            sender_name=DictionaryColumn.encode(sender_name),
+            trace_id=DictionaryColumn.encode(trace_id),
+            remittance_raw=DictionaryColumn.encode(remittance_raw),
+            payment_date=np.array(payment_date, dtype=DATE_DTYPE),
+        )
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[tuple], cents: bool = False) -> "PaymentBatch":
+        """
+        Builds a batch from intake query rows (see FIELDS) without creating
+        one model per row. `cents=True` when the amount column is already
+        integer cents.
+        """
+        columns = list(zip(*rows)) if rows else [()] * len(cls.FIELDS)
+        return cls.from_columns(*columns, cents=cents)
+
+    @classmethod
+    def concat(cls, batches: Sequence["PaymentBatch"]) -> "PaymentBatch":
+        """
+        Concatenates batches (e.g. streamed intake chunks) into one.
+        """
+        return cls(**{
+            name: DictionaryColumn.concat([getattr(b, name) for b in batches])
+            if isinstance(getattr(batches[0], name), DictionaryColumn)
+            else np.concatenate([getattr(b, name) for b in batches])
+            for name in cls.__dataclass_fields__
+        }) if batches else cls.from_rows([])
+
+    def take(self, rows: Sequence[int]) -> "PaymentBatch":
+        """
+        Sub-batch of the given row positions (e.g. one page of a result).
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        return PaymentBatch(**{
+            name: getattr(self, name).take(rows) if isinstance(getattr(self, name), DictionaryColumn)
+            else getattr(self, name)[rows]
+            for name in self.__dataclass_fields__
+        })
+
+    @classmethod
+    def from_models(cls, payments: Sequence[Payment]) -> "PaymentBatch":
+        return cls.from_columns(
+            [p.payment_id for p in payments], [p.amount for p in payments], [p.currency for p in payments],
+            [p.sender_name for p in payments], [p.trace_id for p in payments],
+            [p.remittance_raw for p in payments], [p.payment_date for p in payments]
+        )
+
+    def to_models(self) -> List[Payment]:
+        return [Payment(
+            payment_id=pid, amount=amt, currency=cur, sender_name=sname,
+            trace_id=trid, remittance_raw=rraw, payment_date=pdat
+        ) for pid, amt, cur, sname, trid, rraw, pdat in zip(
+            self.payment_id.tolist(), self.amount.tolist(), self.currency.tolist(),
+            self.sender_name.tolist(), self.trace_id.tolist(), self.remittance_raw.tolist(),
+            self.payment_date.astype(object).tolist()
+        )]
@@ -3,15 +3,23 @@ import re
 from datetime import datetime
 from .models import ReconciliationState
 
+# Bank account numbers (assuming 8-12 digits)
+ACCOUNT_NUMBER_RE = re.compile(r'\d{8,12}')
+
 class ComplianceAgent:
     def enforce_guardrails(self, state: ReconciliationState):
         """
         Ensures PII masking and tenant isolation.
         """
         # 1. Mask Sensitive Data in Remittance
-        for pay in state.payments:
-            # Mask bank account numbers (assuming 8-12 digits)
-            pay.remittance_raw = re.sub(r'\d{8,12}', '********', pay.remittance_raw)
+        if state.payment_batch is not None:
+            # Columnar: mask each distinct remittance string once
+            batch = state.payment_batch
+            batch.remittance_raw = batch.remittance_raw.map_values(lambda text: ACCOUNT_NUMBER_RE.sub('********', text))
+        else:
+            for pay in state.payments:
+                if pay.remittance_raw:
+                    pay.remittance_raw = ACCOUNT_NUMBER_RE.sub('********', pay.remittance_raw)
             
         # 2. Add Compliance Note to State
         state.audit_trail.append({
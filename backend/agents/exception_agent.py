@@ -1,5 +1,6 @@
 # File: backend/agents/exception_agent.py
 from datetime import datetime
+import numpy as np
 from .models import ReconciliationState
 
 class ExceptionAgent:
@@ -9,6 +10,9 @@ class ExceptionAgent:
         """
         matched_invoice_ids = {m['invoice_id'] for m in state.matches}
         matched_payment_ids = {m['payment_id'] for m in state.matches}
+
+        if state.invoice_batch is not None and state.payment_batch is not None:
+            return self._classify_batches(state, matched_invoice_ids, matched_payment_ids)
         
         # 1. Unmatched Invoices
         for inv in state.invoices:
@@ -33,3 +37,39 @@ class ExceptionAgent:
                 })
         
         return state
+
+    def _classify_batches(self, state: ReconciliationState, matched_invoice_ids: set, matched_payment_ids: set):
+        """
+        Columnar variant: unmatched rows and severities are computed with
+        array operations; only the exception records themselves are built.
+        """
+        invoices, payments = state.invoice_batch, state.payment_batch
+
+        # 1. Unmatched Invoices
+        inv_open = ~np.isin(invoices.invoice_id.codes, invoices.invoice_id.codes_for(matched_invoice_ids))
+        age_days = (np.datetime64(datetime.now()) - invoices.invoice_date).astype("timedelta64[D]").astype(np.int64)
+        rows = np.flatnonzero(inv_open)
+        for inv_id, amount, old in zip(
+            invoices.invoice_id.decode()[rows].tolist(), invoices.amount[rows].tolist(), (age_days[rows] > 30).tolist()
+        ):
+            state.exceptions.append({
+                "entity_id": inv_id,
+                "type": "UNMATCHED_INVOICE",
+                "amount": amount,
+                "reason": "No payment found with matching ID or amount",
+                "severity": "HIGH" if old else "MEDIUM"
+            })
+
+        # 2. Unmatched Payments
+        pay_open = ~np.isin(payments.payment_id.codes, payments.payment_id.codes_for(matched_payment_ids))
+        rows = np.flatnonzero(pay_open)
+        for pay_id, amount in zip(payments.payment_id.decode()[rows].tolist(), payments.amount[rows].tolist()):
+            state.exceptions.append({
+                "entity_id": pay_id,
+                "type": "UNMATCHED_PAYMENT",
+                "amount": amount,
+                "reason": "Payment received without clear reference to an invoice",
+                "severity": "MEDIUM"
+            })
+
+        return state
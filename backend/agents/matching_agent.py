@@ -1,7 +1,14 @@
 # File: backend/agents/matching_agent.py
 import os
-from typing import List, Tuple
-from .models import ReconciliationState, Invoice, Payment
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .models import ReconciliationState, AgentResponse, Invoice, Payment
+from .amount_index import partition, tolerance_cents
+from .columnar import InvoiceBatch, PaymentBatch
+from .reference_index import ReferenceIndex
+from .subset_sum import BudgetExceeded, find_subset
+from .vector_index import TenantVectorEngine
 from openai import OpenAI
 
 class MatchingAgent:
@@ -13,128 +20,345 @@ class MatchingAgent:
         Oracle 26AI Vector Search implementation.
         Finds the top 3 invoices that are semantically similar to a payment's remittance.
         """
+        return self.get_oracle_vector_matches([payment_id], customer_id).get(payment_id, [])
+
+    def get_oracle_vector_matches(self, payment_ids: List[str], customer_id: str, k: int = 3,
+                                  chunk_size: int = 500) -> Dict[str, List[dict]]:
+        """
+        Bulk Oracle 26AI Vector Search: top-k invoice candidates for many
+        payments in one round trip per `chunk_size` payments, instead of one
+        query (and one embedding subquery) per payment.
+        """
         from db.connection import execute_query
-        
-        # This query uses Oracle's native VECTOR_DISTANCE feature
-        query = """
-            SELECT source_id, VECTOR_DISTANCE(embedding, (SELECT embedding FROM metadata_vectors WHERE source_id = :pid AND source_type = 'PAYMENT'), COSINE) as dist
-            FROM metadata_vectors
-            WHERE source_type = 'INVOICE' AND customer_id = :cid
-            ORDER BY dist
-            FETCH FIRST 3 ROWS ONLY
+
+        results = {pid: [] for pid in payment_ids}
+        for start in range(0, len(payment_ids), chunk_size):
+            chunk = payment_ids[start:start + chunk_size]
+            binds = {f"p{i}": pid for i, pid in enumerate(chunk)}
+            # This query uses Oracle's native VECTOR_DISTANCE feature
+            query = f"""
+                SELECT pid, invoice_id, dist FROM (
+                    SELECT p.source_id AS pid, i.source_id AS invoice_id,
+                           VECTOR_DISTANCE(i.embedding, p.embedding, COSINE) AS dist,
+                           ROW_NUMBER() OVER (
+                               PARTITION BY p.source_id
+                               ORDER BY VECTOR_DISTANCE(i.embedding, p.embedding, COSINE)
+                           ) AS rn
+                    FROM metadata_vectors p
+                    JOIN metadata_vectors i ON i.customer_id = p.customer_id AND i.source_type = 'INVOICE'
+                    WHERE p.source_type = 'PAYMENT' AND p.customer_id = :cid
+                      AND p.source_id IN ({", ".join(":" + name for name in binds)})
+                )
+                WHERE rn <= :k
+                ORDER BY pid, rn
+            """
+            try:
+                rows = execute_query(query, {"cid": customer_id, "k": k, **binds})
+            except Exception as e:
+                print(f"Oracle Vector Search error: {e}")
+                continue
+            for pid, invoice_id, dist in rows:
+                results[pid].append({"invoice_id": invoice_id, "distance": dist})
+        return results
+
+    def get_local_vector_matches(self, payment_ids: List[str], customer_id: str, k: int = 3,
+                                 engine: Optional[TenantVectorEngine] = None) -> Dict[str, List[dict]]:
         """
-        try:
-            results = execute_query(query, {"pid": payment_id, "cid": customer_id})
-            return [{"invoice_id": r[0], "distance": r[1]} for r in results]
-        except Exception as e:
-            print(f"Oracle Vector Search error: {e}")
-            return []
+        Same lookup answered in-process: the tenant's embeddings are loaded
+        into a NumPy matrix once (or reused from `engine`) and the whole
+        batch is scored with one matrix multiply.
+        """
+        engine = engine or TenantVectorEngine.load(customer_id)
+        return engine.match_payments(payment_ids, k)
 
     def hybrid_match(self, state: ReconciliationState):
         """
         Optimized Matching Logic for Large Datasets:
-        1. Index invoices by amount and reference.
-        2. Perform O(1) lookups for 1:1 and N:1 matches.
-        3. Efficiently group payments for 1:N matches.
+        1. Index invoices by amount (integer cents) and reference: O(n).
+        2. Phase 1 (1:1): hash lookup of the payment's amount, then a substring
+           check against each open invoice with that amount - O(1) expected per
+           payment, but linear in the size of the amount bucket when many
+           invoices share an amount. Pushdown runs get the unambiguous pairs
+           from the database (state.pushdown_matches) and only loop over the
+           rest.
+        3. Phases 2/3 (N:1, 1:N): resolve remittance references with the
+           ReferenceIndex, one pass over each remittance per distinct reference
+           length - O(len(text) x lengths) per payment, independent of the
+           number of invoices.
+        4. Phase 4 (optional): near amounts within the tenant's tolerance from
+           a sorted cents index (AmountIndex) per vendor and currency,
+           O(log n + hits) per payment.
+        5. Phase 5 (optional): group reference-less split/bulk payments by amount
+           sum (bounded subset-sum search within a time budget).
+        Works on the columnar batches when present, otherwise on the row lists.
+        Per-phase seconds and match counts are left in `self.phase_stats`.
         """
+        invoices = state.invoice_batch if state.invoice_batch is not None else InvoiceBatch.from_models(state.invoices)
+        payments = state.payment_batch if state.payment_batch is not None else PaymentBatch.from_models(state.payments)
+
+        inv_ids = invoices.invoice_id.tolist()
+        inv_pos = invoices.po_number.tolist()
+        inv_cents = invoices.amount_cents.tolist()
+        inv_amts = invoices.amount.tolist()
+        pay_ids = payments.payment_id.tolist()
+        pay_remit = [r or "" for r in payments.remittance_raw.tolist()]
+        pay_cents = payments.amount_cents.tolist()
+        pay_amts = payments.amount.tolist()
+
         matched_invoices = set()
         matched_payments = set()
 
-        # 1. Indexing Invoices
-        invoice_by_amt = {} # amt -> list of invoices
+        self.phase_stats: Dict[str, Dict[str, float]] = {}
+        clock = [time.perf_counter(), len(state.matches)]
+
+        def lap(phase):
+            now = time.perf_counter()
+            self.phase_stats[phase] = {"seconds": now - clock[0], "matches": len(state.matches) - clock[1]}
+            clock[:] = [now, len(state.matches)]
+
+        # 1. Indexing Invoices (row positions)
+        invoice_by_amt = {} # cents -> list of invoices
         invoice_by_ref = {} # ref -> invoice
-        
-        for inv in state.invoices:
-            amt = round(inv.amount, 2)
-            if amt not in invoice_by_amt:
-                invoice_by_amt[amt] = []
-            invoice_by_amt[amt].append(inv)
-            
-            invoice_by_ref[inv.invoice_id] = inv
-            if inv.po_number:
-                invoice_by_ref[inv.po_number] = inv
+
+        for i, (inv_id, po, cents) in enumerate(zip(inv_ids, inv_pos, inv_cents)):
+            if cents not in invoice_by_amt:
+                invoice_by_amt[cents] = []
+            invoice_by_amt[cents].append(i)
+
+            invoice_by_ref[inv_id] = i
+            if po:
+                invoice_by_ref[po] = i
+
+        # Reference extractor over all invoice IDs and PO numbers, built once per run
+        ref_index = ReferenceIndex(invoice_by_ref)
+        lap("index")
 
         # Phase 1: FAST 1:1 Matches
-        for payment in state.payments:
-            pay_amt = round(payment.amount, 2)
+        # Pairs the database already resolved (pushdown runs) come first; their
+        # rows were never loaded, so they cannot conflict with the loop below
+        for m in state.pushdown_matches:
+            state.matches.append(self._match_record(
+                m["invoice_id"], m["payment_id"], m["invoice_amount"], m["payment_amount"], 1.0,
+                "Exact 1:1 Match (Optimized Index Lookup)", "AUTO_1_1"
+            ))
+        for p, remit in enumerate(pay_remit):
             # Try exact amount lookup
-            if pay_amt in invoice_by_amt:
-                for inv in invoice_by_amt[pay_amt]:
-                    if inv.invoice_id in matched_invoices: continue
-                    
-                    # Check semantic/reference overlap
-                    if (inv.invoice_id in (payment.remittance_raw or "") or 
-                        (inv.po_number and inv.po_number in (payment.remittance_raw or ""))):
-                        state.matches.append({
-                            "invoice_id": inv.invoice_id,
-                            "payment_id": payment.payment_id,
-                            "invoice_amount": inv.amount,
-                            "payment_amount": payment.amount,
-                            "confidence": 1.0,
-                            "reasons": ["Exact 1:1 Match (Optimized Index Lookup)"],
-                            "match_type": "AUTO_1_1"
-                        })
-                        matched_invoices.add(inv.invoice_id)
-                        matched_payments.add(payment.payment_id)
-                        break
+            for i in invoice_by_amt.get(pay_cents[p], ()):
+                if inv_ids[i] in matched_invoices: continue
+
+                # Check semantic/reference overlap
+                if inv_ids[i] in remit or (inv_pos[i] and inv_pos[i] in remit):
+                    state.matches.append(self._match_record(
+                        inv_ids[i], pay_ids[p], inv_amts[i], pay_amts[p], 1.0,
+                        "Exact 1:1 Match (Optimized Index Lookup)", "AUTO_1_1"
+                    ))
+                    matched_invoices.add(inv_ids[i])
+                    matched_payments.add(pay_ids[p])
+                    break
+        lap("exact_1_1")
 
         # Phase 2: N:1 (Bulk) - One payment for multiple invoices
-        for payment in state.payments:
-            if payment.payment_id in matched_payments: continue
-            
-            # Simple regex/split to find IDs in remittance (mocked here by string search)
-            # We look for references that exist in our index
+        for p, remit in enumerate(pay_remit):
+            if pay_ids[p] in matched_payments: continue
+
+            # Resolve every known reference mentioned in the remittance in one pass
             candidates = []
-            for ref, inv in invoice_by_ref.items():
-                if inv.invoice_id in matched_invoices: continue
-                if ref in (payment.remittance_raw or ""):
-                    if inv not in candidates: candidates.append(inv)
-            
+            for ref in ref_index.find(remit):
+                i = invoice_by_ref[ref]
+                if inv_ids[i] in matched_invoices: continue
+                if i not in candidates: candidates.append(i)
+
             if candidates:
-                total_inv_amt = sum(inv.amount for inv in candidates)
-                if abs(total_inv_amt - payment.amount) < 0.01:
-                    for inv in candidates:
-                        state.matches.append({
-                            "invoice_id": inv.invoice_id,
-                            "payment_id": payment.payment_id,
-                            "invoice_amount": inv.amount,
-                            "payment_amount": payment.amount,
-                            "confidence": 0.95,
-                            "reasons": ["N:1 Bulk Match (Indexed Reference Search)"],
-                            "match_type": "AUTO_MANY_1"
-                        })
-                        matched_invoices.add(inv.invoice_id)
-                    matched_payments.add(payment.payment_id)
+                total_inv_amt = sum(inv_amts[i] for i in candidates)
+                if abs(total_inv_amt - pay_amts[p]) < 0.01:
+                    for i in candidates:
+                        state.matches.append(self._match_record(
+                            inv_ids[i], pay_ids[p], inv_amts[i], pay_amts[p], 0.95,
+                            "N:1 Bulk Match (Indexed Reference Search)", "AUTO_MANY_1"
+                        ))
+                        matched_invoices.add(inv_ids[i])
+                    matched_payments.add(pay_ids[p])
+        lap("bulk_n_1")
 
         # Phase 3: 1:N (Splits) - One invoice for multiple payments
         # Index unmatched payments by mentioned invoice ID
         pay_by_inv_ref = {}
-        for p in state.payments:
-            if p.payment_id in matched_payments: continue
+        for p, remit in enumerate(pay_remit):
+            if pay_ids[p] in matched_payments: continue
             # Check for invoice ID in remittance
-            for inv_id in invoice_by_ref: # Quick check against known IDs
-                if inv_id in (p.remittance_raw or ""):
-                    if inv_id not in pay_by_inv_ref: pay_by_inv_ref[inv_id] = []
-                    pay_by_inv_ref[inv_id].append(p)
+            for inv_id in ref_index.find(remit):
+                if inv_id not in pay_by_inv_ref: pay_by_inv_ref[inv_id] = []
+                pay_by_inv_ref[inv_id].append(p)
 
         for inv_id, candidate_pays in pay_by_inv_ref.items():
             if inv_id in matched_invoices: continue
-            inv = invoice_by_ref.get(inv_id)
-            if not inv: continue
-            
-            total_pay_amt = sum(p.amount for p in candidate_pays)
-            if abs(total_pay_amt - inv.amount) < 0.01:
+            i = invoice_by_ref[inv_id]
+
+            total_pay_amt = sum(pay_amts[p] for p in candidate_pays)
+            if abs(total_pay_amt - inv_amts[i]) < 0.01:
                 for p in candidate_pays:
-                    state.matches.append({
-                        "invoice_id": inv.invoice_id,
-                        "payment_id": p.payment_id,
-                        "invoice_amount": inv.amount,
-                        "payment_amount": p.amount,
-                        "confidence": 0.95,
-                        "reasons": ["1:N Split Match (Sum of payments matches invoice)"],
-                        "match_type": "AUTO_1_MANY"
-                    })
-                    matched_payments.add(p.payment_id)
-                matched_invoices.add(inv.invoice_id)
+                    state.matches.append(self._match_record(
+                        inv_ids[i], pay_ids[p], inv_amts[i], pay_amts[p], 0.95,
+                        "1:N Split Match (Sum of payments matches invoice)", "AUTO_1_MANY"
+                    ))
+                    matched_payments.add(pay_ids[p])
+                matched_invoices.add(inv_ids[i])
+        lap("split_1_n")
+
+        # Phase 4: Near-amount 1:1 (bank fees, FX rounding, early-pay discounts)
+        # Only runs when the tenant configures an amount tolerance
+        settings = state.context.settings
+        if settings.amount_tolerance_abs > 0 or settings.amount_tolerance_pct > 0:
+            # Sorted cents index per (vendor, currency) over the invoices still
+            # open after Phases 1-3; keys are shifted codes, -1 (missing) -> 0
+            inv_open = ~np.isin(invoices.invoice_id.codes, invoices.invoice_id.codes_for(matched_invoices))
+            vendor_codes = {v: c for c, v in enumerate(invoices.vendor_name.values)}
+            currency_codes = {v: c for c, v in enumerate(invoices.currency.values)}
+            key_width = len(currency_codes) + 1
+            inv_keys = ((invoices.vendor_name.codes.astype(np.int64) + 1) * key_width
+                        + invoices.currency.codes + 1)
+            amount_indexes = partition(inv_keys[inv_open], invoices.amount_cents[inv_open], np.flatnonzero(inv_open))
+            pay_senders = payments.sender_name.tolist()
+            pay_currencies = payments.currency.tolist()
+            inv_currencies = invoices.currency.tolist()
+
+            for p, remit in enumerate(pay_remit):
+                if pay_ids[p] in matched_payments: continue
+                allowed = tolerance_cents(pay_cents[p], settings.amount_tolerance_abs, settings.amount_tolerance_pct)
+
+                # a) Open invoice in the payment's currency named in the
+                #    remittance, closest amount first
+                best, confidence, basis = None, 0.9, "reference in remittance"
+                for ref in ref_index.find(remit):
+                    i = invoice_by_ref[ref]
+                    if inv_ids[i] in matched_invoices or inv_currencies[i] != pay_currencies[p]: continue
+                    diff = abs(pay_cents[p] - inv_cents[i])
+                    if diff <= allowed and (best is None or diff < abs(pay_cents[p] - inv_cents[best])):
+                        best = i
+
+                # b) No usable reference: the only open invoice of the same vendor
+                #    and currency within tolerance
+                if best is None:
+                    vendor = vendor_codes.get(pay_senders[p])
+                    currency = currency_codes.get(pay_currencies[p])
+                    if vendor is None or currency is None: continue
+                    amount_index = amount_indexes.get((vendor + 1) * key_width + currency + 1)
+                    if amount_index is None: continue
+                    rows = [i for i in amount_index.near(pay_cents[p], allowed).tolist()
+                            if inv_ids[i] not in matched_invoices]
+                    if len(rows) != 1: continue
+                    best, confidence, basis = rows[0], 0.7, "sole vendor candidate"
+
+                diff_cents = pay_cents[p] - inv_cents[best]
+                if allowed:
+                    confidence -= 0.1 * abs(diff_cents) / allowed
+                state.matches.append(self._match_record(
+                    inv_ids[best], pay_ids[p], inv_amts[best], pay_amts[p], round(confidence, 3),
+                    f"Near-amount 1:1 Match (difference {diff_cents / 100:+.2f} {pay_currencies[p]}, "
+                    f"tolerance {allowed / 100:.2f}, {basis})",
+                    "AUTO_1_1_TOLERANCE"
+                ))
+                matched_invoices.add(inv_ids[best])
+                matched_payments.add(pay_ids[p])
+            lap("near_amount")
+
+        # Phase 5: Amount-sum grouping for reference-less bulk and split payments
+        if state.context.settings.subset_sum_enabled:
+            self._match_amount_sums(
+                state, invoices, payments, inv_ids, inv_amts, pay_ids, pay_amts,
+                matched_invoices, matched_payments
+            )
+            lap("amount_sum")
 
         return state
+
+    def _match_amount_sums(self, state: ReconciliationState, invoices: InvoiceBatch, payments: PaymentBatch,
+                           inv_ids, inv_amts, pay_ids, pay_amts, matched_invoices: set, matched_payments: set):
+        """
+        Bounded subset-sum search over integer cents for items the reference
+        phases left open. Candidates share vendor/sender and currency, fall in
+        the date window and are capped to the nearest-dated few; the whole
+        phase stops once the tenant's time budget is spent.
+        """
+        settings = state.context.settings
+        deadline = time.perf_counter() + settings.subset_time_budget_s
+        window = np.timedelta64(settings.subset_date_window_days, "D")
+        max_size = settings.subset_max_group_size
+
+        inv_open = ~np.isin(invoices.invoice_id.codes, invoices.invoice_id.codes_for(matched_invoices))
+        pay_open = ~np.isin(payments.payment_id.codes, payments.payment_id.codes_for(matched_payments))
+        inv_keys = list(zip(invoices.vendor_name.tolist(), invoices.currency.tolist()))
+        pay_keys = list(zip(payments.sender_name.tolist(), payments.currency.tolist()))
+
+        # (vendor, currency) -> open rows
+        inv_by_key, pay_by_key = {}, {}
+        for i in np.flatnonzero(inv_open).tolist():
+            inv_by_key.setdefault(inv_keys[i], []).append(i)
+        for p in np.flatnonzero(pay_open).tolist():
+            pay_by_key.setdefault(pay_keys[p], []).append(p)
+        inv_by_key = {k: np.array(v) for k, v in inv_by_key.items()}
+        pay_by_key = {k: np.array(v) for k, v in pay_by_key.items()}
+
+        def nearest(rows, open_mask, dates, lo, hi, anchor):
+            rows = rows[open_mask[rows]]
+            rows = rows[(dates[rows] >= lo) & (dates[rows] <= hi)]
+            order = np.argsort(np.abs(dates[rows] - anchor), kind="stable")
+            return rows[order[:settings.subset_max_candidates]]
+
+        try:
+            # 5a) N:1 - one payment settles several open invoices of its sender
+            for p in np.flatnonzero(pay_open).tolist():
+                if pay_keys[p] not in inv_by_key: continue
+                pay_date = payments.payment_date[p]
+                rows = nearest(inv_by_key[pay_keys[p]], inv_open, invoices.invoice_date, pay_date - window, pay_date, pay_date)
+                picked = find_subset(int(payments.amount_cents[p]), invoices.amount_cents[rows].tolist(), max_size, deadline=deadline)
+                if picked is None: continue
+                group = rows[picked].tolist()
+                for i in group:
+                    state.matches.append(self._match_record(
+                        inv_ids[i], pay_ids[p], inv_amts[i], pay_amts[p], 0.75,
+                        f"N:1 Amount-Sum Match ({len(group)} open invoices of the sender total the payment; no usable reference)",
+                        "AUTO_MANY_1"
+                    ))
+                    matched_invoices.add(inv_ids[i])
+                    inv_open[i] = False
+                matched_payments.add(pay_ids[p])
+                pay_open[p] = False
+
+            # 5b) 1:N - several open payments of the vendor settle one invoice
+            for i in np.flatnonzero(inv_open).tolist():
+                if not inv_open[i] or inv_keys[i] not in pay_by_key: continue
+                inv_date = invoices.invoice_date[i]
+                rows = nearest(pay_by_key[inv_keys[i]], pay_open, payments.payment_date, inv_date, inv_date + window, inv_date)
+                picked = find_subset(int(invoices.amount_cents[i]), payments.amount_cents[rows].tolist(), max_size, deadline=deadline)
+                if picked is None: continue
+                group = rows[picked].tolist()
+                for p in group:
+                    state.matches.append(self._match_record(
+                        inv_ids[i], pay_ids[p], inv_amts[i], pay_amts[p], 0.75,
+                        f"1:N Amount-Sum Match ({len(group)} open payments of the vendor total the invoice; no usable reference)",
+                        "AUTO_1_MANY"
+                    ))
+                    matched_payments.add(pay_ids[p])
+                    pay_open[p] = False
+                matched_invoices.add(inv_ids[i])
+                inv_open[i] = False
+        except BudgetExceeded:
+            state.history.append(AgentResponse(
+                agent_name="MatchingAgent",
+                status="ESCALATED",
+                data={"phase": "amount_sum", "time_budget_s": settings.subset_time_budget_s},
+                reasoning="Amount-sum matching stopped at the tenant time budget; remaining items are left as exceptions."
+            ))
+
+    @staticmethod
+    def _match_record(invoice_id, payment_id, invoice_amount, payment_amount, confidence, reason, match_type) -> dict:
+        return {
+            "invoice_id": invoice_id,
+            "payment_id": payment_id,
+            "invoice_amount": invoice_amount,
+            "payment_amount": payment_amount,
+            "confidence": confidence,
+            "reasons": [reason],
+            "match_type": match_type
+        }
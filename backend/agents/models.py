@@ -1,11 +1,27 @@
 # File: backend/agents/models.py
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
+from dataclasses import dataclass
 from datetime import datetime
 
+class MatchSettings(BaseModel):
+    """
+    Per-tenant matching configuration.
+    """
+    # Near-amount 1:1 matching; both zero disables it
+    amount_tolerance_abs: float = 0.0 # currency units, e.g. 0.50 for bank fees
+    amount_tolerance_pct: float = 0.0 # percent of the amount, e.g. 2.0 for early-pay discounts
+    # Amount-sum grouping of reference-less split/bulk payments
+    subset_sum_enabled: bool = False
+    subset_max_group_size: int = 4 # invoices per payment (N:1) or payments per invoice (1:N)
+    subset_date_window_days: int = 60 # payment date within this many days after the invoice date
+    subset_max_candidates: int = 40 # nearest-dated open items considered per search
+    subset_time_budget_s: float = 5.0 # per tenant run
+
 class CustomerContext(BaseModel):
     customer_id: str
     tenant_name: str
+    settings: MatchSettings = MatchSettings()
 
 class Invoice(BaseModel):
     invoice_id: str
@@ -21,9 +37,57 @@ class Payment(BaseModel):
     currency: str
     sender_name: str
     trace_id: Optional[str] = None
-    remittance_raw: str
+    remittance_raw: Optional[str] = None
     payment_date: datetime
 
+# Row records used inside the pipeline. Database rows are already typed by the
+# driver, so they are not validated per row; the Invoice / Payment models above
+# are only built (and validated) at the API boundary, via to_model().
+
+@dataclass(slots=True)
+class InvoiceRecord:
+    """
+    Fields in the order of the intake query (InvoiceRecord(*row)).
+    """
+    invoice_id: str
+    amount: float
+    currency: str
+    vendor_name: str
+    po_number: Optional[str]
+    invoice_date: datetime
+
+    def to_model(self) -> Invoice:
+        return Invoice(invoice_id=self.invoice_id, amount=self.amount, currency=self.currency,
+                       vendor_name=self.vendor_name, po_number=self.po_number, invoice_date=self.invoice_date)
+
+@dataclass(slots=True)
+class PaymentRecord:
+    """
+    Fields in the order of the intake query (PaymentRecord(*row)).
+    """
+    payment_id: str
+    amount: float
+    currency: str
+    sender_name: str
+    trace_id: Optional[str]
+    remittance_raw: Optional[str]
+    payment_date: datetime
+
+    def to_model(self) -> Payment:
+        return Payment(payment_id=self.payment_id, amount=self.amount, currency=self.currency,
+                       sender_name=self.sender_name, trace_id=self.trace_id, remittance_raw=self.remittance_raw,
+                       payment_date=self.payment_date)
+
+# Pipeline rows: records while a run is in progress, models at the API boundary
+InvoiceRow = Union[InvoiceRecord, Invoice]
+PaymentRow = Union[PaymentRecord, Payment]
+
+def to_models(rows: List[Any]) -> List[Any]:
+    """
+    Invoice / Payment models of pipeline rows (records are validated here).
+    """
+    return [row.to_model() if isinstance(row, (InvoiceRecord, PaymentRecord)) else row for row in rows]
+
 class AgentResponse(BaseModel):
     agent_name: str
     status: str # SUCCESS, FAILURE, ESCALATED
@@ -33,10 +97,38 @@ class AgentResponse(BaseModel):
 
 class ReconciliationState(BaseModel):
     context: CustomerContext
-    invoices: List[Invoice] = []
-    payments: List[Payment] = []
+    # InvoiceRecord / PaymentRecord rows while the pipeline runs; models once
+    # materialize_rows() has run
+    invoices: List[InvoiceRow] = []
+    payments: List[PaymentRow] = []
     extractions: List[Dict[str, Any]] = []
     matches: List[Dict[str, Any]] = []
     exceptions: List[Dict[str, Any]] = []
     audit_trail: List[Dict[str, Any]] = []
     history: List[AgentResponse] = []
+    # One entry per completed orchestrator stage: seconds, rows in/out, peak RSS
+    timings: List[Dict[str, Any]] = []
+    # Optional columnar InvoiceBatch / PaymentBatch (see columnar.py).
+    # When set, agents work on these instead of the row lists.
+    invoice_batch: Optional[Any] = Field(default=None, exclude=True)
+    payment_batch: Optional[Any] = Field(default=None, exclude=True)
+    # Exact 1:1 pairs matched by the database at intake (pushdown runs); their
+    # invoices and payments are not loaded. MatchingAgent turns them into matches.
+    pushdown_matches: List[Dict[str, Any]] = Field(default=[], exclude=True)
+
+    def materialize_rows(self):
+        """
+        Builds row models from the columnar batches or row records, for the
+        API response.
+        """
+        if self.invoice_batch is not None:
+            self.invoices = self.invoice_batch.to_models()
+            self.invoice_batch = None
+        else:
+            self.invoices = to_models(self.invoices)
+        if self.payment_batch is not None:
+            self.payments = self.payment_batch.to_models()
+            self.payment_batch = None
+        else:
+            self.payments = to_models(self.payments)
+        return self
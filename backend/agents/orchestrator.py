@@ -1,66 +1,257 @@
 # File: backend/agents/orchestrator.py
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
 import os
+import sys
+import threading
+import time
 from .models import ReconciliationState, AgentResponse, CustomerContext
 from .intake_agent import IntakeAgent
 from .matching_agent import MatchingAgent
 from .exception_agent import ExceptionAgent
 from .compliance_agent import ComplianceAgent
 from .audit_agent import AuditAgent
+from .audit_sink import get_audit_sink
+from .persistence_agent import PersistenceAgent
 from openai import OpenAI
 
+def create_client() -> OpenAI:
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY", "mock-key"))
+
 # Initialize client (mocking for ahora, will use env in prod)
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY", "mock-key"))
+client = create_client()
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Peak resident set size of this process so far (None where the
+    `resource` module is unavailable).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return round(rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10, 1)
+
+class RunCancelled(Exception):
+    """
+    Raised at the next stage boundary once a run's cancel event is set.
+    """
 
 class ReconciliationOrchestrator:
-    def __init__(self, state: ReconciliationState):
+    def __init__(self, state: ReconciliationState, columnar: bool = False, incremental: bool = False,
+                 stream_batch_size: Optional[int] = None, persist: bool = False, audit: bool = True,
+                 pushdown: bool = False, uploads: Optional[Dict[str, str]] = None,
+                 progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                 cancel_event: Optional[threading.Event] = None):
         self.state = state
+        # Read invoices/payments from uploaded files ({"invoices": path, "payments": path})
+        # instead of the database (implies columnar)
+        self.uploads = uploads
+        # Keep invoices/payments as columnar batches instead of row models
+        self.columnar = columnar or stream_batch_size is not None or uploads is not None
+        # Stream intake in chunks of this many rows (implies columnar)
+        self.stream_batch_size = stream_batch_size
+        # Only load new/open items and advance the customer's watermark (database intake only)
+        self.incremental = incremental and uploads is None
+        # Write PROPOSED matches and item statuses to the database at the end
+        self.persist = persist
+        if self.incremental and not persist:
+            # Without persisted matches the next run would skip this run's items
+            raise ValueError("Incremental runs need persist: the watermark is saved with the persisted matches")
+        # Match unambiguous exact 1:1 pairs in the database and load only the rest
+        self.pushdown = pushdown
+        # Write the audit trail to the database through the buffered sink
+        self.audit_sink = get_audit_sink() if audit else None
+        # progress(stage, metrics) after every stage; cancel_event stops the run between stages
+        self.progress = progress
+        self.cancel_event = cancel_event
+        self.intake_agent: Optional[IntakeAgent] = None
+        self.matching_agent: Optional[MatchingAgent] = None
         self.max_steps = 10
         self.current_step = 0
 
     async def run(self):
         """
         Executes the agentic workflow: 
-        Intake -> Extraction -> Matching -> Exception -> Compliance -> Decision -> Audit
+        Intake -> Extraction -> Matching -> Exception -> Compliance -> Decision -> Audit -> Persistence
         """
         print(f"Starting reconciliation workflow for customer: {self.state.context.customer_id}")
-        
-        # 1. Intake & Validation
-        await self.run_intake()
-        
-        # 2. Reference Extraction
-        await self.run_extraction()
-        
-        # 3. Hybrid Matching
-        await self.run_matching()
-        
-        # 4. Exception Classification
-        await self.run_exception_analysis()
-        
-        # 5. Risk & Compliance
-        await self.run_compliance_check()
-        
-        # 6. Decision & Escalation
-        await self.run_decision_logic()
-        
-        # 7. Audit Logging
-        await self.run_audit_trail()
-        
+
+        try:
+            # 1. Intake & Validation
+            await self.run_stage("intake", self.run_intake)
+
+            # 2. Reference Extraction
+            await self.run_stage("extraction", self.run_extraction)
+
+            # 3. Hybrid Matching
+            await self.run_stage("matching", self.run_matching)
+
+            # 4. Exception Classification
+            await self.run_stage("exceptions", self.run_exception_analysis)
+
+            # 5. Risk & Compliance
+            await self.run_stage("compliance", self.run_compliance_check)
+
+            # 6. Decision & Escalation
+            await self.run_stage("decision", self.run_decision_logic)
+
+            # 7. Audit Logging
+            await self.run_stage("audit", self.run_audit_trail)
+        except Exception:
+            # Write what was buffered, but never let a flush error replace the
+            # pipeline's own (unwritten records stay buffered for the sink)
+            if self.audit_sink is not None:
+                try:
+                    await self.flush_audit()
+                except Exception as e:
+                    print(f"Audit flush after a failed run failed: {e}")
+            raise
+
+        # Everything this run buffered is in audit_trail before it returns
+        if self.audit_sink is not None:
+            await self.flush_audit()
+
+        # 8. Persistence (opt-in; incremental runs also advance their watermark here)
+        if self.persist:
+            await self.run_stage("persistence", self.run_persistence)
+
         return self.state
 
+    async def flush_audit(self):
+        from db.connection import run_db
+
+        start = time.perf_counter()
+        written = await run_db(self.audit_sink.flush)
+        self.state.timings.append(self.stage_timing("audit_flush", time.perf_counter() - start, written, written))
+
+    def stages(self) -> List[str]:
+        """
+        Stages this run will report, in order.
+        """
+        return (["intake", "extraction", "matching", "exceptions", "compliance", "decision", "audit"]
+                + (["persistence"] if self.persist else []))
+
+    async def run_stage(self, name: str, step):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise RunCancelled(f"Cancelled before stage '{name}'")
+        start = time.perf_counter()
+        await step()
+        timing = self.stage_timing(name, time.perf_counter() - start, *self.stage_rows(name))
+        self.state.timings.append(timing)
+        if self.progress is not None:
+            self.progress(name, dict(self.stage_metrics(name), seconds=timing["seconds"]))
+
+    def stage_timing(self, name: str, seconds: float, rows_in: int, rows_out: int) -> Dict[str, Any]:
+        timing = {"stage": name, "seconds": round(seconds, 6), "rows_in": rows_in, "rows_out": rows_out,
+                  "peak_rss_mb": peak_rss_mb()}
+        if name == "matching":
+            timing["phases"] = {phase: {"seconds": round(p["seconds"], 6), "matches": p["matches"]}
+                                for phase, p in self.matching_agent.phase_stats.items()}
+        return timing
+
+    def stage_rows(self, name: str):
+        """
+        (rows consumed, rows produced) by stage `name`.
+        """
+        state = self.state
+        invoices = len(state.invoice_batch) if state.invoice_batch is not None else len(state.invoices)
+        payments = len(state.payment_batch) if state.payment_batch is not None else len(state.payments)
+        new_matches = sum(1 for m in state.matches if m.get('status') != 'PERSISTED')
+        if name == "intake":
+            # Pushed-down pairs are read by the database but not loaded
+            return invoices + payments + 2 * len(state.pushdown_matches), invoices + payments
+        if name == "matching":
+            return invoices + payments, new_matches
+        if name == "exceptions":
+            return invoices + payments, len(state.exceptions)
+        if name == "compliance":
+            return payments, payments
+        if name == "decision":
+            return new_matches, sum(1 for m in state.matches if m.get('status') == 'PROPOSED')
+        if name == "audit":
+            return new_matches, len(state.audit_trail)
+        if name == "persistence":
+            report = next((h.data for h in reversed(state.history) if h.agent_name == "PersistenceAgent"), {})
+            return report.get('proposed', 0), report.get('inserted', 0)
+        return 0, 0
+
+    def stage_metrics(self, name: str) -> Dict[str, Any]:
+        """
+        Counters reported when stage `name` completes.
+        """
+        state = self.state
+        if name == "intake":
+            return {
+                "invoices": len(state.invoice_batch) if state.invoice_batch is not None else len(state.invoices),
+                "payments": len(state.payment_batch) if state.payment_batch is not None else len(state.payments),
+                "persisted_matches": sum(1 for m in state.matches if m.get('status') == 'PERSISTED'),
+                "pushdown_matches": len(state.pushdown_matches),
+            }
+        if name == "matching":
+            # One match type per matching phase
+            by_type: Dict[str, int] = {}
+            for m in state.matches:
+                if m.get('status') == 'PERSISTED': continue
+                by_type[m['match_type']] = by_type.get(m['match_type'], 0) + 1
+            phases = {name: {"seconds": round(p["seconds"], 4), "matches": p["matches"]}
+                      for name, p in self.matching_agent.phase_stats.items()}
+            return {"matches": sum(by_type.values()), "matches_by_type": by_type, "phases": phases}
+        if name == "exceptions":
+            by_type = {}
+            for e in state.exceptions:
+                by_type[e['type']] = by_type.get(e['type'], 0) + 1
+            return {"exceptions": len(state.exceptions), "exceptions_by_type": by_type}
+        if name == "decision":
+            return {"proposed": sum(1 for m in state.matches if m.get('status') == 'PROPOSED')}
+        if name == "audit":
+            return {"audit_events": len(state.audit_trail)}
+        if name == "persistence":
+            report = next((h.data for h in reversed(state.history) if h.agent_name == "PersistenceAgent"), {})
+            return {"inserted": report.get('inserted'), "errors": len(report.get('errors', []))}
+        return {}
+
     async def run_intake(self):
-        agent = IntakeAgent(self.state.context.customer_id)
-        # Fetch exclusively from Oracle 26AI
-        invoices, payments = await agent.fetch_from_db()
-        self.state.invoices = invoices
-        self.state.payments = payments
+        agent = self.intake_agent = IntakeAgent(self.state.context.customer_id)
+        loaded = {"invoices": 0, "payments": 0}
+
+        def on_chunk(kind, rows):
+            loaded[kind] += rows
+            if self.progress is not None:
+                self.progress("intake_chunk", dict(loaded))
+
+        if self.uploads is not None:
+            # File reading and validation run off the event loop
+            invoices, payments = await asyncio.to_thread(
+                agent.process_uploads, self.uploads["invoices"], self.uploads["payments"], on_chunk=on_chunk
+            )
+        # Otherwise fetch exclusively from Oracle 26AI
+        elif self.stream_batch_size:
+            invoices, payments = await agent.stream_from_db(
+                self.stream_batch_size, incremental=self.incremental, on_chunk=on_chunk, pushdown=self.pushdown
+            )
+        else:
+            invoices, payments = await agent.fetch_from_db(columnar=self.columnar, incremental=self.incremental,
+                                                           pushdown=self.pushdown)
+        self.state.pushdown_matches = agent.exact_matches
+        if self.incremental:
+            # Merge with what is already persisted; those items are not re-matched
+            self.state.matches.extend(await agent.fetch_persisted_matches())
+        if self.columnar:
+            self.state.invoice_batch = invoices
+            self.state.payment_batch = payments
+        else:
+            self.state.invoices = invoices
+            self.state.payments = payments
 
     async def run_extraction(self):
         # Already handled by Intake for now, but extraction_agent would go here
         pass
 
     async def run_matching(self):
-        agent = MatchingAgent(client)
+        agent = self.matching_agent = MatchingAgent(client)
         self.state = agent.hybrid_match(self.state)
 
     async def run_exception_analysis(self):
@@ -74,10 +265,25 @@ class ReconciliationOrchestrator:
     async def run_decision_logic(self):
         # Propose matches as final if confidence > 0.8
         for match in self.state.matches:
+            if match.get('status') == 'PERSISTED': continue
             if match['confidence'] >= 0.8:
                 match['status'] = 'PROPOSED'
         pass
 
     async def run_audit_trail(self):
-        agent = AuditAgent()
-        self.state = agent.record_activity(self.state)
+        from db.connection import run_db
+
+        agent = AuditAgent(self.audit_sink)
+        statuses = None
+        if self.audit_sink is not None and self.uploads is None:
+            # Statuses before this run's matches are persisted, as the records' previous_state
+            statuses = await run_db(agent.item_statuses, self.state.context.customer_id, self.state.matches)
+        self.state = agent.record_activity(self.state, statuses)
+
+    async def run_persistence(self):
+        from db.connection import run_db
+
+        agent = PersistenceAgent(self.state.context.customer_id)
+        watermark = self.intake_agent.next_watermark() if self.incremental else None
+        report = await run_db(agent.persist_matches, self.state.matches, watermark)
+        self.state = agent.record(self.state, report)
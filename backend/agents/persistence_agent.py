@@ -0,0 +1,248 @@
+# File: backend/agents/persistence_agent.py
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+from .audit_sink import make_record, write_records
+from .models import ReconciliationState, AgentResponse
+
+# Idempotent: a pair already in reconciliation_matches (e.g. from an earlier
+# run or a manual override) is skipped instead of duplicated
+INSERT_MATCH_SQL = """
+    INSERT INTO reconciliation_matches (customer_id, invoice_id, payment_id, match_type, confidence_score, explanation, status)
+    SELECT :cid, :inv, :pay, :mtype, :conf, :expl, :status FROM dual
+    WHERE NOT EXISTS (
+        SELECT 1 FROM reconciliation_matches
+        WHERE customer_id = :cid AND invoice_id = :inv AND payment_id = :pay
+    )
+"""
+# Manual overrides take over a pair an earlier run already stored; pairs not
+# stored yet are then added by INSERT_MATCH_SQL
+UPDATE_OVERRIDE_SQL = """
+    UPDATE reconciliation_matches
+    SET match_type = :mtype, confidence_score = :conf, explanation = :expl, status = :status
+    WHERE customer_id = :cid AND invoice_id = :inv AND payment_id = :pay
+"""
+UPDATE_INVOICE_SQL = "UPDATE invoices SET status = 'MATCHED' WHERE customer_id = :cid AND invoice_id = :id"
+UPDATE_PAYMENT_SQL = "UPDATE payments SET status = 'MATCHED' WHERE customer_id = :cid AND payment_id = :id"
+UPDATE_WATERMARK_SQL = (
+    "UPDATE reconciliation_watermarks SET last_created_at = :1, last_run_at = :2, updated_at = CURRENT_TIMESTAMP "
+    "WHERE customer_id = :3"
+)
+INSERT_WATERMARK_SQL = (
+    "INSERT INTO reconciliation_watermarks (last_created_at, last_run_at, customer_id) VALUES (:1, :2, :3)"
+)
+
+
+class PersistenceAgent:
+    """
+    Writes a run's auto-matches (or an operator's manual overrides) to
+    `reconciliation_matches` and marks the matched invoices and payments,
+    with array-bound executemany calls in a single transaction per tenant.
+    """
+
+    def __init__(self, customer_id: str, chunk_size: int = 5000):
+        self.customer_id = customer_id
+        self.chunk_size = chunk_size
+
+    def _executemany(self, cursor, statement: str, rows: Sequence[dict]) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Runs `statement` for all rows in chunks with batch errors enabled.
+        Returns (affected rows, [{"offset", "message"}]) with offsets into `rows`.
+        """
+        affected, errors = 0, []
+        for start in range(0, len(rows), self.chunk_size):
+            cursor.executemany(statement, rows[start:start + self.chunk_size], batcherrors=True)
+            affected += cursor.rowcount
+            errors.extend({"offset": start + e.offset, "message": e.message} for e in cursor.getbatcherrors())
+        return affected, errors
+
+    def persist_matches(self, matches: List[Dict[str, Any]],
+                        watermark: Optional[Tuple[Optional[datetime], Optional[datetime]]] = None) -> Dict[str, Any]:
+        """
+        Persists the PROPOSED matches; lower-confidence ones stay open for
+        review. Status updates are only issued for pairs whose insert did
+        not fail. `watermark` ((last_created_at, last_run_at) of an
+        incremental run) is stored in the same transaction, so it never
+        advances past matches that were not committed.
+        """
+        from db.connection import pooled_connection
+
+        proposed = [m for m in matches if m.get('status') == 'PROPOSED']
+        match_rows = [{
+            "cid": self.customer_id,
+            "inv": m['invoice_id'],
+            "pay": m['payment_id'],
+            "mtype": m['match_type'],
+            "conf": round(float(m['confidence']), 2),
+            "expl": "; ".join(m.get('reasons') or []),
+            "status": "PROPOSED",
+        } for m in proposed]
+
+        with pooled_connection() as conn:
+            with conn.cursor() as cursor:
+                # 1. Matches
+                inserted, insert_errors = self._executemany(cursor, INSERT_MATCH_SQL, match_rows)
+
+                # 2. Statuses of every pair that is now in reconciliation_matches
+                failed = {e["offset"] for e in insert_errors}
+                ok = [r for n, r in enumerate(match_rows) if n not in failed]
+                invoice_rows = [{"cid": self.customer_id, "id": i} for i in sorted({r["inv"] for r in ok})]
+                payment_rows = [{"cid": self.customer_id, "id": p} for p in sorted({r["pay"] for r in ok})]
+                invoices_updated, invoice_errors = self._executemany(cursor, UPDATE_INVOICE_SQL, invoice_rows)
+                payments_updated, payment_errors = self._executemany(cursor, UPDATE_PAYMENT_SQL, payment_rows)
+
+                # 3. Watermark of an incremental run
+                if watermark is not None:
+                    params = [watermark[0], watermark[1], self.customer_id]
+                    cursor.execute(UPDATE_WATERMARK_SQL, params)
+                    if not cursor.rowcount:
+                        cursor.execute(INSERT_WATERMARK_SQL, params)
+            conn.commit()
+
+        return {
+            "proposed": len(proposed),
+            "inserted": inserted,
+            "already_persisted": len(ok) - inserted,
+            "invoices_updated": invoices_updated,
+            "payments_updated": payments_updated,
+            "watermark": str(watermark[0]) if watermark is not None and watermark[0] else None,
+            "errors": [dict(e, invoice_id=match_rows[e["offset"]]["inv"], payment_id=match_rows[e["offset"]]["pay"])
+                       for e in insert_errors]
+                      + [dict(e, invoice_id=invoice_rows[e["offset"]]["id"]) for e in invoice_errors]
+                      + [dict(e, payment_id=payment_rows[e["offset"]]["id"]) for e in payment_errors],
+        }
+
+    def record(self, state: ReconciliationState, report: Dict[str, Any]) -> ReconciliationState:
+        state.history.append(AgentResponse(
+            agent_name="PersistenceAgent",
+            status="FAILURE" if report["errors"] else "SUCCESS",
+            data=report,
+            reasoning=f"Persisted {report['inserted']} new matches "
+                      f"({report['already_persisted']} already present, {len(report['errors'])} batch errors)."
+        ))
+        return state
+
+    def _existing_ids(self, cursor, table: str, column: str, ids: Set[str]) -> Set[str]:
+        found = set()
+        ids = sorted(ids)
+        for start in range(0, len(ids), 500):
+            binds = {f"id{n}": i for n, i in enumerate(ids[start:start + 500])}
+            cursor.execute(
+                f"SELECT {column} FROM {table} WHERE customer_id = :cid "
+                f"AND {column} IN ({', '.join(':' + name for name in binds)})",
+                {"cid": self.customer_id, **binds}
+            )
+            found.update(r[0] for r in cursor.fetchall())
+        return found
+
+    def _existing_matches(self, cursor, invoice_ids: Set[str]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        found = {}
+        ids = sorted(invoice_ids)
+        for start in range(0, len(ids), 500):
+            binds = {f"id{n}": i for n, i in enumerate(ids[start:start + 500])}
+            cursor.execute(
+                "SELECT invoice_id, payment_id, match_type, status, confidence_score FROM reconciliation_matches "
+                f"WHERE customer_id = :cid AND invoice_id IN ({', '.join(':' + name for name in binds)})",
+                {"cid": self.customer_id, **binds}
+            )
+            for inv, pay, mtype, status, conf in cursor.fetchall():
+                found[(inv, pay)] = {"match_type": mtype, "status": status,
+                                     "confidence_score": float(conf) if conf is not None else None}
+        return found
+
+    def apply_manual_links(self, groups: Sequence[Tuple[List[str], List[str], str]], operator: str,
+                           atomic: bool = False) -> List[Dict[str, Any]]:
+        """
+        Applies manual overrides over one pooled connection in one
+        transaction. Each group is (invoice_ids, payment_ids, reason) and
+        links every invoice to every payment (1:1, N:1, 1:N or N:M). A pair
+        an earlier run already stored (e.g. PROPOSED by auto-matching) is
+        turned into a FIXED MANUAL_OVERRIDE; its audit record keeps the
+        previous type and status.
+
+        Groups that reference unknown items or hit a batch error are
+        reported as FAILED and left out; the remaining groups are committed
+        together. With `atomic`, any failure rolls back every group.
+        Returns one result per group, in order.
+        """
+        from db.connection import pooled_connection
+
+        results = [{
+            "invoice_ids": list(invoice_ids),
+            "payment_ids": list(payment_ids),
+            "status": "PENDING",
+        } for invoice_ids, payment_ids, _ in groups]
+
+        with pooled_connection() as conn:
+            with conn.cursor() as cursor:
+                # 1. Validate every referenced item in two set-based lookups
+                known_invoices = self._existing_ids(
+                    cursor, "invoices", "invoice_id", {i for r in results for i in r["invoice_ids"]})
+                known_payments = self._existing_ids(
+                    cursor, "payments", "payment_id", {p for r in results for p in r["payment_ids"]})
+                for r in results:
+                    missing = ([i for i in r["invoice_ids"] if i not in known_invoices]
+                               + [p for p in r["payment_ids"] if p not in known_payments])
+                    if not r["invoice_ids"] or not r["payment_ids"]:
+                        r.update(status="FAILED", error="A group needs at least one invoice and one payment")
+                    elif missing:
+                        r.update(status="FAILED", error=f"Unknown for customer {self.customer_id}: {', '.join(missing)}")
+
+                # 2. Pairs already stored, for the overrides' audit records
+                stored = self._existing_matches(cursor, {i for r in results if r["status"] == "PENDING"
+                                                         for i in r["invoice_ids"]})
+
+                # 3. Array DML for the valid groups; on batch errors roll back,
+                #    drop the failing groups and apply the rest again
+                while True:
+                    active = [n for n, r in enumerate(results) if r["status"] == "PENDING"]
+                    if not active or (atomic and len(active) < len(results)):
+                        break
+
+                    match_rows, match_groups, audit_records = [], [], []
+                    invoice_groups: Dict[str, int] = {}
+                    payment_groups: Dict[str, int] = {}
+                    for n in active:
+                        reason = groups[n][2]
+                        for i in results[n]["invoice_ids"]:
+                            invoice_groups.setdefault(i, n)
+                            for p in results[n]["payment_ids"]:
+                                payment_groups.setdefault(p, n)
+                                match_rows.append({"cid": self.customer_id, "inv": i, "pay": p, "mtype": "MANUAL_OVERRIDE",
+                                                   "conf": 1.0, "expl": reason, "status": "FIXED"})
+                                audit_records.append(make_record(
+                                    self.customer_id, "MATCH", f"{i}:{p}", "MANUAL_OVERRIDE", operator,
+                                    previous_state=stored.get((i, p)),
+                                    new_state={"match_type": "MANUAL_OVERRIDE", "status": "FIXED", "reason": reason}))
+                                match_groups.append(n)
+                    invoice_rows = [{"cid": self.customer_id, "id": i} for i in invoice_groups]
+                    payment_rows = [{"cid": self.customer_id, "id": p} for p in payment_groups]
+
+                    failed: Dict[int, str] = {}
+                    for statement, rows, owners in (
+                        (UPDATE_OVERRIDE_SQL, match_rows, match_groups),
+                        (INSERT_MATCH_SQL, match_rows, match_groups),
+                        (UPDATE_INVOICE_SQL, invoice_rows, list(invoice_groups.values())),
+                        (UPDATE_PAYMENT_SQL, payment_rows, list(payment_groups.values())),
+                    ):
+                        _, errors = self._executemany(cursor, statement, rows)
+                        for e in errors:
+                            failed.setdefault(owners[e["offset"]], e["message"])
+
+                    if not failed:
+                        # Overrides join the customer's audit hash chain in the same transaction
+                        write_records(cursor, audit_records, self.chunk_size)
+                        conn.commit()
+                        for n in active:
+                            r = results[n]
+                            r.update(status="APPLIED", pairs=len(r["invoice_ids"]) * len(r["payment_ids"]),
+                                     overridden=sum((i, p) in stored for i in r["invoice_ids"] for p in r["payment_ids"]))
+                        break
+                    conn.rollback()
+                    for n, message in failed.items():
+                        results[n].update(status="FAILED", error=message)
+
+        for r in results:
+            if r["status"] == "PENDING":
+                # Only left over when `atomic` and another group failed
+                r.update(status="ROLLED_BACK", error="Another group in the atomic batch failed")
+        return results
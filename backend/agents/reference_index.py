@@ -0,0 +1,44 @@
+# File: backend/agents/reference_index.py
+from typing import Dict, Iterable, List
+
+
+class ReferenceIndex:
+    """
+    Finds every known invoice reference (invoice ID or PO number) contained
+    in a remittance string in a single pass over the text.
+
+    References are bucketed by length, so a lookup slides one window per
+    distinct reference length across the text and probes a hash set. The
+    result is exactly what `ref in remittance_raw` would return for every
+    known reference, without scanning the reference list per payment.
+    """
+
+    def __init__(self, refs: Iterable[str]):
+        # ref -> rank (first insertion order), used to keep results in the
+        # same order as iterating the caller's reference dict
+        self._rank: Dict[str, int] = {}
+        for ref in refs:
+            if ref not in self._rank:
+                self._rank[ref] = len(self._rank)
+        self._keys = self._rank.keys()
+        self._lengths = sorted({len(ref) for ref in self._rank})
+
+    def __len__(self) -> int:
+        return len(self._rank)
+
+    def find(self, text: str) -> List[str]:
+        """
+        Returns the known references that occur in `text`, ordered by the
+        rank they were indexed with.
+        """
+        text = text or ""
+        n = len(text)
+        found = set()
+        for size in self._lengths:
+            if size > n:
+                break
+            windows = {text[i:i + size] for i in range(n - size + 1)}
+            found.update(self._keys & windows)
+        if len(found) > 1:
+            return sorted(found, key=self._rank.__getitem__)
+        return list(found)
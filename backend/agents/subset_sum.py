@@ -0,0 +1,69 @@
+# File: backend/agents/subset_sum.py
+import time
+from typing import Dict, List, Optional, Sequence
+
+
+class BudgetExceeded(Exception):
+    """
+    Raised when a subset-sum search runs past its deadline.
+    """
+    pass
+
+
+def find_subset(target: int, values: Sequence[int], max_size: int,
+                min_size: int = 2, deadline: Optional[float] = None) -> Optional[List[int]]:
+    """
+    Meet-in-the-middle search for `min_size`..`max_size` positions of
+    `values` (positive integer cents) that sum exactly to `target`.
+    Returns the sorted positions, or None if no such group exists.
+
+    Each half enumerates only subsets of at most `max_size` items, so the
+    work is bounded by C(n/2, <=max_size) per half rather than 2^n.
+    `deadline` is a time.perf_counter() value; past it BudgetExceeded is raised.
+    """
+    if deadline is not None and time.perf_counter() > deadline:
+        raise BudgetExceeded()
+    n = len(values)
+    if n < min_size or target <= 0 or sum(values) < target:
+        return None
+
+    half = n // 2
+    # sum -> {group size -> positions} for the left half
+    left: Dict[int, Dict[int, tuple]] = {}
+    for size, combo, total in _bounded_subsets(range(half), values, target, max_size, deadline):
+        left.setdefault(total, {}).setdefault(size, combo)
+
+    for size_b, combo_b, total_b in _bounded_subsets(range(half, n), values, target, max_size, deadline):
+        by_size = left.get(target - total_b)
+        if not by_size:
+            continue
+        for size_a, combo_a in sorted(by_size.items()):
+            if min_size <= size_a + size_b <= max_size:
+                return sorted(combo_a + combo_b)
+    return None
+
+
+def _bounded_subsets(positions, values, target, max_size, deadline):
+    """
+    Yields (size, positions, sum) for every subset of `positions` with at
+    most `max_size` items whose sum does not exceed `target`. Items are
+    visited in ascending order so a branch stops at the first item that
+    would overshoot the target.
+    """
+    items = sorted((values[i], i) for i in positions if values[i] <= target)
+    stack = [(0, (), 0)] # (next item, positions, sum)
+    visited = 0
+    while stack:
+        start, combo, total = stack.pop()
+        yield len(combo), combo, total
+
+        visited += 1
+        if deadline is not None and visited % 1024 == 0 and time.perf_counter() > deadline:
+            raise BudgetExceeded()
+        if len(combo) == max_size:
+            continue
+        for j in range(start, len(items)):
+            value, i = items[j]
+            if total + value > target:
+                break
+            stack.append((j + 1, combo + (i,), total + value))
@@ -0,0 +1,144 @@
+# File: backend/agents/uploads.py
+"""
+Chunked reading and validation of uploaded statement files (CSV or
+Parquet) for IntakeAgent.process_uploads / load_uploads.
+
+Every column is read as a string and converted explicitly (amounts to
+float64, dates to datetime64), so a bad value is reported with its row
+number instead of failing the whole chunk. Checks run on whole columns
+of a chunk at a time.
+"""
+import os
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHUNK_ROWS = 100_000
+
+# Columns read per file kind -> required
+UPLOAD_COLUMNS: Dict[str, Dict[str, bool]] = {
+    "invoices": {"invoice_id": True, "customer_id": False, "amount": True, "currency": True,
+                 "vendor_name": True, "po_number": False, "invoice_date": True},
+    "payments": {"payment_id": True, "customer_id": False, "amount": True, "currency": True,
+                 "sender_name": True, "trace_id": False, "remittance_raw": False, "payment_date": True},
+}
+ID_COLUMNS = {"invoices": "invoice_id", "payments": "payment_id"}
+DATE_COLUMNS = {"invoices": "invoice_date", "payments": "payment_date"}
+
+# Row numbers listed per problem in error messages
+MAX_REPORTED_ROWS = 5
+
+
+class UploadValidationError(ValueError):
+    """
+    An uploaded file failed validation; `problems` lists what was wrong.
+    """
+
+    def __init__(self, kind: str, problems: List[str]):
+        self.kind = kind
+        self.problems = problems
+        super().__init__(f"{kind}: " + "; ".join(problems))
+
+
+def file_format(path: str) -> str:
+    name = path.lower()
+    if name.endswith((".csv", ".csv.gz", ".txt")):
+        return "csv"
+    if name.endswith((".parquet", ".pq")):
+        return "parquet"
+    raise ValueError(f"Unsupported file type: {os.path.basename(path)} (expected .csv or .parquet)")
+
+
+def _parquet_file(path: str):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet uploads need pyarrow (pip install pyarrow)") from e
+    return pq.ParquetFile(path)
+
+
+def header(path: str) -> List[str]:
+    if file_format(path) == "csv":
+        return list(pd.read_csv(path, nrows=0).columns)
+    return list(_parquet_file(path).schema_arrow.names)
+
+
+def iter_raw_chunks(path: str, columns: List[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Yields DataFrames of at most `chunk_size` rows with only `columns`.
+    CSV fields arrive as strings (empty = missing); Parquet keeps its own
+    column types, which the conversions in validate_chunk accept as well.
+    """
+    if file_format(path) == "csv":
+        yield from pd.read_csv(path, usecols=columns, dtype="string", chunksize=chunk_size,
+                               keep_default_na=False, na_values=[""])
+        return
+    for batch in _parquet_file(path).iter_batches(batch_size=chunk_size, columns=columns):
+        yield batch.to_pandas()
+
+
+def _report(problems: List[str], mask, offset: int, what: str):
+    rows = np.flatnonzero(np.asarray(mask, dtype=bool))
+    if len(rows):
+        listed = ", ".join(str(offset + r + 1) for r in rows[:MAX_REPORTED_ROWS].tolist())
+        more = f" (+{len(rows) - MAX_REPORTED_ROWS} more)" if len(rows) > MAX_REPORTED_ROWS else ""
+        problems.append(f"{what} in row(s) {listed}{more}")
+
+
+def validate_chunk(df: pd.DataFrame, kind: str, customer_id: str, offset: int = 0) -> pd.DataFrame:
+    """
+    Checks one chunk and returns it with `amount` as float64 and the date
+    column as datetime64. `offset` is the number of data rows before the
+    chunk, for row numbers in errors (1 = first data row).
+    """
+    problems: List[str] = []
+    for column, required in UPLOAD_COLUMNS[kind].items():
+        if required and column in df:
+            _report(problems, df[column].isna(), offset, f"missing {column}")
+
+    amount = pd.to_numeric(df["amount"], errors="coerce").astype("float64")
+    _report(problems, df["amount"].notna() & ~np.isfinite(amount.to_numpy()), offset, "amount is not a number")
+
+    date_column = DATE_COLUMNS[kind]
+    dates = pd.to_datetime(df[date_column], errors="coerce", format="ISO8601")
+    _report(problems, df[date_column].notna() & dates.isna(), offset, f"{date_column} is not an ISO date")
+
+    # Customer isolation: rows without a customer_id belong to the uploader
+    if "customer_id" in df:
+        _report(problems, df["customer_id"].notna() & (df["customer_id"] != customer_id).fillna(True), offset,
+                f"customer_id is not {customer_id}")
+
+    if problems:
+        raise UploadValidationError(kind, problems)
+    return df.assign(amount=amount, **{date_column: dates})
+
+
+def iter_upload(path: str, kind: str, customer_id: str, chunk_size: int = DEFAULT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Validated chunks of an uploaded invoice or payment file. Raises
+    UploadValidationError for missing columns or at the first bad chunk.
+    """
+    names = header(path)
+    missing = [c for c, required in UPLOAD_COLUMNS[kind].items() if required and c not in names]
+    if missing:
+        raise UploadValidationError(kind, [f"missing column(s) {', '.join(missing)}"])
+    columns = [c for c in UPLOAD_COLUMNS[kind] if c in names]
+    offset = 0
+    for df in iter_raw_chunks(path, columns, chunk_size):
+        yield validate_chunk(df.reset_index(drop=True), kind, customer_id, offset)
+        offset += len(df)
+
+
+def values(df: pd.DataFrame, column: str) -> List[Optional[object]]:
+    """
+    Python values of a column, None where missing (or absent).
+    """
+    if column not in df:
+        return [None] * len(df)
+    col = df[column]
+    return col.astype(object).where(col.notna(), None).tolist()
+
+
+def dates(df: pd.DataFrame, column: str) -> np.ndarray:
+    return df[column].to_numpy(dtype="datetime64[us]")
@@ -0,0 +1,107 @@
+# File: backend/agents/vector_index.py
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+
+
+def to_vector(value) -> np.ndarray:
+    """
+    Converts a fetched embedding (oracledb VECTOR -> array.array, local
+    stand-in -> float32 bytes) to a float32 NumPy array.
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return np.frombuffer(value, dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+class VectorIndex:
+    """
+    In-process exact nearest-neighbour search over one tenant's embeddings.
+    Vectors are L2-normalised once, so a batch of queries is a single
+    matrix multiply followed by argpartition for the top k.
+    """
+
+    def __init__(self, ids: Sequence[str], vectors: np.ndarray):
+        self.ids = list(ids)
+        self._pos = {source_id: i for i, source_id in enumerate(self.ids)}
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(self.ids), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = matrix / np.where(norms == 0, 1, norms)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, source_id: str) -> bool:
+        return source_id in self._pos
+
+    def vectors_for(self, source_ids: Sequence[str]) -> np.ndarray:
+        return self.matrix[[self._pos[s] for s in source_ids]]
+
+    def top_k(self, queries: np.ndarray, k: int = 3, chunk_size: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (positions, cosine distances), both shaped (len(queries), k)
+        and ordered nearest first. Queries are processed in chunks to bound
+        the size of the similarity matrix.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        k = min(k, len(self.ids))
+        positions = np.empty((len(queries), k), dtype=np.int64)
+        distances = np.empty((len(queries), k), dtype=np.float32)
+        if k == 0:
+            return positions, distances
+
+        for start in range(0, len(queries), chunk_size):
+            sims = queries[start:start + chunk_size] @ self.matrix.T
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            top_sims = np.take_along_axis(sims, top, axis=1)
+            order = np.argsort(-top_sims, axis=1)
+            positions[start:start + chunk_size] = np.take_along_axis(top, order, axis=1)
+            distances[start:start + chunk_size] = 1 - np.take_along_axis(top_sims, order, axis=1)
+        return positions, distances
+
+
+class TenantVectorEngine:
+    """
+    Loads a tenant's `metadata_vectors` embeddings into memory once and
+    answers batched payment -> invoice similarity lookups without the
+    database.
+    """
+
+    def __init__(self, invoices: VectorIndex, payments: VectorIndex):
+        self.invoices = invoices
+        self.payments = payments
+
+    @classmethod
+    def load(cls, customer_id: str) -> "TenantVectorEngine":
+        from db.connection import execute_query
+
+        rows = execute_query(
+            "SELECT source_type, source_id, embedding FROM metadata_vectors "
+            "WHERE customer_id = :1 AND embedding IS NOT NULL",
+            [customer_id]
+        )
+        by_type = {"INVOICE": ([], []), "PAYMENT": ([], [])}
+        for source_type, source_id, embedding in rows:
+            if source_type in by_type:
+                by_type[source_type][0].append(source_id)
+                by_type[source_type][1].append(to_vector(embedding))
+
+        def build(ids, vectors):
+            return VectorIndex(ids, np.vstack(vectors) if vectors else np.empty((0, 0), dtype=np.float32))
+
+        return cls(build(*by_type["INVOICE"]), build(*by_type["PAYMENT"]))
+
+    def match_payments(self, payment_ids: Sequence[str], k: int = 3) -> Dict[str, List[dict]]:
+        """
+        Top-k invoice candidates for every payment with an embedding, in the
+        same shape as MatchingAgent.get_oracle_vector_matches.
+        """
+        known = [pid for pid in payment_ids if pid in self.payments]
+        if not known or not len(self.invoices):
+            return {pid: [] for pid in payment_ids}
+        positions, distances = self.invoices.top_k(self.payments.vectors_for(known), k)
+        results = {pid: [] for pid in payment_ids}
+        for pid, pos_row, dist_row in zip(known, positions.tolist(), distances.tolist()):
+            results[pid] = [{"invoice_id": self.invoices.ids[p], "distance": d} for p, d in zip(pos_row, dist_row)]
+        return results
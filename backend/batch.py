@@ -0,0 +1,194 @@
+# File: backend/batch.py
+"""
+Multi-tenant batch reconciliation: spreads orchestrator runs for many
+customers across a process pool.
+
+CLI usage (from the repo root):
+    python -m backend.batch --all
+    python -m backend.batch --customers CUST-1000 CUST-1001 --workers 4 --output batch.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def run_tenant(customer_id: str, tenant_name: str, columnar: bool = False,
+               settings: Optional[Dict[str, Any]] = None, incremental: bool = False,
+               persist: bool = False, pushdown: bool = False, reset_state: bool = False) -> Dict[str, Any]:
+    """
+    Runs one tenant's orchestrator in the calling (worker) process and
+    returns its summary. Every call builds its own run state; with
+    `reset_state` the worker's module-level state is dropped afterwards too
+    (see reset_worker_state).
+    """
+    from .agents.models import ReconciliationState, CustomerContext, MatchSettings
+    from .agents.orchestrator import ReconciliationOrchestrator
+
+    state = ReconciliationState(context=CustomerContext(
+        customer_id=customer_id, tenant_name=tenant_name, settings=MatchSettings(**(settings or {}))
+    ))
+    start = time.perf_counter()
+    try:
+        final_state = asyncio.run(ReconciliationOrchestrator(
+            state, columnar=columnar, incremental=incremental, persist=persist, pushdown=pushdown
+        ).run())
+    except Exception as e:
+        return {"customer_id": customer_id, "status": "FAILED", "error": str(e),
+                "elapsed_s": round(time.perf_counter() - start, 3)}
+    finally:
+        if reset_state:
+            reset_worker_state()
+    return summarize_state(final_state, time.perf_counter() - start)
+
+
+def reset_worker_state():
+    """
+    Drops what a worker process would otherwise carry from one tenant to
+    the next: the audit sink (after flushing it), the DB executor and
+    connection pool, the result cache and the OpenAI client. Stands in for
+    worker recycling where max_tasks_per_child is unavailable (< 3.11).
+    """
+    from db.connection import close_pool, shutdown_db_executor
+    from .agents import orchestrator
+    from .agents.audit_sink import close_audit_sink
+    from .result_cache import result_cache
+
+    close_audit_sink()
+    shutdown_db_executor()
+    close_pool()
+    result_cache.clear()
+    orchestrator.client = orchestrator.create_client()
+
+
+def summarize_state(state, elapsed_s: float) -> Dict[str, Any]:
+    """
+    Per-tenant summary metrics of a finished run.
+    """
+    num_invoices = len(state.invoice_batch) if state.invoice_batch is not None else len(state.invoices)
+    num_payments = len(state.payment_batch) if state.payment_batch is not None else len(state.payments)
+    # Rows of pushed-down exact matches were never loaded
+    num_invoices += len(state.pushdown_matches)
+    num_payments += len(state.pushdown_matches)
+    matches_by_type: Dict[str, int] = {}
+    for m in state.matches:
+        matches_by_type[m['match_type']] = matches_by_type.get(m['match_type'], 0) + 1
+    return {
+        "customer_id": state.context.customer_id,
+        "status": "SUCCESS",
+        "invoices": num_invoices,
+        "payments": num_payments,
+        "matches": len(state.matches),
+        "matches_by_type": matches_by_type,
+        "proposed": sum(1 for m in state.matches if m.get('status') == 'PROPOSED'),
+        "exceptions": len(state.exceptions),
+        "persisted": next((h.data['inserted'] for h in state.history if h.agent_name == "PersistenceAgent"), None),
+        "elapsed_s": round(elapsed_s, 3),
+        "timings": state.timings,
+    }
+
+
+def list_customers() -> List[Tuple[str, str]]:
+    """
+    (customer_id, name) of every tenant.
+    """
+    from db.connection import execute_query
+    return [(r[0], r[1] or r[0]) for r in execute_query("SELECT customer_id, name FROM customers ORDER BY customer_id")]
+
+
+def reconcile_many(customers: List[Tuple[str, str]], max_workers: Optional[int] = None,
+                   columnar: bool = False, settings: Optional[Dict[str, Any]] = None,
+                   max_tasks_per_child: Optional[int] = 1, incremental: bool = False,
+                   persist: bool = False, pushdown: bool = False) -> Dict[str, Any]:
+    """
+    Runs every (customer_id, tenant_name) on a process pool sized to the
+    machine's cores and returns per-tenant summaries plus throughput.
+
+    Workers are started with the 'spawn' method so they never inherit the
+    parent's connections or module state. By default
+    (`max_tasks_per_child=1`) a worker is replaced after every tenant, so
+    no connection pool, audit sink, cache or client outlives a customer;
+    before Python 3.11 workers are kept and reset_worker_state() runs after
+    each tenant instead. `None` keeps workers (and that state) for the
+    whole batch: faster for many small tenants, which then skip the
+    process start-up and pool warm-up, but without that isolation.
+    """
+    if not customers:
+        return {"tenants": [], "throughput": {"tenants": 0, "elapsed_s": 0.0}}
+
+    pool_options, reset_state = {}, False
+    if max_tasks_per_child is not None:
+        if sys.version_info >= (3, 11):
+            pool_options["max_tasks_per_child"] = max_tasks_per_child
+        else:
+            reset_state = True
+
+    workers = min(max_workers or os.cpu_count() or 1, len(customers))
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        **pool_options
+    ) as pool:
+        futures = [pool.submit(run_tenant, cid, name, columnar, settings, incremental, persist, pushdown, reset_state)
+                   for cid, name in customers]
+        results = []
+        for (cid, _), future in zip(customers, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # Worker crashed (e.g. killed by the OOM killer)
+                results.append({"customer_id": cid, "status": "FAILED", "error": str(e)})
+    elapsed = time.perf_counter() - start
+
+    succeeded = [r for r in results if r['status'] == 'SUCCESS']
+    rows = sum(r['invoices'] + r['payments'] for r in succeeded)
+    return {
+        "tenants": results,
+        "throughput": {
+            "tenants": len(results),
+            "succeeded": len(succeeded),
+            "failed": len(results) - len(succeeded),
+            "workers": workers,
+            "elapsed_s": round(elapsed, 3),
+            "tenants_per_s": round(len(results) / elapsed, 2) if elapsed else None,
+            "rows_per_s": round(rows / elapsed, 1) if elapsed else None,
+            "matches": sum(r['matches'] for r in succeeded),
+        }
+    }
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Reconcile many customers on a process pool.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--all", action="store_true", help="every customer in the customers table")
+    target.add_argument("--customers", nargs="+", metavar="CUSTOMER_ID")
+    parser.add_argument("--workers", type=int, default=None, help="defaults to the number of CPU cores")
+    parser.add_argument("--columnar", action="store_true")
+    parser.add_argument("--incremental", action="store_true", help="only reconcile still-open items (requires --persist)")
+    parser.add_argument("--persist", action="store_true", help="write proposed matches and statuses to the database")
+    parser.add_argument("--pushdown", action="store_true", help="match unambiguous exact 1:1 pairs in the database")
+    parser.add_argument("--max-tasks-per-child", type=int, default=1,
+                        help="tenants per worker process before it is replaced (default 1; 0 keeps workers for "
+                             "the whole batch: faster, but tenants share per-process pools and caches)")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+    if args.incremental and not args.persist:
+        parser.error("--incremental requires --persist (the watermark is saved with the persisted matches)")
+
+    customers = list_customers() if args.all else [(cid, cid) for cid in args.customers]
+    report = reconcile_many(customers, max_workers=args.workers, columnar=args.columnar, incremental=args.incremental,
+                            persist=args.persist, pushdown=args.pushdown,
+                            max_tasks_per_child=args.max_tasks_per_child or None)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report["throughput"], indent=2))
@@ -0,0 +1,251 @@
+# File: backend/jobs.py
+"""
+Background reconciliation jobs: a submission returns a job ID at once
+while a bounded thread pool runs the orchestrator. Jobs record per-stage
+progress events, can be cancelled, and a second submission for a tenant
+that already has a queued or running job attaches to that job (except
+for uploaded-file jobs, which always run).
+"""
+import asyncio
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .metrics import observe_cache_hit, observe_run
+from .result_cache import lookup as cache_lookup, store as cache_store
+from .run_store import run_store
+
+ACTIVE = ("QUEUED", "RUNNING")
+
+
+class Job:
+    def __init__(self, request: Dict[str, Any]):
+        self.job_id = uuid.uuid4().hex
+        self.customer_id = request["customer_id"]
+        self.request = request
+        self.status = "QUEUED" # QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.stages: List[str] = []
+        self.completed_stages: List[str] = []
+        self.events: List[Dict[str, Any]] = []
+        # Per-stage timings of the run (see ReconciliationState.timings)
+        self.timings: List[Dict[str, Any]] = []
+        self.run_id: Optional[str] = None
+        self.error: Optional[str] = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    @property
+    def done(self) -> bool:
+        return self.status not in ACTIVE
+
+    def snapshot(self, after: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Job status; only events with seq > `after` are included.
+        """
+        return {
+            "job_id": self.job_id,
+            "customer_id": self.customer_id,
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "progress": round(len(self.completed_stages) / len(self.stages), 3) if self.stages else 0.0,
+            "stage": self.completed_stages[-1] if self.completed_stages else None,
+            "run_id": self.run_id,
+            "error": self.error,
+            "timings": self.timings,
+            "events": self.events[after + 1:] if after is not None else self.events,
+        }
+
+
+class JobManager:
+    """
+    Runs reconciliation jobs on `max_workers` threads (each job drives its
+    own event loop) and keeps finished jobs for `retention_s` seconds.
+    """
+
+    def __init__(self, max_workers: int = 2, retention_s: float = 3600):
+        self.max_workers = max_workers
+        self.retention_s = retention_s
+        self._jobs: Dict[str, Job] = {}
+        self._active_by_customer: Dict[str, str] = {}
+        self._cond = threading.Condition()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="recon-job")
+        return self._executor
+
+    def submit(self, request: Dict[str, Any]):
+        """
+        Queues a job for request["customer_id"], or returns the tenant's
+        queued/running job. Returns (job, attached). Requests with
+        "uploads" ({"invoices": path, "payments": path}) reconcile those
+        files instead of the database; the files are deleted when the job
+        finishes.
+        """
+        uploads = request.get("uploads")
+        with self._cond:
+            self._expire()
+            active_id = self._active_by_customer.get(request["customer_id"])
+            if active_id is not None and not uploads:
+                return self._jobs[active_id], True
+            job = Job(request)
+            self._jobs[job.job_id] = job
+            if not uploads:
+                self._active_by_customer[job.customer_id] = job.job_id
+            self._event(job, "queued", {})
+            job.future = self._get_executor().submit(self._run, job)
+        return job, False
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def list(self, customer_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._cond:
+            jobs = list(self._jobs.values())
+        return [{k: v for k, v in job.snapshot().items() if k != "events"}
+                for job in reversed(jobs) if customer_id is None or job.customer_id == customer_id]
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Queued jobs are cancelled at once; running ones stop at the next
+        stage boundary.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return job
+            job.cancel_event.set()
+            if job.status == "QUEUED" and job.future.cancel():
+                self._finish(job, "CANCELLED", error="Cancelled before it started")
+            else:
+                self._event(job, "cancel_requested", {})
+        return job
+
+    def wait(self, job: Job, after: Optional[int], timeout: float) -> bool:
+        """
+        Blocks until `job` has events after seq `after` or finishes, or
+        `timeout` passes. Returns True if there is something new.
+        """
+        last = -1 if after is None else after
+        with self._cond:
+            return self._cond.wait_for(lambda: len(job.events) - 1 > last or job.done, timeout)
+
+    def _event(self, job: Job, stage: str, data: Dict[str, Any]):
+        # Callers hold self._cond
+        job.events.append({"seq": len(job.events), "time": datetime.now().isoformat(), "stage": stage, "data": data})
+        self._cond.notify_all()
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None):
+        job.status = status
+        job.error = error
+        job.finished_at = datetime.now()
+        if self._active_by_customer.get(job.customer_id) == job.job_id:
+            del self._active_by_customer[job.customer_id]
+        for path in (job.request.get("uploads") or {}).values():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._event(job, status.lower(), {"run_id": job.run_id} if job.run_id else ({"error": error} if error else {}))
+
+    def _expire(self):
+        cutoff = time.time() - self.retention_s
+        for job_id in [j.job_id for j in self._jobs.values() if j.done and j.finished_at.timestamp() < cutoff]:
+            del self._jobs[job_id]
+
+    def _run(self, job: Job):
+        from .agents.models import ReconciliationState, CustomerContext, MatchSettings
+        from .agents.orchestrator import ReconciliationOrchestrator, RunCancelled
+
+        request = job.request
+
+        def progress(stage, data):
+            with self._cond:
+                if stage in job.stages:
+                    job.completed_stages.append(stage)
+                self._event(job, stage, data)
+
+        # Runs with side effects are never served from the cache
+        use_cache = request.get("use_cache", True) and not (request.get("incremental") or request.get("persist")
+                                                            or request.get("uploads"))
+        start = time.perf_counter()
+        state = None
+        try:
+            if use_cache:
+                cached, token = cache_lookup(request["customer_id"], request.get("columnar", False),
+                                             request.get("stream_batch_size"), request.get("settings") or {},
+                                             request.get("pushdown", False))
+                if cached is not None:
+                    run_store.put(cached)
+                    observe_cache_hit(cached.state.timings)
+                    with self._cond:
+                        job.run_id = cached.run_id
+                        job.timings = cached.state.timings
+                        job.started_at = datetime.now()
+                        self._event(job, "cache_hit", {"run_id": cached.run_id})
+                        self._finish(job, "SUCCEEDED")
+                    return
+            state = ReconciliationState(context=CustomerContext(
+                customer_id=request["customer_id"], tenant_name=request["tenant_name"],
+                settings=MatchSettings(**(request.get("settings") or {}))
+            ))
+            orchestrator = ReconciliationOrchestrator(
+                state, columnar=request.get("columnar", False), incremental=request.get("incremental", False),
+                stream_batch_size=request.get("stream_batch_size"), persist=request.get("persist", False),
+                pushdown=request.get("pushdown", False), uploads=request.get("uploads"),
+                progress=progress, cancel_event=job.cancel_event
+            )
+            with self._cond:
+                job.status = "RUNNING"
+                job.started_at = datetime.now()
+                job.stages = orchestrator.stages()
+                self._event(job, "started", {"stages": job.stages})
+            final_state = asyncio.run(orchestrator.run())
+            record = run_store.add(final_state, time.perf_counter() - start)
+            if use_cache:
+                cache_store(request["customer_id"], token, record)
+            observe_run(final_state.timings, elapsed_s=record.elapsed_s)
+            with self._cond:
+                job.run_id = record.run_id
+                job.timings = final_state.timings
+                self._finish(job, "SUCCEEDED")
+        except Exception as e:
+            status = "CANCELLED" if isinstance(e, RunCancelled) else "FAILED"
+            timings = state.timings if state is not None else []
+            observe_run(timings, status=status.lower(), elapsed_s=time.perf_counter() - start)
+            with self._cond:
+                job.timings = timings
+                self._finish(job, status, error=str(e))
+        finally:
+            # However the job ended, the tenant can submit again
+            with self._cond:
+                if not job.done:
+                    self._finish(job, "FAILED", error="Job ended unexpectedly")
+                if self._active_by_customer.get(job.customer_id) == job.job_id:
+                    del self._active_by_customer[job.customer_id]
+
+    def shutdown(self):
+        with self._cond:
+            for job in self._jobs.values():
+                if not job.done:
+                    job.cancel_event.set()
+                    if job.status == "QUEUED" and job.future.cancel():
+                        self._finish(job, "CANCELLED", error="Cancelled at shutdown")
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+job_manager = JobManager(max_workers=int(os.getenv("RECON_JOB_WORKERS", "2")),
+                         retention_s=float(os.getenv("RECON_JOB_RETENTION_S", "3600")))
@@ -1,19 +1,87 @@
 # File: backend/main.py
-from fastapi import FastAPI, HTTPException
-from .agents.models import ReconciliationState, CustomerContext
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from .agents.models import ReconciliationState, CustomerContext, MatchSettings
+from .agents.intake_agent import IntakeAgent
 from .agents.orchestrator import ReconciliationOrchestrator
-from pydantic import BaseModel
+from .agents.persistence_agent import PersistenceAgent
+from .agents.uploads import UploadValidationError, file_format
+from .jobs import job_manager
+from .metrics import observe_cache_hit, observe_run
+from .result_cache import lookup as cache_lookup, store as cache_store, result_cache
+from .run_store import run_store
+from pydantic import BaseModel, model_validator
+from typing import List, Optional
 from dotenv import load_dotenv
+import asyncio
+import json
 import os
+import shutil
+import tempfile
+import time
+import uuid
 
 # Load .env file
 load_dotenv()
 
-app = FastAPI(title="Bank-Grade Reconciliation AI")
+# Uploaded statement files are written here until their job or load finishes
+UPLOAD_DIR = os.getenv("UPLOAD_DIR") or os.path.join(tempfile.gettempdir(), "recon-uploads")
+UPLOAD_COPY_BYTES = 1024 * 1024
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Stop background jobs and flush buffered audit records, then drain the DB executor and the process-wide DB pool
+    from db.connection import close_pool, shutdown_db_executor
+    from .agents.audit_sink import close_audit_sink
+    await asyncio.to_thread(job_manager.shutdown)
+    await asyncio.to_thread(close_audit_sink)
+    await asyncio.to_thread(shutdown_db_executor)
+    await asyncio.to_thread(close_pool)
+
+app = FastAPI(title="Bank-Grade Reconciliation AI", lifespan=lifespan)
+
+def require_persist(request):
+    # The watermark of an incremental run only advances with its persisted matches
+    if request.incremental and not request.persist:
+        raise ValueError("incremental runs require persist")
+    return request
 
 class ReconciliationRequest(BaseModel):
     customer_id: str
     tenant_name: str
+    columnar: bool = False
+    incremental: bool = False
+    stream_batch_size: Optional[int] = None
+    persist: bool = False
+    # Match unambiguous exact 1:1 pairs in the database; only the rest is loaded
+    pushdown: bool = False
+    # Return the whole final state (every row) instead of the run summary
+    full_state: bool = False
+    # Serve an unchanged tenant's previous run (never for incremental/persist runs)
+    use_cache: bool = True
+    settings: MatchSettings = MatchSettings()
+
+    @model_validator(mode="after")
+    def check_incremental(self):
+        return require_persist(self)
+
+class BatchReconciliationRequest(BaseModel):
+    customer_ids: List[str] = []
+    all_customers: bool = False
+    max_workers: Optional[int] = None
+    max_tasks_per_child: Optional[int] = 1 # None: keep workers for the whole batch
+    columnar: bool = False
+    incremental: bool = False
+    persist: bool = False
+    pushdown: bool = False
+    settings: MatchSettings = MatchSettings()
+
+    @model_validator(mode="after")
+    def check_incremental(self):
+        return require_persist(self)
 
 class ManualMatchRequest(BaseModel):
     invoice_id: str
@@ -22,57 +90,366 @@ class ManualMatchRequest(BaseModel):
     operator: str = "USER-01"
     reason: str = ""
 
+class ManualLink(BaseModel):
+    # Every invoice is linked to every payment: 1:1, N:1, 1:N or N:M
+    invoice_ids: List[str]
+    payment_ids: List[str]
+    reason: str = ""
+
+class BulkManualMatchRequest(BaseModel):
+    customer_id: str
+    links: List[ManualLink]
+    operator: str = "USER-01"
+    reason: str = "" # default for links without their own reason
+    atomic: bool = False # roll back every link if any one fails
+
 @app.post("/reconcile")
 async def start_reconciliation(request: ReconciliationRequest):
+    from db.connection import run_db
+
     if not request.customer_id:
         raise HTTPException(status_code=400, detail="Customer context missing. Please specify customer/session scope.")
     
     # Initialize state
     state = ReconciliationState(
-        context=CustomerContext(customer_id=request.customer_id, tenant_name=request.tenant_name)
+        context=CustomerContext(customer_id=request.customer_id, tenant_name=request.tenant_name, settings=request.settings)
     )
     
-    # Orchestrate workflow
-    orchestrator = ReconciliationOrchestrator(state)
-    final_state = await orchestrator.run()
-    
-    return final_state
+    # Runs with side effects are never served from the cache
+    use_cache = request.use_cache and not (request.incremental or request.persist)
+    record = None
+    if use_cache:
+        record, token = await run_db(
+            cache_lookup, request.customer_id, request.columnar, request.stream_batch_size, request.settings.model_dump(),
+            request.pushdown
+        )
+        if record is not None:
+            run_store.put(record)
+            observe_cache_hit(record.state.timings)
+
+    if record is None:
+        # Orchestrate workflow
+        orchestrator = ReconciliationOrchestrator(
+            state, columnar=request.columnar, incremental=request.incremental,
+            stream_batch_size=request.stream_batch_size, persist=request.persist, pushdown=request.pushdown
+        )
+        start = time.perf_counter()
+        try:
+            # Matching is CPU-bound: run the pipeline on a worker thread with its
+            # own event loop (as jobs do), so this loop keeps serving requests
+            final_state = await run_in_threadpool(asyncio.run, orchestrator.run())
+        except Exception:
+            observe_run(orchestrator.state.timings, status="failed", elapsed_s=time.perf_counter() - start)
+            raise
+        record = run_store.add(final_state, time.perf_counter() - start)
+        observe_run(final_state.timings, elapsed_s=record.elapsed_s)
+        if use_cache:
+            cache_store(request.customer_id, token, record)
+        cached = False
+    else:
+        cached = True
+
+    if request.full_state:
+        # Row objects are only built here, for the response body
+        return record.state.model_copy().materialize_rows()
+    # Details are paged from /runs/{run_id}/...
+    return dict(record.summary(), cached=cached)
+
+@app.post("/jobs", status_code=202)
+def submit_reconciliation_job(request: ReconciliationRequest):
+    """
+    Queues a reconciliation and returns its job ID immediately. If the
+    tenant already has a queued or running job, that job is returned
+    (attached=true) instead of starting another.
+    """
+    if not request.customer_id:
+        raise HTTPException(status_code=400, detail="Customer context missing. Please specify customer/session scope.")
+    job, attached = job_manager.submit(request.model_dump())
+    return {"job_id": job.job_id, "status": job.status, "attached": attached}
+
+def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return job
+
+@app.get("/jobs")
+def list_jobs(customer_id: Optional[str] = None):
+    return job_manager.list(customer_id)
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str, after: Optional[int] = None, wait: float = 0):
+    """
+    Job status and progress events after seq `after`. With `wait` (seconds,
+    at most 30) the call long-polls until there is a new event.
+    """
+    job = get_job(job_id)
+    if wait > 0:
+        await asyncio.to_thread(job_manager.wait, job, after, min(wait, 30))
+    return job.snapshot(after)
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, after: Optional[int] = None):
+    """
+    Server-sent events stream of the job's progress events; ends when the
+    job finishes.
+    """
+    job = get_job(job_id)
+
+    async def stream():
+        last = after
+        while True:
+            await asyncio.to_thread(job_manager.wait, job, last, 15)
+            snapshot = job.snapshot(last)
+            for event in snapshot['events']:
+                last = event['seq']
+                yield f"id: {event['seq']}\nevent: {event['stage']}\ndata: {json.dumps(event)}\n\n"
+            if job.done and not snapshot['events']:
+                break
+            if not snapshot['events']:
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    get_job(job_id)
+    return job_manager.cancel(job_id).snapshot()
+
+async def save_uploads(customer_id: str, files: List[UploadFile]) -> List[str]:
+    """
+    Writes uploaded files to UPLOAD_DIR, UPLOAD_COPY_BYTES at a time on a
+    worker thread (the multipart parser has already spooled anything
+    larger than 1 MiB to a temporary file, so no upload is held in memory).
+    """
+    for upload in files:
+        try:
+            file_format(upload.filename or "")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    paths = []
+
+    def copy(upload, path):
+        with open(path, "wb") as f:
+            shutil.copyfileobj(upload.file, f, UPLOAD_COPY_BYTES)
+
+    try:
+        for upload in files:
+            path = os.path.join(UPLOAD_DIR, f"{customer_id}-{uuid.uuid4().hex}-{os.path.basename(upload.filename)}")
+            paths.append(path)
+            await asyncio.to_thread(copy, upload, path)
+    except BaseException:
+        remove_files(paths)
+        raise
+    return paths
+
+def remove_files(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+@app.post("/uploads/reconcile", status_code=202)
+async def reconcile_uploads(customer_id: str = Form(...), tenant_name: str = Form(""),
+                            invoices: UploadFile = File(...), payments: UploadFile = File(...),
+                            persist: bool = Form(False), settings: str = Form("{}")):
+    """
+    Multipart upload of an invoice and a payment statement file (CSV or
+    Parquet) that are reconciled as a background job; follow it with the
+    /jobs/{job_id} endpoints. `settings` is MatchSettings as JSON. Rows of
+    another customer fail the job.
+    """
+    try:
+        match_settings = MatchSettings(**json.loads(settings))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid settings: {e}")
+    invoice_path, payment_path = await save_uploads(customer_id, [invoices, payments])
+    job, _ = job_manager.submit({
+        "customer_id": customer_id, "tenant_name": tenant_name or customer_id, "persist": persist,
+        "settings": match_settings.model_dump(), "use_cache": False,
+        "uploads": {"invoices": invoice_path, "payments": payment_path},
+    })
+    return {"job_id": job.job_id, "status": job.status, "attached": False}
+
+@app.post("/uploads/load")
+async def load_uploads(customer_id: str = Form(...), invoices: UploadFile = File(...),
+                       payments: UploadFile = File(...)):
+    """
+    Multipart upload of an invoice and a payment statement file (CSV or
+    Parquet) that are bulk-loaded into the customer's tables in one
+    transaction. Returns rows read/inserted and row errors per file.
+    """
+    from db.connection import run_db
+
+    paths = await save_uploads(customer_id, [invoices, payments])
+    try:
+        report = await run_db(IntakeAgent(customer_id).load_uploads, *paths)
+    except UploadValidationError as e:
+        raise HTTPException(status_code=422, detail={"file": e.kind, "problems": e.problems})
+    finally:
+        remove_files(paths)
+    return {"customer_id": customer_id, **report}
+
+def get_run(run_id: str):
+    record = run_store.get(run_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Run {run_id} not found (expired or served by another worker).")
+    return record
+
+@app.get("/runs")
+def list_runs(customer_id: Optional[str] = None):
+    return run_store.list(customer_id)
+
+@app.get("/runs/{run_id}")
+def run_summary(run_id: str):
+    return get_run(run_id).summary()
+
+@app.get("/runs/{run_id}/matches")
+def run_matches(run_id: str, after: Optional[int] = None, limit: int = 100, match_type: Optional[str] = None,
+                status: Optional[str] = None, min_confidence: Optional[float] = None,
+                max_confidence: Optional[float] = None):
+    return run_store.matches(get_run(run_id), after, limit, match_type, status, min_confidence, max_confidence)
+
+@app.get("/runs/{run_id}/exceptions")
+def run_exceptions(run_id: str, after: Optional[int] = None, limit: int = 100, type: Optional[str] = None,
+                   severity: Optional[str] = None, min_amount: Optional[float] = None,
+                   max_amount: Optional[float] = None):
+    return run_store.exceptions(get_run(run_id), after, limit, type, severity, min_amount, max_amount)
+
+@app.get("/runs/{run_id}/audit")
+def run_audit(run_id: str, after: Optional[int] = None, limit: int = 100, action: Optional[str] = None,
+              entity_type: Optional[str] = None):
+    return run_store.audit(get_run(run_id), after, limit, action, entity_type)
+
+@app.get("/runs/{run_id}/invoices")
+def run_invoices(run_id: str, after: Optional[int] = None, limit: int = 100, matched: Optional[bool] = None):
+    return run_store.invoices(get_run(run_id), after, limit, matched)
+
+@app.get("/runs/{run_id}/payments")
+def run_payments(run_id: str, after: Optional[int] = None, limit: int = 100, matched: Optional[bool] = None):
+    return run_store.payments(get_run(run_id), after, limit, matched)
+
+@app.post("/reconcile/batch")
+async def start_batch_reconciliation(request: BatchReconciliationRequest):
+    from .batch import list_customers, reconcile_many
+
+    if request.all_customers:
+        customers = await asyncio.to_thread(list_customers)
+    elif request.customer_ids:
+        customers = [(cid, cid) for cid in request.customer_ids]
+    else:
+        raise HTTPException(status_code=400, detail="Specify customer_ids or set all_customers.")
+
+    # The process pool is driven from a thread so this worker keeps serving requests
+    report = await asyncio.to_thread(
+        reconcile_many, customers, request.max_workers, request.columnar, request.settings.model_dump(),
+        max_tasks_per_child=request.max_tasks_per_child, incremental=request.incremental, persist=request.persist,
+        pushdown=request.pushdown
+    )
+    for tenant in report["tenants"]:
+        observe_run(tenant.get("timings", []), status=tenant["status"].lower(), elapsed_s=tenant.get("elapsed_s"))
+    return report
+
 @app.post("/manual-match")
 async def manual_match(request: ManualMatchRequest):
-    from db.connection import execute_statement
-    import datetime
-    
+    from db.connection import run_db
+
     try:
-        # 1. Insert into reconciliation_matches
-        execute_statement(
-            "INSERT INTO reconciliation_matches (invoice_id, payment_id, customer_id, match_type, confidence_score, explanation) "
-            "VALUES (:1, :2, :3, 'MANUAL_OVERRIDE', 1.0, :4)",
-            [request.invoice_id, request.payment_id, request.customer_id, request.reason]
-        )
-        
-        # 2. Update Invoice Status
-        execute_statement(
-            "UPDATE invoices SET status = 'MATCHED' WHERE invoice_id = :1 AND customer_id = :2",
-            [request.invoice_id, request.customer_id]
+        # Insert, both status updates and the audit entry commit together
+        agent = PersistenceAgent(request.customer_id)
+        result, = await run_db(
+            agent.apply_manual_links, [([request.invoice_id], [request.payment_id], request.reason)], request.operator
         )
-        
-        # 3. Update Payment Status
-        execute_statement(
-            "UPDATE payments SET status = 'MATCHED' WHERE payment_id = :1 AND customer_id = :2",
-            [request.payment_id, request.customer_id]
-        )
-        
-        # 4. Log to Audit Trail
-        execute_statement(
-            "INSERT INTO audit_trail (entity_type, entity_id, customer_id, action, operator_id, timestamp) "
-            "VALUES ('MATCH', :1, :2, 'MANUAL_OVERRIDE', :3, CURRENT_TIMESTAMP)",
-            [f"{request.invoice_id}:{request.payment_id}", request.customer_id, request.operator]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database persistence failed: {str(e)}")
+    if result["status"] != "APPLIED":
+        raise HTTPException(status_code=500, detail=f"Database persistence failed: {result['error']}")
+    result_cache.invalidate(request.customer_id)
+    replaced = " (replaced the stored match)" if result["overridden"] else ""
+    return {"status": "success",
+            "message": f"Persisted manual match: {request.invoice_id} -> {request.payment_id}{replaced}"}
+
+@app.post("/manual-match/bulk")
+async def bulk_manual_match(request: BulkManualMatchRequest):
+    """
+    Applies many manual links (1:1 or N:M groups) in one transaction over
+    one pooled connection and returns a result per group.
+    """
+    from db.connection import run_db
+
+    if not request.links:
+        raise HTTPException(status_code=400, detail="No links to apply.")
+    agent = PersistenceAgent(request.customer_id)
+    try:
+        results = await run_db(
+            agent.apply_manual_links,
+            [(link.invoice_ids, link.payment_ids, link.reason or request.reason) for link in request.links],
+            request.operator, atomic=request.atomic
         )
-        
-        return {"status": "success", "message": f"Persisted manual match: {request.invoice_id} -> {request.payment_id}"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database persistence failed: {str(e)}")
 
+    applied = sum(1 for r in results if r["status"] == "APPLIED")
+    if applied:
+        result_cache.invalidate(request.customer_id)
+    return {
+        "status": "success" if applied == len(results) else "partial" if applied else "failed",
+        "applied": applied,
+        "failed": len(results) - applied,
+        "results": results,
+    }
+
+@app.get("/audit/verify/{customer_id}")
+async def verify_audit_chain(customer_id: str, after_audit_id: Optional[int] = None, previous_hash: Optional[str] = None):
+    """
+    Recomputes the customer's audit hash chain, optionally from a trusted
+    checkpoint (audit_id and its chain_hash) instead of the first record.
+    """
+    from db.connection import run_db
+    from .agents.audit_sink import verify_chain
+    return await run_db(verify_chain, customer_id, after_audit_id, previous_hash)
+
+@app.get("/cache/stats")
+def cache_stats():
+    """
+    Result cache hit/miss counters and occupancy.
+    """
+    return result_cache.describe()
+
+@app.post("/cache/invalidate")
+def invalidate_cache(customer_id: Optional[str] = None):
+    """
+    Drops cached runs of one customer (or all), e.g. after a data load
+    that edits rows in place.
+    """
+    if customer_id:
+        result_cache.invalidate(customer_id)
+    else:
+        result_cache.clear()
+    return result_cache.describe()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Prometheus text exposition: run, stage and match-phase counters and
+    histograms labelled by stage and tenant size bucket.
+    """
+    from .metrics import render
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 def health_check():
     return {"status": "healthy", "database": "oracle_26ai_ready"}
+
+@app.get("/health/db")
+def db_health_check():
+    """
+    Pings the database through the pool and reports pool usage and acquire wait times.
+    """
+    from db.connection import check_pool_health
+    try:
+        return {"status": "healthy", "pool": check_pool_health()}
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Database unavailable: {str(e)}")
@@ -0,0 +1,180 @@
+# File: backend/metrics.py
+"""
+Process-wide reconciliation metrics in the Prometheus text format, served
+by GET /metrics. Runs publish their per-stage timings (see
+ReconciliationOrchestrator.run_stage) labelled by stage and tenant size
+bucket.
+"""
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Upper bounds (invoices + payments) of the tenant size buckets
+SIZE_BUCKETS = ((1_000, "le_1k"), (10_000, "le_10k"), (100_000, "le_100k"), (1_000_000, "le_1m"),
+                (10_000_000, "le_10m"))
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def size_bucket(rows: int) -> str:
+    for bound, label in SIZE_BUCKETS:
+        if rows <= bound:
+            return label
+    return "gt_10m"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1, **labels):
+        key = tuple(str(labels[n]) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{_format_labels(self.labels, key)} {_format_value(v)}" for key, v in items)
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value: float, **labels):
+        key = tuple(str(labels[n]) for n in self.labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # labels -> [per-bucket counts, sum, count]
+        self._values: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[n]) for n in self.labels)
+        with self._lock:
+            entry = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, (list(e[0]), e[1], e[2])) for key, e in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, ('le', _format_value(bound)))} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+registry = Registry()
+
+RUNS = registry.register(Counter(
+    "recon_runs_total", "Reconciliation runs by outcome.", ("status", "size")))
+RUN_SECONDS = registry.register(Histogram(
+    "recon_run_duration_seconds", "Wall time of a reconciliation run.", ("size",)))
+STAGE_SECONDS = registry.register(Histogram(
+    "recon_stage_duration_seconds", "Wall time per orchestrator stage.", ("stage", "size")))
+STAGE_ROWS_IN = registry.register(Counter(
+    "recon_stage_rows_in_total", "Rows consumed per orchestrator stage.", ("stage", "size")))
+STAGE_ROWS_OUT = registry.register(Counter(
+    "recon_stage_rows_out_total", "Rows produced per orchestrator stage.", ("stage", "size")))
+PHASE_SECONDS = registry.register(Histogram(
+    "recon_match_phase_duration_seconds", "Wall time per hybrid_match phase.", ("phase", "size")))
+PHASE_MATCHES = registry.register(Counter(
+    "recon_match_phase_matches_total", "Matches found per hybrid_match phase.", ("phase", "size")))
+PEAK_RSS = registry.register(Gauge(
+    "recon_process_peak_rss_bytes", "Peak resident set size of this process."))
+CACHE_HITS = registry.register(Counter(
+    "recon_result_cache_hits_total", "Runs served from the result cache.", ("size",)))
+
+
+def _run_size(timings: Iterable[Dict[str, Any]]) -> str:
+    rows = next((t["rows_out"] for t in timings if t["stage"] == "intake"), None)
+    # Runs that failed before intake finished
+    return "unknown" if rows is None else size_bucket(rows)
+
+
+def observe_run(timings: Iterable[Dict[str, Any]], status: str = "success", elapsed_s: Optional[float] = None):
+    """
+    Publishes one run's stage timings (state.timings). The size bucket
+    comes from the rows loaded by intake ("unknown" if it did not finish).
+    """
+    timings = list(timings)
+    size = _run_size(timings)
+    RUNS.inc(status=status, size=size)
+    if elapsed_s is None:
+        elapsed_s = sum(t["seconds"] for t in timings)
+    RUN_SECONDS.observe(elapsed_s, size=size)
+    for t in timings:
+        STAGE_SECONDS.observe(t["seconds"], stage=t["stage"], size=size)
+        STAGE_ROWS_IN.inc(t["rows_in"], stage=t["stage"], size=size)
+        STAGE_ROWS_OUT.inc(t["rows_out"], stage=t["stage"], size=size)
+        for phase, p in t.get("phases", {}).items():
+            PHASE_SECONDS.observe(p["seconds"], phase=phase, size=size)
+            PHASE_MATCHES.inc(p["matches"], phase=phase, size=size)
+
+
+def observe_cache_hit(timings: Iterable[Dict[str, Any]]):
+    CACHE_HITS.inc(size=_run_size(timings))
+
+
+def render() -> str:
+    from .agents.orchestrator import peak_rss_mb
+
+    rss = peak_rss_mb()
+    if rss is not None:
+        PEAK_RSS.set(rss * 2 ** 20)
+    return registry.render()
@@ -0,0 +1,147 @@
+# File: backend/result_cache.py
+"""
+Cache of finished reconciliation runs keyed by customer, run options and
+a data-version fingerprint, so reconciling an unchanged tenant again
+returns the stored run instead of repeating intake and matching.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# One round trip; changes whenever rows are added to or removed from the
+# tenant's invoices, payments or matches (manual or persisted)
+FINGERPRINT_SQL = """
+    SELECT
+        (SELECT COUNT(*) FROM invoices WHERE customer_id = :cid),
+        (SELECT MAX(created_at) FROM invoices WHERE customer_id = :cid),
+        (SELECT COUNT(*) FROM payments WHERE customer_id = :cid),
+        (SELECT MAX(created_at) FROM payments WHERE customer_id = :cid),
+        (SELECT COUNT(*) FROM reconciliation_matches WHERE customer_id = :cid),
+        (SELECT MAX(match_id) FROM reconciliation_matches WHERE customer_id = :cid)
+    FROM dual
+"""
+
+
+def data_fingerprint(customer_id: str) -> str:
+    """
+    Data version of a tenant: row counts and newest row of every table the
+    run reads. In-place edits that keep both are not detected; writers
+    that do them must call ResultCache.invalidate.
+    """
+    from db.connection import execute_query
+
+    row = execute_query(FINGERPRINT_SQL, {"cid": customer_id})[0]
+    return hashlib.sha256(json.dumps([str(v) for v in row]).encode()).hexdigest()
+
+
+def options_key(columnar: bool, stream_batch_size: Optional[int], settings: Dict[str, Any],
+                pushdown: bool = False) -> str:
+    # Streaming and columnar intake give the same results as each other;
+    # pushdown runs find the same matches but keep fewer rows in the state
+    return json.dumps({"columnar": bool(columnar or stream_batch_size), "pushdown": bool(pushdown),
+                       "settings": settings}, sort_keys=True)
+
+
+class ResultCache:
+    """
+    LRU cache of RunRecords bounded by entry count and by the total rows
+    (invoices + payments) of the cached runs. `invalidate(customer_id)`
+    drops a tenant's entries and bumps its generation, so a run that was
+    already in flight when the data changed is not cached either.
+    """
+
+    def __init__(self, max_entries: int = 32, max_rows: int = 2_000_000):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[Any, int]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        # Bumped by clear(), which invalidates every tenant at once
+        self._epoch = 0
+        self._rows = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+    def generation(self, customer_id: str) -> Tuple[int, int]:
+        with self._lock:
+            return self._epoch, self._generations.get(customer_id, 0)
+
+    def get(self, customer_id: str, fingerprint: str, options: str):
+        key = (customer_id, fingerprint, options)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def put(self, customer_id: str, fingerprint: str, options: str, record, rows: int, generation: Tuple[int, int]):
+        """
+        Caches `record` unless the tenant was invalidated after `generation`
+        was read, or the run alone exceeds the row budget.
+        """
+        key = (customer_id, fingerprint, options)
+        with self._lock:
+            if (self._epoch, self._generations.get(customer_id, 0)) != generation or rows > self.max_rows:
+                return
+            if key in self._entries:
+                self._rows -= self._entries.pop(key)[1]
+            self._entries[key] = (record, rows)
+            self._rows += rows
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries or self._rows > self.max_rows:
+                _, (_, evicted_rows) = self._entries.popitem(last=False)
+                self._rows -= evicted_rows
+                self.stats["evictions"] += 1
+
+    def invalidate(self, customer_id: str):
+        with self._lock:
+            self._generations[customer_id] = self._generations.get(customer_id, 0) + 1
+            for key in [k for k in self._entries if k[0] == customer_id]:
+                self._rows -= self._entries.pop(key)[1]
+            self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._rows = 0
+            self.stats["invalidations"] += 1
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(
+                self.stats,
+                hit_rate=round(self.stats["hits"] / lookups, 3) if lookups else None,
+                entries=len(self._entries),
+                rows=self._rows,
+                max_entries=self.max_entries,
+                max_rows=self.max_rows,
+            )
+
+
+def lookup(customer_id: str, columnar: bool, stream_batch_size: Optional[int], settings: Dict[str, Any],
+           pushdown: bool = False):
+    """
+    Returns (cached RunRecord or None, token); pass the token to `store`
+    after running on a miss.
+    """
+    generation = result_cache.generation(customer_id)
+    token = (data_fingerprint(customer_id), options_key(columnar, stream_batch_size, settings, pushdown), generation)
+    return result_cache.get(customer_id, token[0], token[1]), token
+
+
+def store(customer_id: str, token, record):
+    fingerprint, options, generation = token
+    result_cache.put(customer_id, fingerprint, options, record, record.rows(), generation)
+
+
+result_cache = ResultCache(
+    max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "32")),
+    max_rows=int(os.getenv("RESULT_CACHE_MAX_ROWS", "2000000")),
+)
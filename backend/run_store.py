@@ -0,0 +1,186 @@
+# File: backend/run_store.py
+"""
+Keeps the results of recent /reconcile runs in memory so the API can
+answer with a run ID and summary, and serve matches, exceptions, audit
+events and source rows page by page afterwards.
+"""
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from .batch import summarize_state
+from .agents.models import to_models
+
+MAX_PAGE_SIZE = 1000
+
+
+class RunRecord:
+    """
+    One finished run: its final state plus what the page endpoints need.
+    """
+
+    def __init__(self, run_id: str, state, elapsed_s: float):
+        self.run_id = run_id
+        self.state = state
+        self.created_at = datetime.now()
+        self.elapsed_s = elapsed_s
+        self.matched_invoice_ids = {m['invoice_id'] for m in state.matches}
+        self.matched_payment_ids = {m['payment_id'] for m in state.matches}
+
+    def rows(self) -> int:
+        """
+        Invoices + payments held by this run.
+        """
+        state = self.state
+        return ((len(state.invoice_batch) if state.invoice_batch is not None else len(state.invoices))
+                + (len(state.payment_batch) if state.payment_batch is not None else len(state.payments)))
+
+    def summary(self) -> Dict[str, Any]:
+        state = self.state
+        summary = summarize_state(state, self.elapsed_s)
+        exceptions_by_type: Dict[str, int] = {}
+        exceptions_by_severity: Dict[str, int] = {}
+        for e in state.exceptions:
+            exceptions_by_type[e['type']] = exceptions_by_type.get(e['type'], 0) + 1
+            exceptions_by_severity[e['severity']] = exceptions_by_severity.get(e['severity'], 0) + 1
+        summary.update({
+            "run_id": self.run_id,
+            "created_at": self.created_at.isoformat(),
+            "context": state.context.model_dump(),
+            "matched_invoices": len(self.matched_invoice_ids),
+            "matched_payments": len(self.matched_payment_ids),
+            "reconciliation_rate": round(len(self.matched_invoice_ids) / summary['invoices'] * 100, 1)
+                                   if summary['invoices'] else 0.0,
+            "exceptions_by_type": exceptions_by_type,
+            "exceptions_by_severity": exceptions_by_severity,
+            "audit_events": len(state.audit_trail),
+            "history": [h.model_dump() for h in state.history],
+        })
+        return summary
+
+
+def keyset_page(count: int, after: Optional[int], limit: int, keep: Callable[[int], bool]) -> Dict[str, Any]:
+    """
+    Positions of the next `limit` items after position `after` that pass
+    `keep`. Items are keyed by their position in the run's (immutable)
+    result lists, so a page starts right after the previous page's last
+    key instead of re-counting an offset.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    positions = []
+    i = 0 if after is None else after + 1
+    while i < count and len(positions) <= limit:
+        if keep(i):
+            positions.append(i)
+        i += 1
+    has_more = len(positions) > limit
+    positions = positions[:limit]
+    return {
+        "positions": positions,
+        "has_more": has_more,
+        "next_after": positions[-1] if has_more else None,
+    }
+
+
+class RunStore:
+    """
+    Bounded in-memory store of the most recent runs (oldest evicted
+    first). Results are per API process.
+    """
+
+    def __init__(self, max_runs: int = 20):
+        self.max_runs = max_runs
+        self._runs: "OrderedDict[str, RunRecord]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, state, elapsed_s: float) -> RunRecord:
+        record = RunRecord(uuid.uuid4().hex, state, elapsed_s)
+        self.put(record)
+        return record
+
+    def put(self, record: RunRecord):
+        """
+        (Re-)adds an existing record, e.g. a cached run served again.
+        """
+        with self._lock:
+            self._runs[record.run_id] = record
+            self._runs.move_to_end(record.run_id)
+            while len(self._runs) > self.max_runs:
+                self._runs.popitem(last=False)
+
+    def get(self, run_id: str) -> Optional[RunRecord]:
+        with self._lock:
+            return self._runs.get(run_id)
+
+    def list(self, customer_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            records = list(self._runs.values())
+        return [{"run_id": r.run_id, "customer_id": r.state.context.customer_id, "created_at": r.created_at.isoformat()}
+                for r in reversed(records) if customer_id is None or r.state.context.customer_id == customer_id]
+
+    @staticmethod
+    def _page_of_dicts(items: List[Dict[str, Any]], after, limit, keep) -> Dict[str, Any]:
+        page = keyset_page(len(items), after, limit, lambda i: keep(items[i]))
+        return {
+            "items": [dict(items[i], seq=i) for i in page["positions"]],
+            "has_more": page["has_more"],
+            "next_after": page["next_after"],
+        }
+
+    def matches(self, record: RunRecord, after=None, limit=100, match_type=None, status=None,
+                min_confidence=None, max_confidence=None) -> Dict[str, Any]:
+        def keep(m):
+            return ((match_type is None or m['match_type'] == match_type)
+                    and (status is None or m.get('status') == status)
+                    and (min_confidence is None or m['confidence'] >= min_confidence)
+                    and (max_confidence is None or m['confidence'] <= max_confidence))
+        return self._page_of_dicts(record.state.matches, after, limit, keep)
+
+    def exceptions(self, record: RunRecord, after=None, limit=100, exception_type=None, severity=None,
+                   min_amount=None, max_amount=None) -> Dict[str, Any]:
+        def keep(e):
+            return ((exception_type is None or e['type'] == exception_type)
+                    and (severity is None or e['severity'] == severity)
+                    and (min_amount is None or e['amount'] >= min_amount)
+                    and (max_amount is None or e['amount'] <= max_amount))
+        return self._page_of_dicts(record.state.exceptions, after, limit, keep)
+
+    def audit(self, record: RunRecord, after=None, limit=100, action=None, entity_type=None) -> Dict[str, Any]:
+        def keep(a):
+            return ((action is None or a['action'] == action)
+                    and (entity_type is None or a['entity_type'] == entity_type))
+        return self._page_of_dicts(record.state.audit_trail, after, limit, keep)
+
+    def invoices(self, record: RunRecord, after=None, limit=100, matched: Optional[bool] = None) -> Dict[str, Any]:
+        state = record.state
+        batch = state.invoice_batch
+        ids = batch.invoice_id if batch is not None else [i.invoice_id for i in state.invoices]
+        page = keyset_page(len(ids), after, limit,
+                           lambda i: matched is None or (ids[i] in record.matched_invoice_ids) == matched)
+        rows = batch.take(page["positions"]).to_models() if batch is not None \
+            else to_models([state.invoices[i] for i in page["positions"]])
+        return {
+            "items": [dict(row.model_dump(), seq=i) for i, row in zip(page["positions"], rows)],
+            "has_more": page["has_more"],
+            "next_after": page["next_after"],
+        }
+
+    def payments(self, record: RunRecord, after=None, limit=100, matched: Optional[bool] = None) -> Dict[str, Any]:
+        state = record.state
+        batch = state.payment_batch
+        ids = batch.payment_id if batch is not None else [p.payment_id for p in state.payments]
+        page = keyset_page(len(ids), after, limit,
+                           lambda i: matched is None or (ids[i] in record.matched_payment_ids) == matched)
+        rows = batch.take(page["positions"]).to_models() if batch is not None \
+            else to_models([state.payments[i] for i in page["positions"]])
+        return {
+            "items": [dict(row.model_dump(), seq=i) for i, row in zip(page["positions"], rows)],
+            "has_more": page["has_more"],
+            "next_after": page["next_after"],
+        }
+
+
+run_store = RunStore(max_runs=int(os.getenv("RUN_STORE_MAX_RUNS", "20")))
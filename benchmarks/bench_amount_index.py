@@ -0,0 +1,43 @@
+# File: benchmarks/bench_amount_index.py
+"""
+Times AmountIndex construction and tolerance range queries on a large
+set of open invoices.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_amount_index --invoices 1000000 --queries 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from backend.agents.amount_index import AmountIndex, tolerance_cents
+
+
+def run(num_invoices, num_queries, abs_tolerance, pct_tolerance, seed=7):
+    rng = np.random.default_rng(seed)
+    cents = rng.integers(50_000, 1_000_000, size=num_invoices, dtype=np.int64)
+    queries = rng.integers(50_000, 1_000_000, size=num_queries, dtype=np.int64).tolist()
+
+    start = time.perf_counter()
+    index = AmountIndex(cents)
+    build_s = time.perf_counter() - start
+
+    hits = 0
+    start = time.perf_counter()
+    for q in queries:
+        hits += len(index.near(q, tolerance_cents(q, abs_tolerance, pct_tolerance)))
+    query_s = time.perf_counter() - start
+
+    print(f"invoices={num_invoices} build={build_s:.3f}s queries={num_queries} "
+          f"total={query_s:.3f}s per_query={query_s / num_queries * 1e6:.1f}us avg_hits={hits / num_queries:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--invoices", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=100_000)
+    parser.add_argument("--abs-tolerance", type=float, default=0.50)
+    parser.add_argument("--pct-tolerance", type=float, default=0.0)
+    args = parser.parse_args()
+    run(args.invoices, args.queries, args.abs_tolerance, args.pct_tolerance)
@@ -0,0 +1,380 @@
+# File: benchmarks/bench_pipeline.py
+"""
+Stage-by-stage benchmark of a full reconciliation run, fully offline.
+
+Synthetic tenants from data/generate_large_data.py (1:1, split, bulk and
+unmatched payments, plus optional amount noise, missing references and
+amount/vendor skew) are loaded into the local SQLite stand-in
+(DB_BACKEND=local). Each
+orchestrator stage is then timed - intake from the database, every
+hybrid_match phase, exception classification, compliance masking and the
+audit trail (buffered sink, flushed to the database) - with throughput in
+rows/s. A separate pass under tracemalloc records each stage's peak
+Python heap, so it does not distort the timings. Matches are scored
+against the generator's ground truth (precision/recall).
+
+With `--pushdown` the runs match exact 1:1 pairs in the database, and
+one extra run on the Python path checks that both find identical matches
+(the benchmark exits non-zero if they differ).
+
+Results are written as JSON; `--compare` checks them against an earlier
+result file and exits non-zero on a regression.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --sizes 10000 100000 --columnar --repeats 3
+    python -m benchmarks.bench_pipeline --hot-amount-share 0.3 --vendor-skew 1.2 --subset-sum
+    python -m benchmarks.bench_pipeline --pushdown --columnar
+    python -m benchmarks.bench_pipeline --compare benchmarks/results/pipeline-abc1234.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+from data.generate_large_data import Scenario, iter_chunks
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+STAGES = ("intake", "matching", "exceptions", "compliance", "decision", "audit")
+
+INSERT_INVOICE_SQL = (
+    "INSERT INTO invoices (invoice_id, customer_id, vendor_name, amount, currency, invoice_date, po_number, status) "
+    "VALUES (:1, :2, :3, :4, :5, TO_DATE(:6, 'YYYY-MM-DD'), :7, 'PENDING')"
+)
+INSERT_PAYMENT_SQL = (
+    "INSERT INTO payments (payment_id, customer_id, sender_name, amount, currency, payment_date, trace_id, "
+    "remittance_raw, status) VALUES (:1, :2, :3, :4, :5, TO_DATE(:6, 'YYYY-MM-DD'), :7, :8, 'UNMATCHED')"
+)
+
+
+def build_tenant(customer_id, num_invoices, args):
+    """
+    Invoice rows, payment rows and ground-truth (invoice_id, payment_id)
+    pairs for one tenant from the data generator.
+    """
+    scenario = Scenario(
+        one_to_one=1 - args.split_share - args.bulk_share - args.exception_share, split=args.split_share,
+        bulk=args.bulk_share, unmatched=args.exception_share, amount_noise=args.amount_noise,
+        missing_reference=args.missing_reference, hot_amount_share=args.hot_amount_share,
+        vendors=50, vendor_skew=args.vendor_skew,
+    )
+    invoices, payments, truth = next(iter_chunks(num_invoices, [customer_id], scenario, num_invoices, args.seed))
+    invoice_rows = list(zip(
+        invoices["invoice_id"].tolist(), invoices["customer_id"].tolist(), invoices["vendor_name"].tolist(),
+        invoices["amount"].tolist(), invoices["currency"].tolist(),
+        np.datetime_as_string(invoices["invoice_date"], unit="D").tolist(), invoices["po_number"].tolist(),
+    ))
+    payment_rows = list(zip(
+        payments["payment_id"].tolist(), payments["customer_id"].tolist(), payments["sender_name"].tolist(),
+        payments["amount"].tolist(), payments["currency"].tolist(),
+        np.datetime_as_string(payments["payment_date"], unit="D").tolist(), payments["trace_id"].tolist(),
+        payments["remittance_raw"].tolist(),
+    ))
+    return invoice_rows, payment_rows, set(zip(truth["invoice_id"].tolist(), truth["payment_id"].tolist()))
+
+
+def accuracy(matches, truth):
+    found = {(m["invoice_id"], m["payment_id"]) for m in matches}
+    correct = len(found & truth)
+    return {
+        "precision": round(correct / len(found), 4) if found else None,
+        "recall": round(correct / len(truth), 4) if truth else None,
+        "true_pairs": len(truth),
+        "false_pairs": len(found) - correct,
+    }
+
+
+def load_tenant(customer_id, invoices, payments, chunk_size=50_000):
+    from db.connection import pooled_connection
+
+    with pooled_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("INSERT INTO customers (customer_id, name) VALUES (:1, :2)", [customer_id, "Benchmark"])
+            for statement, rows in ((INSERT_INVOICE_SQL, invoices), (INSERT_PAYMENT_SQL, payments)):
+                for start in range(0, len(rows), chunk_size):
+                    cursor.executemany(statement, rows[start:start + chunk_size])
+        conn.commit()
+
+
+async def run_once(customer_id, settings, columnar, stream_batch_size, trace_memory=False, pushdown=False):
+    """
+    One run, stage by stage, in the orchestrator's order. Returns
+    ({stage: {"seconds", ...}}, {phase: {"seconds", "matches"}}, final state).
+    """
+    from db.connection import run_db
+    from backend.agents.models import CustomerContext, ReconciliationState
+    from backend.agents.orchestrator import ReconciliationOrchestrator
+
+    state = ReconciliationState(context=CustomerContext(customer_id=customer_id, tenant_name="Benchmark", settings=settings))
+    orchestrator = ReconciliationOrchestrator(state, columnar=columnar, stream_batch_size=stream_batch_size,
+                                              pushdown=pushdown)
+
+    async def audit():
+        # The run only returns once the buffered trail is in the database
+        await orchestrator.run_audit_trail()
+        await run_db(orchestrator.audit_sink.flush)
+
+    steps = {
+        "intake": orchestrator.run_intake,
+        "matching": orchestrator.run_matching,
+        "exceptions": orchestrator.run_exception_analysis,
+        "compliance": orchestrator.run_compliance_check,
+        "decision": orchestrator.run_decision_logic,
+        "audit": audit,
+    }
+    stages = {}
+    for name in STAGES:
+        if trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        await steps[name]()
+        stages[name] = {"seconds": time.perf_counter() - start}
+        if trace_memory:
+            stages[name]["py_peak_mb"] = (tracemalloc.get_traced_memory()[1] - base) / 2 ** 20
+    return stages, orchestrator.matching_agent.phase_stats, orchestrator.state
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10
+
+
+def compare_matches(state, reference):
+    """
+    Differences between the matches of two runs, ignoring their order.
+    """
+    def key(m):
+        return (m["invoice_id"], m["payment_id"], m["match_type"], m["confidence"],
+                m["invoice_amount"], m["payment_amount"], tuple(m["reasons"]))
+
+    found, expected = {key(m) for m in state.matches}, {key(m) for m in reference.matches}
+    return {
+        "identical": found == expected and len(state.matches) == len(reference.matches),
+        "missing": len(expected - found),
+        "extra": len(found - expected),
+    }
+
+
+def summarize(samples, rows):
+    seconds = [s["seconds"] for s in samples]
+    median = statistics.median(seconds)
+    return {
+        "seconds": round(median, 6),
+        "min_seconds": round(min(seconds), 6),
+        "rows_per_s": round(rows / median) if median else None,
+    }
+
+
+def bench_size(num_invoices, args, settings):
+    customer_id = f"BENCH-{num_invoices}"
+    start = time.perf_counter()
+    invoices, payments, truth = build_tenant(customer_id, num_invoices, args)
+    generate_s = time.perf_counter() - start
+    start = time.perf_counter()
+    load_tenant(customer_id, invoices, payments)
+    load_s = time.perf_counter() - start
+    rows = len(invoices) + len(payments)
+
+    runs = []
+    for _ in range(args.warmup + args.repeats):
+        runs.append(asyncio.run(run_once(customer_id, settings, args.columnar, args.stream_batch_size,
+                                         pushdown=args.pushdown)))
+    runs = runs[args.warmup:]
+    state = runs[-1][2]
+
+    result = {
+        "invoices": len(invoices),
+        "payments": len(payments),
+        "generate_s": round(generate_s, 3),
+        "load_s": round(load_s, 3),
+        "stages": {name: summarize([r[0][name] for r in runs], rows) for name in STAGES},
+        "phases": {name: dict(summarize([r[1][name] for r in runs], rows), matches=runs[-1][1][name]["matches"])
+                   for name in runs[-1][1]},
+        "total_s": round(statistics.median(sum(s["seconds"] for s in r[0].values()) for r in runs), 6),
+        "matches": len(state.matches),
+        "exceptions": len(state.exceptions),
+        "accuracy": accuracy(state.matches, truth),
+    }
+    if args.pushdown:
+        result["pushdown_matches"] = len(state.pushdown_matches)
+        _, _, reference = asyncio.run(run_once(customer_id, settings, args.columnar, args.stream_batch_size))
+        result["pushdown_check"] = compare_matches(state, reference)
+    result["rows_per_s"] = round(rows / result["total_s"]) if result["total_s"] else None
+
+    if not args.no_memory:
+        tracemalloc.start()
+        try:
+            stages, _, _ = asyncio.run(run_once(customer_id, settings, args.columnar, args.stream_batch_size,
+                                                trace_memory=True, pushdown=args.pushdown))
+        finally:
+            tracemalloc.stop()
+        for name in STAGES:
+            result["stages"][name]["py_peak_mb"] = round(stages[name]["py_peak_mb"], 2)
+    result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_result(size, result):
+    print(f"\ninvoices={result['invoices']} payments={result['payments']} total={result['total_s']:.3f}s "
+          f"({result['rows_per_s']} rows/s) matches={result['matches']} exceptions={result['exceptions']} "
+          f"peak_rss={result['peak_rss_mb']}MB")
+    acc = result["accuracy"]
+    print(f"  precision={acc['precision']} recall={acc['recall']} "
+          f"(true pairs {acc['true_pairs']}, false pairs {acc['false_pairs']})")
+    if "pushdown_check" in result:
+        check = result["pushdown_check"]
+        print(f"  pushdown: {result['pushdown_matches']} pairs matched in the database; vs Python path "
+              f"{'identical' if check['identical'] else 'DIFFERENT'} (missing {check['missing']}, extra {check['extra']})")
+    print(f"  {'stage':<22} {'seconds':>9} {'rows/s':>12} {'py_peak_mb':>11} {'matches':>8}")
+    for name, stage in result["stages"].items():
+        print(f"  {name:<22} {stage['seconds']:>9.4f} {stage['rows_per_s'] or 0:>12} "
+              f"{stage.get('py_peak_mb', ''):>11}")
+        if name == "matching":
+            for phase, p in result["phases"].items():
+                print(f"    {phase:<20} {p['seconds']:>9.4f} {p['rows_per_s'] or 0:>12} {'':>11} {p['matches']:>8}")
+
+
+def compare(report, baseline_path, threshold, min_seconds):
+    """
+    Prints current vs baseline median seconds per stage and phase; returns
+    the entries more than `threshold` times slower (ignoring entries
+    faster than `min_seconds` in the baseline, which are mostly noise).
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    if baseline["meta"].get("args") != report["meta"]["args"]:
+        print("  warning: the baseline was run with different options")
+    regressions = []
+    for size, result in report["results"].items():
+        base = baseline["results"].get(size)
+        if base is None:
+            print(f"  size {size}: not in baseline")
+            continue
+        entries = [(f"stage {n}", s, base["stages"].get(n)) for n, s in result["stages"].items()]
+        entries += [(f"phase {n}", p, base["phases"].get(n)) for n, p in result["phases"].items()]
+        for label, current, previous in entries:
+            if previous is None or previous["seconds"] < min_seconds:
+                continue
+            ratio = current["seconds"] / previous["seconds"]
+            flag = "REGRESSION" if ratio > threshold else ""
+            print(f"  size {size:>8} {label:<22} {previous['seconds']:>9.4f}s -> {current['seconds']:>9.4f}s "
+                  f"{ratio:>6.2f}x {flag}")
+            if flag:
+                regressions.append((size, label, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000], help="invoices per tenant")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--split-share", type=float, default=0.15)
+    parser.add_argument("--bulk-share", type=float, default=0.05)
+    parser.add_argument("--exception-share", type=float, default=0.10)
+    parser.add_argument("--amount-noise", type=float, default=0.0,
+                        help="share of 1:1 payments with an amount difference (see --tolerance)")
+    parser.add_argument("--missing-reference", type=float, default=0.0,
+                        help="share of payments without an invoice/PO reference")
+    parser.add_argument("--hot-amount-share", type=float, default=0.0,
+                        help="share of invoices with one of 20 common amounts")
+    parser.add_argument("--vendor-skew", type=float, default=0.0, help="Zipf exponent over 50 vendors")
+    parser.add_argument("--columnar", action="store_true")
+    parser.add_argument("--stream-batch-size", type=int)
+    parser.add_argument("--tolerance", type=float, default=0.0, help="amount_tolerance_abs (enables Phase 4)")
+    parser.add_argument("--subset-sum", action="store_true", help="enable Phase 5")
+    parser.add_argument("--pushdown", action="store_true",
+                        help="match exact 1:1 pairs in the database (checked against the Python path)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--db", help="SQLite file to use (default: a temporary file, removed afterwards)")
+    parser.add_argument("--output", help="JSON result file (default: benchmarks/results/pipeline-<commit>.json)")
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier result file to compare with")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.005)
+    args = parser.parse_args()
+
+    # Offline: the local SQLite stand-in, no Oracle and no embedding calls
+    tmp_dir = None
+    if args.db is None:
+        tmp_dir = tempfile.mkdtemp(prefix="recon-bench-")
+        args.db = os.path.join(tmp_dir, "bench.db")
+    elif os.path.exists(args.db):
+        os.remove(args.db)
+    os.environ["DB_BACKEND"] = "local"
+    os.environ["LOCAL_DB_PATH"] = args.db
+    os.environ.setdefault("OPENAI_API_KEY", "offline")
+
+    from backend.agents.models import MatchSettings
+
+    settings = MatchSettings(amount_tolerance_abs=args.tolerance, subset_sum_enabled=args.subset_sum)
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("db", "output", "compare")},
+        },
+        "results": {},
+    }
+    try:
+        for size in sorted(args.sizes):
+            result = report["results"][str(size)] = bench_size(size, args, settings)
+            print_result(size, result)
+    finally:
+        from db.connection import close_pool
+        from backend.agents.audit_sink import close_audit_sink
+
+        close_audit_sink()
+        close_pool()
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline-{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    mismatched = [size for size, r in report["results"].items()
+                  if "pushdown_check" in r and not r["pushdown_check"]["identical"]]
+    if mismatched:
+        print(f"Pushdown matches differ from the Python path for sizes {', '.join(mismatched)}")
+        sys.exit(1)
+
+    if args.compare:
+        regressions = compare(report, args.compare, args.threshold, args.min_seconds)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold}x")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
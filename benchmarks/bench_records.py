@@ -0,0 +1,105 @@
+# File: benchmarks/bench_records.py
+"""
+Compares the row types of the non-columnar pipeline: validated Pydantic
+models (Invoice(...) / Payment(...)), Pydantic model_construct() without
+validation, and the slotted InvoiceRecord / PaymentRecord the intake now
+builds. Reports construction time, retained memory per object (the field
+values are shared with the driver rows and not counted) and the cost of
+ComplianceAgent's per-row remittance rewrite.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_records
+    python -m benchmarks.bench_records --rows 200000 --repeat 5
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from backend.agents.compliance_agent import ACCOUNT_NUMBER_RE
+from backend.agents.models import Invoice, InvoiceRecord, Payment, PaymentRecord
+
+
+def _invoice_kwargs(r):
+    return dict(invoice_id=r[0], amount=r[1], currency=r[2], vendor_name=r[3], po_number=r[4], invoice_date=r[5])
+
+
+def _payment_kwargs(r):
+    return dict(payment_id=r[0], amount=r[1], currency=r[2], sender_name=r[3], trace_id=r[4], remittance_raw=r[5],
+                payment_date=r[6])
+
+
+# name -> (invoice builder, payment builder); "pydantic" is the previous intake code
+BUILDERS = {
+    "pydantic": (lambda r: Invoice(invoice_id=r[0], amount=r[1], currency=r[2], vendor_name=r[3],
+                                   po_number=r[4], invoice_date=r[5]),
+                 lambda r: Payment(payment_id=r[0], amount=r[1], currency=r[2], sender_name=r[3],
+                                   trace_id=r[4], remittance_raw=r[5], payment_date=r[6])),
+    "model_construct": (lambda r: Invoice.model_construct(**_invoice_kwargs(r)),
+                        lambda r: Payment.model_construct(**_payment_kwargs(r))),
+    "record": (lambda r: InvoiceRecord(*r), lambda r: PaymentRecord(*r)),
+}
+
+
+def driver_rows(num_rows):
+    """
+    Tuples shaped like the intake query results (values already typed).
+    """
+    start = datetime(2024, 1, 1)
+    invoices = [(f"INV-CUST-1000-{i:07d}", 100.0 + i % 9000, "USD", "Global Logistics", f"PO-{i % 90000:05d}",
+                 start + timedelta(days=i % 365)) for i in range(num_rows)]
+    payments = [(f"PAY-{i:07d}", 100.0 + i % 9000, "USD", "Global Logistics", f"TR-{i:06d}",
+                 f"Payment for INV-CUST-1000-{i:07d} from account 12345678{i % 10}", start + timedelta(days=i % 365))
+                for i in range(num_rows)]
+    return invoices, payments
+
+
+def build(builder, rows):
+    return [builder(r) for r in rows]
+
+
+def mask(payments):
+    for pay in payments:
+        if pay.remittance_raw:
+            pay.remittance_raw = ACCOUNT_NUMBER_RE.sub('********', pay.remittance_raw)
+
+
+def retained_bytes(builder, rows):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = build(builder, rows)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del objects
+    return used
+
+
+def run(num_rows, repeat):
+    invoices, payments = driver_rows(num_rows)
+    per_million = 1_000_000 / num_rows
+    print(f"rows={num_rows} (times and memory scaled to 1M rows each of invoices and payments)")
+    print(f"{'type':<16} {'build s':>8} {'mask s':>8} {'invoice B/row':>14} {'payment B/row':>14} {'MB':>8}")
+    for name, (make_invoice, make_payment) in BUILDERS.items():
+        build_s = mask_s = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            built = build(make_invoice, invoices), build(make_payment, payments)
+            build_s = min(build_s, time.perf_counter() - start)
+            start = time.perf_counter()
+            mask(built[1])
+            mask_s = min(mask_s, time.perf_counter() - start)
+            del built
+        inv_bytes = retained_bytes(make_invoice, invoices) / num_rows
+        pay_bytes = retained_bytes(make_payment, payments) / num_rows
+        print(f"{name:<16} {build_s * per_million:>8.2f} {mask_s * per_million:>8.2f} {inv_bytes:>14.0f} "
+              f"{pay_bytes:>14.0f} {(inv_bytes + pay_bytes) * 1_000_000 / 2 ** 20:>8.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="invoices and payments each")
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs per type (best is reported)")
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
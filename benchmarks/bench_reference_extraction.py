@@ -0,0 +1,79 @@
+# File: benchmarks/bench_reference_extraction.py
+"""
+Compares the legacy per-payment substring scan used by hybrid_match
+Phases 2/3 with the ReferenceIndex built once per run.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_reference_extraction
+    python -m benchmarks.bench_reference_extraction --sizes 2000 50000 --legacy-sample 100
+"""
+import argparse
+import random
+import time
+
+from backend.agents.reference_index import ReferenceIndex
+
+
+def build_tenant(num_invoices, seed=7):
+    """
+    Builds an invoice reference dict and remittance strings shaped like
+    data/generate_large_data.py output (1:1, split and mystery payments).
+    """
+    rng = random.Random(seed)
+    invoice_by_ref = {}
+    remittances = []
+    for i in range(num_invoices):
+        inv_id = f"INV-CUST-1000-{i:07d}"
+        po = f"PO-{rng.randint(10000, 99999)}"
+        invoice_by_ref[inv_id] = inv_id
+        invoice_by_ref[po] = inv_id
+
+        scenario = rng.random()
+        if scenario < 0.7:
+            remittances.append(f"Full payment for {inv_id}")
+        elif scenario < 0.85:
+            splits = rng.randint(2, 4)
+            for s in range(splits):
+                remittances.append(f"Partial payment {s + 1}/{splits} for {inv_id}")
+        elif scenario < 0.9:
+            remittances.append(f"Bulk settlement {inv_id} / {po}")
+        else:
+            remittances.append("Zyxel maintenance fee")
+    return invoice_by_ref, remittances
+
+
+def legacy_find(invoice_by_ref, text):
+    return [ref for ref in invoice_by_ref if ref in (text or "")]
+
+
+def run(sizes, legacy_sample):
+    print(f"{'invoices':>10} {'payments':>10} {'build(s)':>9} {'index(s)':>9} {'legacy(s)':>10} {'speedup':>9}")
+    for size in sizes:
+        invoice_by_ref, remittances = build_tenant(size)
+
+        start = time.perf_counter()
+        index = ReferenceIndex(invoice_by_ref)
+        build_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = [index.find(text) for text in remittances]
+        index_s = time.perf_counter() - start
+
+        # The legacy scan is O(payments x references); time a sample and extrapolate
+        sample = random.Random(size).sample(range(len(remittances)), min(legacy_sample, len(remittances)))
+        start = time.perf_counter()
+        for i in sample:
+            assert legacy_find(invoice_by_ref, remittances[i]) == found[i], remittances[i]
+        legacy_s = (time.perf_counter() - start) / len(sample) * len(remittances)
+
+        speedup = legacy_s / (build_s + index_s)
+        print(f"{size:>10} {len(remittances):>10} {build_s:>9.3f} {index_s:>9.3f} {legacy_s:>10.2f} {speedup:>8.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2_000, 50_000, 500_000])
+    parser.add_argument("--legacy-sample", type=int, default=200,
+                        help="payments timed with the legacy scan (extrapolated to the full run)")
+    args = parser.parse_args()
+    run(args.sizes, args.legacy_sample)
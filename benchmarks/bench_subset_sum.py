@@ -0,0 +1,75 @@
+# File: benchmarks/bench_subset_sum.py
+"""
+Worst-case timings for the amount-sum (subset-sum) match phase.
+
+Worst case = every open item belongs to the same vendor and no group sums
+to the target, so each search enumerates its whole bounded space:
+invoice amounts end in 0 cents and payment amounts in 1 cent, so no group
+of up to 9 items can ever balance.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_subset_sum
+    python -m benchmarks.bench_subset_sum --open-items 5000 --budget 2
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from backend.agents.columnar import InvoiceBatch, PaymentBatch
+from backend.agents.matching_agent import MatchingAgent
+from backend.agents.models import CustomerContext, MatchSettings, ReconciliationState
+from backend.agents.subset_sum import find_subset
+
+
+def bench_solver(candidates, group_sizes, repeats=20, seed=7):
+    rng = np.random.default_rng(seed)
+    print(f"{'candidates':>10} {'max_group':>9} {'per_search(ms)':>15}")
+    for n in candidates:
+        for k in group_sizes:
+            values = (rng.integers(5_000, 500_000, size=n) * 2).tolist()
+            target = sum(sorted(values)[-k:]) + 1 # odd, unreachable, nothing pruned
+            start = time.perf_counter()
+            for _ in range(repeats):
+                assert find_subset(target, values, k) is None
+            print(f"{n:>10} {k:>9} {(time.perf_counter() - start) / repeats * 1000:>15.2f}")
+
+
+def bench_phase(open_items, settings, seed=7):
+    rng = np.random.default_rng(seed)
+    day = datetime(2024, 1, 1)
+    invoices = InvoiceBatch.from_columns(
+        [f"INV-{i:07d}" for i in range(open_items)],
+        rng.integers(500, 50_000, size=open_items) * 10 / 100,
+        ["USD"] * open_items, ["Steel Fab Inc"] * open_items, [None] * open_items,
+        [day + timedelta(days=int(d)) for d in rng.integers(0, 30, size=open_items)],
+    )
+    payments = PaymentBatch.from_columns(
+        [f"PAY-{i:07d}" for i in range(open_items)],
+        (rng.integers(500, 50_000, size=open_items) * 10 + 1) / 100,
+        ["USD"] * open_items, ["Steel Fab Inc"] * open_items, [None] * open_items,
+        ["garbled remittance"] * open_items,
+        [day + timedelta(days=int(d)) for d in rng.integers(20, 50, size=open_items)],
+    )
+    state = ReconciliationState(context=CustomerContext(customer_id="BENCH", tenant_name="bench", settings=settings))
+    state.invoice_batch, state.payment_batch = invoices, payments
+
+    start = time.perf_counter()
+    MatchingAgent(None).hybrid_match(state)
+    elapsed = time.perf_counter() - start
+    stopped = any(h.data.get("phase") == "amount_sum" for h in state.history)
+    print(f"open_items={open_items} elapsed={elapsed:.2f}s matches={len(state.matches)} "
+          f"budget={settings.subset_time_budget_s}s stopped_at_budget={stopped}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[20, 40, 60])
+    parser.add_argument("--group-sizes", type=int, nargs="+", default=[2, 3, 4, 5])
+    parser.add_argument("--open-items", type=int, default=5_000)
+    parser.add_argument("--budget", type=float, default=5.0)
+    args = parser.parse_args()
+
+    bench_solver(args.candidates, args.group_sizes)
+    bench_phase(args.open_items, MatchSettings(subset_sum_enabled=True, subset_time_budget_s=args.budget))
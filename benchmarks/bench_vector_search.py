@@ -0,0 +1,88 @@
+# File: benchmarks/bench_vector_search.py
+"""
+Compares per-payment vector lookups with the batched in-process
+VectorIndex on random embeddings. With `--oracle CUSTOMER_ID` it also
+times the per-payment and bulk Oracle VECTOR_DISTANCE queries for that
+customer (requires a configured database).
+
+Usage (from the repo root):
+    python -m benchmarks.bench_vector_search --invoices 20000 --payments 2000 --dim 1536
+"""
+import argparse
+import time
+
+import numpy as np
+
+from backend.agents.vector_index import VectorIndex
+
+
+def run(num_invoices, num_payments, dim, k, seed=7):
+    rng = np.random.default_rng(seed)
+    invoices = rng.standard_normal((num_invoices, dim), dtype=np.float32)
+    payments = rng.standard_normal((num_payments, dim), dtype=np.float32)
+
+    start = time.perf_counter()
+    index = VectorIndex([f"INV-{i}" for i in range(num_invoices)], invoices)
+    build_s = time.perf_counter() - start
+
+    # One query at a time, as the per-payment SQL lookup does
+    loop_n = min(num_payments, 200)
+    start = time.perf_counter()
+    for q in payments[:loop_n]:
+        index.top_k(q[None, :], k)
+    loop_s = (time.perf_counter() - start) / loop_n * num_payments
+
+    start = time.perf_counter()
+    positions, _ = index.top_k(payments, k)
+    batch_s = time.perf_counter() - start
+
+    # Sanity check against a brute-force argsort
+    sims = payments[:10] @ index.matrix.T
+    assert (np.argsort(-sims, axis=1)[:, :k] == positions[:10]).all()
+
+    print(f"invoices={num_invoices} payments={num_payments} dim={dim} k={k} build={build_s:.3f}s "
+          f"per_payment={loop_s:.3f}s (extrapolated) batched={batch_s:.3f}s speedup={loop_s / batch_s:.1f}x")
+
+
+def run_oracle(customer_id, k):
+    from db.connection import execute_query
+    from backend.agents.matching_agent import MatchingAgent
+
+    agent = MatchingAgent(client=None)
+    payment_ids = [r[0] for r in execute_query(
+        "SELECT source_id FROM metadata_vectors WHERE customer_id = :1 AND source_type = 'PAYMENT'", [customer_id]
+    )]
+    if not payment_ids:
+        print(f"no payment embeddings for {customer_id}")
+        return
+
+    start = time.perf_counter()
+    for pid in payment_ids:
+        agent.get_oracle_vector_match(pid, customer_id)
+    single_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    agent.get_oracle_vector_matches(payment_ids, customer_id, k)
+    bulk_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    agent.get_local_vector_matches(payment_ids, customer_id, k)
+    local_s = time.perf_counter() - start
+
+    print(f"oracle customer={customer_id} payments={len(payment_ids)} per_payment={single_s:.3f}s "
+          f"bulk={bulk_s:.3f}s local_load_and_search={local_s:.3f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--invoices", type=int, default=20_000)
+    parser.add_argument("--payments", type=int, default=2_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--oracle", metavar="CUSTOMER_ID", help="also time the database lookups for this customer")
+    args = parser.parse_args()
+    run(args.invoices, args.payments, args.dim, args.k)
+    if args.oracle:
+        from dotenv import load_dotenv
+        load_dotenv()
+        run_oracle(args.oracle, args.k)
@@ -1,80 +1,380 @@
 # File: data/generate_large_data.py
-import pandas as pd
+"""
+Synthetic invoices, payments and their ground-truth matches for load and
+accuracy testing.
+
+Rows are generated with NumPy a chunk of invoices at a time from a fixed
+seed and streamed to CSV or Parquet, so memory stays flat at 10M+ rows.
+Scenario knobs control the share of 1:1, 1:N (split), N:1 (bulk) and
+unmatched invoices, amount noise on 1:1 payments, missing remittance
+references, hot-tenant skew, hot amounts, vendor skew and currencies.
+
+Writes <prefix>_invoices, <prefix>_payments and <prefix>_ground_truth
+(one row per true invoice/payment pair) to the output directory.
+
+Usage (from the repo root):
+    python data/generate_large_data.py
+    python -m data.generate_large_data --customers 200 --invoices 8000000 --format parquet --output-dir /tmp/load
+    python -m data.generate_large_data --bulk 0.05 --amount-noise 0.1 --missing-reference 0.05 \\
+        --hot-tenant-share 0.4 --currencies USD:0.7 EUR:0.2 GBP:0.1
+"""
+import argparse
+import os
+import time
+from functools import reduce
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
 import numpy as np
-from datetime import datetime, timedelta
-import random
 
-def generate_data(num_customers=50, invoices_per_cust=40):
-    customers = [f"CUST-{1000 + i}" for i in range(num_customers)]
-    
-    invoices = []
-    payments = []
-    
-    for cust in customers:
-        for i in range(invoices_per_cust):
-            inv_id = f"INV-{cust}-{i:04d}"
-            amount = round(random.uniform(500, 10000), 2)
-            inv_date = datetime(2024, 1, 1) + timedelta(days=random.randint(0, 180))
-            vendor = random.choice(["Global Logistics", "Compute Cloud", "Office Supply Co", "Enterprise SaaS", "Steel Fab Inc"])
-            po = f"PO-{random.randint(10000, 99999)}"
-            
-            invoices.append({
-                "invoice_id": inv_id,
-                "customer_id": cust,
-                "amount": amount,
-                "currency": "USD",
-                "vendor_name": vendor,
-                "po_number": po,
-                "invoice_date": inv_date.strftime("%Y-%m-%d")
+VENDORS = ["Global Logistics", "Compute Cloud", "Office Supply Co", "Enterprise SaaS", "Steel Fab Inc"]
+SCENARIOS = ("one_to_one", "split", "bulk", "unmatched")
+FIRST_DAY = np.datetime64("2024-01-01")
+
+
+# Column name -> array, one entry per row
+Columns = Dict[str, np.ndarray]
+
+
+def _join(*parts):
+    # Element-wise string concatenation of arrays and scalars
+    return reduce(np.char.add, [np.asarray(p, dtype=str) for p in parts])
+
+
+def _concat(parts: List[Columns]) -> Columns:
+    return {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+
+
+def csv_lines(columns: Columns) -> np.ndarray:
+    """
+    One CSV line per row, formatted with array operations: amounts with
+    two decimals, dates as YYYY-MM-DD. Generated values never contain
+    commas, quotes or newlines, so no quoting is needed.
+    """
+    fields = []
+    for col in columns.values():
+        if col.dtype.kind == "f":
+            cents = np.round(col * 100).astype(np.int64)
+            units = np.abs(cents)
+            col = _join(np.where(cents < 0, "-", ""), units // 100, ".", np.char.zfill((units % 100).astype(str), 2))
+        elif col.dtype.kind == "M":
+            col = np.datetime_as_string(col, unit="D")
+        elif col.dtype.kind == "b":
+            col = np.where(col, "True", "False")
+        fields.extend([",", col])
+    return _join(*fields[1:])
+
+
+class Scenario:
+    """
+    Generation knobs. Scenario shares are per invoice and must sum to 1;
+    half of the unmatched invoices also get a stray payment that matches
+    nothing, as in the original generator.
+    """
+
+    def __init__(self, one_to_one: float = 0.70, split: float = 0.15, bulk: float = 0.0, unmatched: float = 0.15,
+                 amount_noise: float = 0.0, noise_max: float = 0.50, missing_reference: float = 0.0,
+                 hot_tenant_share: float = 0.0, hot_amount_share: float = 0.0, vendors: int = 5,
+                 vendor_skew: float = 0.0, currencies: Sequence[Tuple[str, float]] = (("USD", 1.0),)):
+        self.shares = np.array([one_to_one, split, bulk, unmatched], dtype=float)
+        if (self.shares < 0).any() or abs(self.shares.sum() - 1) > 1e-9:
+            raise ValueError(f"Scenario shares must be >= 0 and sum to 1, got {dict(zip(SCENARIOS, self.shares))}")
+        # Share of 1:1 payments whose amount is off by up to `noise_max` (bank fees, FX rounding)
+        self.amount_noise = amount_noise
+        self.noise_max_cents = max(1, round(noise_max * 100))
+        # Share of matched payments whose remittance names no invoice or PO
+        self.missing_reference = missing_reference
+        # Share of all invoices that belong to the first customer
+        self.hot_tenant_share = hot_tenant_share
+        # Share of invoices drawn from 20 common amounts (large exact-amount buckets)
+        self.hot_amount_share = hot_amount_share
+        self.vendors = np.array(VENDORS[:vendors] + [f"Supplier {v:03d}" for v in range(len(VENDORS), vendors)])
+        # Zipf exponent over vendors (0 = uniform)
+        weights = 1 / np.arange(1, len(self.vendors) + 1) ** vendor_skew
+        self.vendor_p = weights / weights.sum()
+        self.currencies = np.array([c for c, _ in currencies])
+        weights = np.array([w for _, w in currencies], dtype=float)
+        self.currency_p = weights / weights.sum()
+
+    def describe(self) -> Dict[str, object]:
+        return {
+            **dict(zip(SCENARIOS, self.shares.tolist())),
+            "amount_noise": self.amount_noise,
+            "noise_max": self.noise_max_cents / 100,
+            "missing_reference": self.missing_reference,
+            "hot_tenant_share": self.hot_tenant_share,
+            "hot_amount_share": self.hot_amount_share,
+            "vendors": len(self.vendors),
+            "currencies": dict(zip(self.currencies.tolist(), self.currency_p.round(4).tolist())),
+        }
+
+
+def generate_chunk(rng: np.random.Generator, start: int, n: int, customers: np.ndarray, scenario: Scenario,
+                   hot_amounts: np.ndarray, id_width: int) -> Tuple[Columns, Columns, Columns]:
+    """
+    Invoices `start` .. `start + n - 1` with their payments and ground
+    truth, as (invoices, payments, ground_truth) column arrays. N:1 groups
+    pair invoices of the same customer and currency within the chunk.
+    """
+    seq = np.arange(start, start + n)
+
+    # 1. Invoices
+    cust = rng.integers(0, len(customers), n)
+    if scenario.hot_tenant_share > 0:
+        cust[rng.random(n) < scenario.hot_tenant_share] = 0
+    customer_id = customers[cust]
+    invoice_id = _join("INV-", customer_id, "-", np.char.zfill(seq.astype(str), id_width))
+    cents = rng.integers(50_000, 1_000_001, n)
+    if scenario.hot_amount_share > 0:
+        hot = rng.random(n) < scenario.hot_amount_share
+        cents[hot] = hot_amounts[rng.integers(0, len(hot_amounts), hot.sum())]
+    currency = rng.choice(scenario.currencies, n, p=scenario.currency_p)
+    vendor = rng.choice(scenario.vendors, n, p=scenario.vendor_p)
+    invoice_date = FIRST_DAY + rng.integers(0, 181, n)
+    kind = rng.choice(len(SCENARIOS), n, p=scenario.shares)
+
+    invoices = {
+        "invoice_id": invoice_id,
+        "customer_id": customer_id,
+        "amount": cents / 100,
+        "currency": currency,
+        "vendor_name": vendor,
+        "po_number": _join("PO-", rng.integers(10000, 100000, n)),
+        "invoice_date": invoice_date,
+    }
+
+    # 2. Payments, one block per scenario: (rows of the invoice each payment
+    #    settles, payment columns); N:1 payments list their second invoice too
+    blocks = []
+
+    # 1:1, optionally with a small amount difference
+    rows = np.flatnonzero(kind == 0)
+    delta = np.zeros(len(rows), dtype=np.int64)
+    noisy = rng.random(len(rows)) < scenario.amount_noise
+    delta[noisy] = rng.integers(1, scenario.noise_max_cents + 1, noisy.sum()) * rng.choice([-1, 1], noisy.sum())
+    blocks.append(("1:1", rows, None, {
+        "payment_id": _join("PAY-", invoice_id[rows]),
+        "cents": cents[rows] + delta,
+        "remittance_raw": _join("Full payment for ", invoice_id[rows]),
+        "payment_date": invoice_date[rows] + rng.integers(5, 16, len(rows)),
+    }, delta))
+
+    # 1:N, 2-4 payments whose cents add up exactly to the invoice
+    split_rows = np.flatnonzero(kind == 1)
+    parts = rng.integers(2, 5, len(split_rows))
+    rows = np.repeat(split_rows, parts)
+    first = np.cumsum(parts) - parts
+    part = np.arange(len(rows)) - np.repeat(first, parts)
+    part_cents = np.zeros(len(rows), dtype=np.int64)
+    if len(split_rows):
+        weights = rng.random(len(rows)) + 0.05
+        part_cents = np.floor(weights / np.repeat(np.add.reduceat(weights, first), parts) * cents[rows]).astype(np.int64)
+        # Rounding remainder on the last part
+        part_cents[first + parts - 1] += cents[split_rows] - np.add.reduceat(part_cents, first)
+    blocks.append(("1:N", rows, None, {
+        "payment_id": _join("PAY-", invoice_id[rows], "-S", part),
+        "cents": part_cents,
+        "remittance_raw": _join("Partial payment ", part + 1, "/", np.repeat(parts, parts), " for ", invoice_id[rows]),
+        "payment_date": invoice_date[rows] + rng.integers(5, 31, len(rows)),
+    }, np.zeros(len(rows), dtype=np.int64)))
+
+    # N:1, one payment for two invoices of the same customer and currency;
+    # a bulk invoice left without a partner stays open
+    bulk_rows = np.flatnonzero(kind == 2)
+    bulk_rows = bulk_rows[np.lexsort((currency[bulk_rows], cust[bulk_rows]))]
+    pairs = len(bulk_rows) // 2
+    rows, second = bulk_rows[0:2 * pairs:2], bulk_rows[1:2 * pairs:2]
+    same = (cust[rows] == cust[second]) & (currency[rows] == currency[second])
+    rows, second = rows[same], second[same]
+    blocks.append(("N:1", rows, second, {
+        "payment_id": _join("PAY-", invoice_id[rows], "-B"),
+        "cents": cents[rows] + cents[second],
+        "remittance_raw": _join("Bulk settlement ", invoice_id[rows], " / ", invoice_id[second]),
+        "payment_date": np.maximum(invoice_date[rows], invoice_date[second]) + rng.integers(5, 16, len(rows)),
+    }, np.zeros(len(rows), dtype=np.int64)))
+
+    payment_parts, truth_parts = [], []
+    for label, rows, second, cols, delta in blocks:
+        trace_id = _join("TR-", rng.integers(100000, 1_000_000, len(rows)))
+        missing = rng.random(len(rows)) < scenario.missing_reference
+        remittance = np.where(missing, _join("Payment ref ", trace_id), cols["remittance_raw"])
+        payment_parts.append({
+            "payment_id": cols["payment_id"],
+            "customer_id": customer_id[rows],
+            "amount": cols["cents"] / 100,
+            "currency": currency[rows],
+            "sender_name": vendor[rows],
+            "trace_id": trace_id,
+            "remittance_raw": remittance,
+            "payment_date": cols["payment_date"],
+        })
+        for inv_rows in ((rows,) if second is None else (rows, second)):
+            truth_parts.append({
+                "customer_id": customer_id[rows],
+                "invoice_id": invoice_id[inv_rows],
+                "payment_id": cols["payment_id"],
+                "scenario": np.full(len(rows), label),
+                "has_reference": ~missing,
+                "amount_delta": delta / 100,
             })
-            
-            # Scenario Logic
-            scenario = random.random()
-            
-            if scenario < 0.7: # 1:1 Match
-                payments.append({
-                    "payment_id": f"PAY-{inv_id}",
-                    "customer_id": cust,
-                    "amount": amount,
-                    "currency": "USD",
-                    "sender_name": vendor,
-                    "trace_id": f"TR-{random.randint(100000, 999999)}",
-                    "remittance_raw": f"Full payment for {inv_id}",
-                    "payment_date": (inv_date + timedelta(days=random.randint(5, 15))).strftime("%Y-%m-%d")
-                })
-            elif scenario < 0.85: # 1:N Match (Multiple Payments for one Invoice)
-                num_splits = random.randint(2, 4)
-                split_amounts = np.random.dirichlet(np.ones(num_splits), size=1)[0] * amount
-                for s in range(num_splits):
-                    payments.append({
-                        "payment_id": f"PAY-{inv_id}-S{s}",
-                        "customer_id": cust,
-                        "amount": round(split_amounts[s], 2),
-                        "currency": "USD",
-                        "sender_name": vendor,
-                        "trace_id": f"TR-{random.randint(100000, 999999)}",
-                        "remittance_raw": f"Partial payment {s+1}/{num_splits} for {inv_id}",
-                        "payment_date": (inv_date + timedelta(days=random.randint(5, 30))).strftime("%Y-%m-%d")
-                    })
-            else: # Exception (Unmatched Invoice or Unmatched Payment)
-                if random.choice([True, False]):
-                    # Payment with no invoice
-                    err_id = f"PAY-ERR-{cust}-{len(payments)}"
-                    payments.append({
-                        "payment_id": err_id,
-                        "customer_id": cust,
-                        "amount": round(random.uniform(100, 500), 2),
-                        "currency": "USD",
-                        "sender_name": "Unknown Entity",
-                        "trace_id": f"TR-ERR-{random.randint(100000, 999999)}",
-                        "remittance_raw": "Zyxel maintenance fee",
-                        "payment_date": "2024-02-15"
-                    })
-                # If False, the invoice just stays PENDING (unmatched)
-
-    pd.DataFrame(invoices).to_csv("data/synthetic_invoices.csv", index=False)
-    pd.DataFrame(payments).to_csv("data/synthetic_payments.csv", index=False)
-    print(f"Generated {len(invoices)} invoices and {len(payments)} payments across {num_customers} customers.")
+
+    # Stray payments for half of the unmatched invoices
+    rows = np.flatnonzero(kind == 3)
+    rows = rows[rng.random(len(rows)) < 0.5]
+    payment_parts.append({
+        "payment_id": _join("PAY-ERR-", customer_id[rows], "-", np.char.zfill(seq[rows].astype(str), id_width)),
+        "customer_id": customer_id[rows],
+        "amount": rng.integers(10_000, 50_001, len(rows)) / 100,
+        "currency": currency[rows],
+        "sender_name": np.full(len(rows), "Unknown Entity"),
+        "trace_id": _join("TR-ERR-", rng.integers(100000, 1_000_000, len(rows))),
+        "remittance_raw": np.full(len(rows), "Zyxel maintenance fee"),
+        "payment_date": FIRST_DAY + rng.integers(0, 181, len(rows)),
+    })
+
+    payments = _concat(payment_parts)
+    # Bank statement order
+    order = np.argsort(payments["payment_date"], kind="stable")
+    return invoices, {name: col[order] for name, col in payments.items()}, _concat(truth_parts)
+
+
+def iter_chunks(num_invoices: int, customers: Sequence[str], scenario: Optional[Scenario] = None,
+                chunk_size: int = 1_000_000, seed: int = 42
+                ) -> Iterator[Tuple[Columns, Columns, Columns]]:
+    """
+    Yields (invoices, payments, ground_truth) column arrays for
+    `num_invoices` invoices, `chunk_size` invoices at a time (wrap one in
+    pd.DataFrame for a frame). The same seed and chunk size always give the
+    same rows.
+    """
+    scenario = scenario or Scenario()
+    rng = np.random.default_rng(seed)
+    customers = np.asarray(customers, dtype=str)
+    hot_amounts = rng.integers(50_000, 1_000_001, 20)
+    id_width = max(4, len(str(max(num_invoices - 1, 0))))
+    for start in range(0, num_invoices, chunk_size):
+        yield generate_chunk(rng, start, min(chunk_size, num_invoices - start), customers, scenario,
+                             hot_amounts, id_width)
+
+
+class DatasetWriter:
+    """
+    Appends column arrays to <prefix>_<name>.csv or .parquet files in
+    `output_dir`. Parquet needs pyarrow.
+    """
+
+    def __init__(self, output_dir: str, fmt: str = "csv", prefix: str = "synthetic"):
+        if fmt not in ("csv", "parquet"):
+            raise ValueError(f"Unsupported format: {fmt}")
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.prefix = prefix
+        self.paths: Dict[str, str] = {}
+        self._parquet_writers = {}
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write(self, name: str, columns: Columns):
+        first = name not in self.paths
+        path = self.paths.setdefault(name, os.path.join(self.output_dir, f"{self.prefix}_{name}.{self.fmt}"))
+        if self.fmt == "csv":
+            with open(path, "w" if first else "a") as f:
+                if first:
+                    f.write(",".join(columns) + "\n")
+                lines = csv_lines(columns)
+                if len(lines):
+                    f.write("\n".join(lines.tolist()) + "\n")
+            return
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)") from e
+        table = pa.table({n: pa.array(col) for n, col in columns.items()})
+        if first:
+            self._parquet_writers[name] = pq.ParquetWriter(path, table.schema)
+        self._parquet_writers[name].write_table(table)
+
+    def close(self):
+        for writer in self._parquet_writers.values():
+            writer.close()
+        self._parquet_writers.clear()
+
+
+def generate_data(num_customers: int = 50, invoices_per_cust: int = 40, num_invoices: Optional[int] = None,
+                  scenario: Optional[Scenario] = None, output_dir: str = "data", fmt: str = "csv",
+                  prefix: str = "synthetic", chunk_size: int = 1_000_000, seed: int = 42) -> Dict[str, int]:
+    """
+    Generates and writes the dataset; returns row counts per file.
+    """
+    customers = [f"CUST-{1000 + i}" for i in range(num_customers)]
+    num_invoices = num_invoices if num_invoices is not None else num_customers * invoices_per_cust
+    writer = DatasetWriter(output_dir, fmt, prefix)
+    counts = {"invoices": 0, "payments": 0, "ground_truth": 0}
+    started = time.perf_counter()
+    try:
+        for invoices, payments, truth in iter_chunks(num_invoices, customers, scenario, chunk_size, seed):
+            for name, columns in (("invoices", invoices), ("payments", payments), ("ground_truth", truth)):
+                writer.write(name, columns)
+                counts[name] += len(next(iter(columns.values())))
+            elapsed = time.perf_counter() - started
+            print(f"  {counts['invoices']:>12,} invoices {counts['payments']:>12,} payments "
+                  f"({(counts['invoices'] + counts['payments']) / elapsed:,.0f} rows/s)")
+    finally:
+        writer.close()
+    print(f"Generated {counts['invoices']} invoices and {counts['payments']} payments across {num_customers} "
+          f"customers ({counts['ground_truth']} ground-truth pairs) in {time.perf_counter() - started:.1f}s: "
+          f"{', '.join(writer.paths.values())}")
+    return counts
+
+
+def parse_currencies(values: List[str]) -> List[Tuple[str, float]]:
+    """
+    ["USD:0.7", "EUR:0.3"] -> [("USD", 0.7), ("EUR", 0.3)]; a bare code has weight 1.
+    """
+    parsed = []
+    for value in values:
+        code, _, weight = value.partition(":")
+        parsed.append((code.upper(), float(weight or 1)))
+    return parsed
+
 
 if __name__ == "__main__":
-    generate_data()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=50)
+    parser.add_argument("--invoices-per-customer", type=int, default=40)
+    parser.add_argument("--invoices", type=int, help="total invoices (overrides --invoices-per-customer)")
+    parser.add_argument("--one-to-one", type=float, default=0.70)
+    parser.add_argument("--split", type=float, default=0.15, help="share of invoices paid in 2-4 payments (1:N)")
+    parser.add_argument("--bulk", type=float, default=0.0, help="share of invoices paid two per payment (N:1)")
+    parser.add_argument("--unmatched", type=float, default=0.15)
+    parser.add_argument("--amount-noise", type=float, default=0.0, help="share of 1:1 payments with an amount difference")
+    parser.add_argument("--noise-max", type=float, default=0.50, help="largest amount difference")
+    parser.add_argument("--missing-reference", type=float, default=0.0,
+                        help="share of matched payments without an invoice/PO reference")
+    parser.add_argument("--hot-tenant-share", type=float, default=0.0, help="share of invoices of the first customer")
+    parser.add_argument("--hot-amount-share", type=float, default=0.0, help="share of invoices with one of 20 amounts")
+    parser.add_argument("--vendors", type=int, default=5)
+    parser.add_argument("--vendor-skew", type=float, default=0.0, help="Zipf exponent over vendors")
+    parser.add_argument("--currencies", nargs="+", default=["USD"], help="CODE[:WEIGHT] ...")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--output-dir", default="data")
+    parser.add_argument("--prefix", default="synthetic")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="invoices generated per chunk")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    generate_data(
+        num_customers=args.customers,
+        invoices_per_cust=args.invoices_per_customer,
+        num_invoices=args.invoices,
+        scenario=Scenario(
+            one_to_one=args.one_to_one, split=args.split, bulk=args.bulk, unmatched=args.unmatched,
+            amount_noise=args.amount_noise, noise_max=args.noise_max, missing_reference=args.missing_reference,
+            hot_tenant_share=args.hot_tenant_share, hot_amount_share=args.hot_amount_share,
+            vendors=args.vendors, vendor_skew=args.vendor_skew, currencies=parse_currencies(args.currencies),
+        ),
+        output_dir=args.output_dir,
+        fmt=args.format,
+        prefix=args.prefix,
+        chunk_size=args.chunk_size,
+        seed=args.seed,
+    )
@@ -1,12 +1,24 @@
 # File: db/connection.py
-import oracledb
+import asyncio
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
+try:
+    import oracledb
+except ImportError:
+    # Only the oracle backend needs the driver (see create_pool)
+    oracledb = None
+
 load_dotenv()
 
-# Automatically fetch CLOBs as strings to avoid validation issues in agents
-oracledb.defaults.fetch_lobs = False
+if oracledb is not None:
+    # Automatically fetch CLOBs as strings to avoid validation issues in agents
+    oracledb.defaults.fetch_lobs = False
 
 def get_connection(timeout=None):
     """
@@ -46,7 +58,6 @@ def get_connection(timeout=None):
         )
 
     # Run connect in a thread so we can implement a simple timeout
-    import threading
     q = []
     t = threading.Thread(target=_connect, args=(q,))
     t.daemon = True
@@ -59,8 +70,188 @@ def get_connection(timeout=None):
         raise val
     return val
 
+# --- Process-wide connection pool -------------------------------------------
+
+class PoolStats:
+    """
+    Acquire counts and wait times, for sizing the pool under load.
+    """
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.acquires = 0
+        self.timeouts = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+
+    def record(self, wait_s):
+        with self._lock:
+            self.acquires += 1
+            self.total_wait_s += wait_s
+            self.max_wait_s = max(self.max_wait_s, wait_s)
+            self._recent.append(wait_s)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            recent = sorted(self._recent)
+            acquires, timeouts = self.acquires, self.timeouts
+            total_wait_s, max_wait_s = self.total_wait_s, self.max_wait_s
+        p95 = recent[int(len(recent) * 0.95) - 1] if recent else 0.0
+        return {
+            "acquires": acquires,
+            "timeouts": timeouts,
+            "wait_ms_avg": round(total_wait_s / acquires * 1000, 3) if acquires else 0.0,
+            "wait_ms_p95": round(p95 * 1000, 3),
+            "wait_ms_max": round(max_wait_s * 1000, 3),
+        }
+
+_pool = None
+_pool_lock = threading.Lock()
+pool_stats = PoolStats()
+
+# --- Storage backends ---------------------------------------------------------
+# A backend is a factory `(min, max, increment) -> pool`. Everything above the
+# pool (queries, intake streaming, persistence and audit writes) only uses
+# this subset of the python-oracledb API, so any backend providing it runs
+# the same code:
+#   pool:       acquire(), close(force), opened, busy, min, max
+#   connection: cursor(), commit(), rollback(), ping(), close() (returns it to the pool)
+#   cursor:     execute, executemany(batcherrors=...), getbatcherrors, fetchall,
+#               fetchmany, fetchone, iteration, rowcount, description, arraysize,
+#               prefetchrows, outputtypehandler, setinputsizes
+# SQL is written for Oracle; backends translate what they need to.
+
+def _create_oracle_pool(min, max, increment):
+    if oracledb is None:
+        raise RuntimeError("DB_BACKEND=oracle needs the python-oracledb package")
+    wallet_location = os.getenv("ORACLE_WALLET_LOCATION", "wallet")
+    return oracledb.create_pool(
+        user=os.getenv("ORACLE_USER"),
+        password=os.getenv("ORACLE_PASSWORD"),
+        dsn=os.getenv("ORACLE_DSN", "reconcilationdb_high"),
+        config_dir=wallet_location,
+        wallet_location=wallet_location,
+        wallet_password=os.getenv("ORACLE_WALLET_PASSWORD"),
+        min=min,
+        max=max,
+        increment=increment,
+        stmtcachesize=int(os.getenv("ORACLE_STMT_CACHE_SIZE", "50")),
+        # Connections idle longer than this are pinged before being handed out
+        ping_interval=int(os.getenv("ORACLE_POOL_PING_INTERVAL", "60")),
+        getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+        wait_timeout=int(os.getenv("ORACLE_POOL_WAIT_TIMEOUT", "10000")),
+    )
+
+def _create_local_pool(min, max, increment):
+    if __package__:
+        from .local_db import LocalPool
+    else:
+        from local_db import LocalPool
+    return LocalPool(os.getenv("LOCAL_DB_PATH", ":memory:"), min=min, max=max, increment=increment,
+                     seed_dir=os.getenv("LOCAL_DB_SEED_DIR") or None,
+                     wait_timeout=int(os.getenv("ORACLE_POOL_WAIT_TIMEOUT", "10000")) / 1000)
+
+BACKENDS = {
+    "oracle": _create_oracle_pool,
+    # Embedded SQLite engine (db/local_db.py); "sqlite" is an alias
+    "local": _create_local_pool,
+    "sqlite": _create_local_pool,
+}
+
+def register_backend(name, factory):
+    """
+    Makes `factory(min, max, increment)` available as DB_BACKEND=<name>.
+    """
+    BACKENDS[name.lower()] = factory
+
+def backend_name():
+    return os.getenv("DB_BACKEND", "oracle").lower()
+
+def create_pool():
+    """
+    Creates the pool of the configured backend from the environment:
+      DB_BACKEND            oracle (default) or local/sqlite (embedded SQLite at
+                            LOCAL_DB_PATH, optionally loaded from the CSVs in
+                            LOCAL_DB_SEED_DIR on first use)
+      ORACLE_POOL_MIN/MAX/INCREMENT (pool size, all backends), ORACLE_STMT_CACHE_SIZE,
+      ORACLE_POOL_PING_INTERVAL (s), ORACLE_POOL_WAIT_TIMEOUT (ms, all backends)
+    """
+    name = backend_name()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown DB_BACKEND {name!r}; expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](
+        min=int(os.getenv("ORACLE_POOL_MIN", "2")),
+        max=int(os.getenv("ORACLE_POOL_MAX", "10")),
+        increment=int(os.getenv("ORACLE_POOL_INCREMENT", "1")),
+    )
+
+def get_pool():
+    """
+    Returns the process-wide pool, creating it on first use.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = create_pool()
+    return _pool
+
+@contextmanager
+def pooled_connection():
+    """
+    Borrows a connection from the pool and returns it on exit (uncommitted
+    work is rolled back by the pool). Acquire wait times go to `pool_stats`.
+    """
+    pool = get_pool()
+    start = time.perf_counter()
+    try:
+        conn = pool.acquire()
+    except Exception:
+        pool_stats.record_timeout()
+        raise
+    pool_stats.record(time.perf_counter() - start)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+def check_pool_health():
+    """
+    Pings the database through the pool; returns latency plus pool usage.
+    """
+    start = time.perf_counter()
+    with pooled_connection() as conn:
+        conn.ping()
+    return {"ping_ms": round((time.perf_counter() - start) * 1000, 3), **describe_pool()}
+
+def describe_pool():
+    pool = _pool
+    info = {"backend": backend_name(), **pool_stats.snapshot()}
+    if pool is not None:
+        info.update({"opened": pool.opened, "busy": pool.busy, "min": pool.min, "max": pool.max})
+    return info
+
+def close_pool(drain_timeout=30):
+    """
+    Drains the pool: waits up to `drain_timeout` seconds for borrowed
+    connections to be returned, then closes it.
+    """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is None:
+        return
+    deadline = time.monotonic() + drain_timeout
+    while pool.busy and time.monotonic() < deadline:
+        time.sleep(0.05)
+    pool.close(force=True)
+
 def execute_query(query, params=None):
-    with get_connection() as conn:
+    with pooled_connection() as conn:
         with conn.cursor() as cursor:
             if params:
                 cursor.execute(query, params)
@@ -69,10 +260,126 @@ def execute_query(query, params=None):
             return cursor.fetchall()
 
 def execute_statement(statement, params=None):
-    with get_connection() as conn:
+    """
+    Executes and commits a single DML statement; returns the affected row count.
+    """
+    with pooled_connection() as conn:
         with conn.cursor() as cursor:
             if params:
                 cursor.execute(statement, params)
             else:
                 cursor.execute(statement)
             conn.commit()
+            return cursor.rowcount
+
+def intake_output_type_handler(cursor, metadata):
+    """
+    Fetches integral NUMBER columns (e.g. amounts selected as NUMBER(18)
+    cents) as Python ints regardless of driver defaults such as
+    fetch_decimals. DATE/TIMESTAMP already arrive as datetime, which NumPy
+    converts to datetime64 directly.
+    """
+    if oracledb is not None and metadata.type_code is oracledb.DB_TYPE_NUMBER and metadata.scale == 0:
+        return cursor.var(int, arraysize=cursor.arraysize)
+
+def iter_query(query, params=None, batch_size=10000, arraysize=None, prefetchrows=None, output_type_handler=None):
+    """
+    Streams a query as lists of at most `batch_size` rows, keeping only one
+    batch of raw tuples in memory. `arraysize`/`prefetchrows` tune the
+    driver round trips (default: one round trip per batch).
+    """
+    with pooled_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.arraysize = arraysize or batch_size
+            cursor.prefetchrows = prefetchrows if prefetchrows is not None else cursor.arraysize + 1
+            if output_type_handler is not None:
+                cursor.outputtypehandler = output_type_handler
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+# --- Async access -------------------------------------------------------------
+# Blocking driver calls run on a bounded thread pool so the event loop keeps
+# serving other requests while a large tenant is loading. The pool's
+# connections are budgeted so that acquires wait rarely:
+#   - an executor task holds at most one connection while it runs;
+#   - an open stream (iter_query_async) holds one for its whole life, also
+#     between fetches, so at most DB_MAX_STREAMS streams are open at once;
+#     further streams wait for a slot without holding a connection;
+#   - DB_POOL_RESERVE connections are left to threads that acquire outside
+#     the executor (audit sink flushes, job threads).
+# The executor gets what remains of ORACLE_POOL_MAX. Anything beyond the
+# budget waits up to ORACLE_POOL_WAIT_TIMEOUT for a connection.
+
+_executor = None
+_executor_lock = threading.Lock()
+_stream_slots = None
+
+def db_budget():
+    """
+    (executor workers, concurrent streams) for the configured pool size.
+    """
+    pool_max = int(os.getenv("ORACLE_POOL_MAX", "10"))
+    available = max(2, pool_max - int(os.getenv("DB_POOL_RESERVE") or 3))
+    streams = int(os.getenv("DB_MAX_STREAMS") or max(1, available // 2))
+    workers = int(os.getenv("DB_EXECUTOR_WORKERS") or max(1, available - streams))
+    return workers, streams
+
+def get_db_executor():
+    global _executor, _stream_slots
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers, streams = db_budget()
+                _stream_slots = threading.BoundedSemaphore(streams)
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+    return _executor
+
+def shutdown_db_executor():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+async def run_db(fn, *args, **kwargs):
+    """
+    Runs a blocking database function on the DB executor.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), lambda: fn(*args, **kwargs))
+
+async def execute_query_async(query, params=None):
+    return await run_db(execute_query, query, params)
+
+async def execute_statement_async(statement, params=None):
+    return await run_db(execute_statement, statement, params)
+
+async def iter_query_async(query, params=None, **kwargs):
+    """
+    Async variant of iter_query: each batch is fetched on the DB executor.
+    Takes one of the DB_MAX_STREAMS stream slots for its lifetime.
+    """
+    get_db_executor()
+    slots = _stream_slots
+    # Polled, so a cancelled waiter never ends up holding a slot
+    while not slots.acquire(blocking=False):
+        await asyncio.sleep(0.01)
+    try:
+        batches = iter_query(query, params, **kwargs)
+        try:
+            while True:
+                rows = await run_db(next, batches, None)
+                if rows is None:
+                    break
+                yield rows
+        finally:
+            await run_db(batches.close)
+    finally:
+        slots.release()
@@ -0,0 +1,251 @@
+# File: db/embeddings.py
+"""
+Embedding pipeline for `metadata_vectors`: finds rows whose embedding is
+missing or stale, embeds their text in batches with a bounded number of
+concurrent requests, and writes the vectors back in bulk.
+
+Embeddings are cached by content hash (model + text) in `embedding_cache`,
+so text that was embedded before - including across re-seeds - is never
+sent to the API again. Only the delta is embedded on each run.
+
+CLI usage (from the repo root):
+    python -m db.embeddings
+    python -m db.embeddings --customer CUST-1001 --backend local --batch-size 256 --concurrency 4
+"""
+import argparse
+import array
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+if __package__:
+    from .connection import execute_query, pooled_connection
+else:
+    from connection import execute_query, pooled_connection
+
+# Matches VECTOR(1536, FLOAT32) in db/schema.sql
+EMBEDDING_DIM = 1536
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class OpenAIEmbeddingBackend:
+    """
+    OpenAI embeddings; one request embeds a whole batch of texts.
+    """
+
+    def __init__(self, model: str = "text-embedding-3-small", client=None):
+        self.model = model
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = client
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(input=list(texts), model=self.model)
+        # The API may return items out of order; `index` is the input position
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class LocalEmbeddingBackend:
+    """
+    Deterministic offline embeddings (feature hashing of word tokens and
+    character trigrams). Same text -> same vector on every machine, with
+    no network access; for tests, demos and local runs.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.model = f"local-hash-{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        words = _TOKEN_RE.findall(text.lower())
+        grams = [w[i:i + 3] for w in words for i in range(max(len(w) - 2, 1))]
+        return words + grams
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+                vectors[row, digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.where(norms == 0, 1, norms)).tolist()
+
+
+def get_backend(name: Optional[str] = None):
+    """
+    EMBEDDING_BACKEND=openai (default) or local.
+    """
+    name = (name or os.getenv("EMBEDDING_BACKEND", "openai")).lower()
+    if name == "local":
+        return LocalEmbeddingBackend()
+    if name == "openai":
+        return OpenAIEmbeddingBackend(os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"))
+    raise ValueError(f"Unknown embedding backend: {name}")
+
+
+def content_hash(model: str, text: str) -> str:
+    """
+    Cache key of one embedding: the model and the exact text sent to it.
+    """
+    return hashlib.sha256(f"{model}\x00{text}".encode()).hexdigest()
+
+
+def prepare_text(text: Optional[str]) -> str:
+    return (text or "").replace("\n", " ")
+
+
+def to_bind(vector: Sequence[float]) -> array.array:
+    """
+    Bind value for a VECTOR(…, FLOAT32) column.
+    """
+    return array.array("f", vector)
+
+
+class EmbeddingPipeline:
+    """
+    Fills `metadata_vectors.embedding` for rows that need it:
+      1. select rows with no embedding or a content hash from another text/model
+      2. hash their text and look the hashes up in `embedding_cache`
+      3. embed the remaining distinct texts in batches, `concurrency` at a time
+      4. write new vectors to the cache and all vectors to the rows in bulk
+    """
+
+    def __init__(self, backend=None, batch_size: int = 256, concurrency: int = 4,
+                 write_chunk_size: int = 1000, retries: int = 3):
+        self.backend = backend or get_backend()
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.write_chunk_size = write_chunk_size
+        self.retries = retries
+        self.stats = {"rows": 0, "cache_hits": 0, "embedded": 0, "requests": 0}
+
+    def pending_rows(self, customer_id: Optional[str] = None, recheck: bool = False) -> List[Tuple[int, str, str]]:
+        """
+        (vector_id, text, content hash) of rows whose embedding is missing
+        or out of date. Without `recheck` only rows never embedded with a
+        hash are considered (the daily delta); `recheck` re-hashes every row
+        so edited texts and model changes are picked up too.
+        """
+        query = ("SELECT vector_id, metadata_text, content_hash, "
+                 "CASE WHEN embedding IS NULL THEN 1 ELSE 0 END FROM metadata_vectors")
+        clauses, params = [], {}
+        if not recheck:
+            clauses.append("(embedding IS NULL OR content_hash IS NULL)")
+        if customer_id:
+            clauses.append("customer_id = :cid")
+            params["cid"] = customer_id
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+
+        pending = []
+        for vector_id, text, current_hash, missing in execute_query(query, params):
+            text = prepare_text(text)
+            new_hash = content_hash(self.backend.model, text)
+            if missing or new_hash != current_hash:
+                pending.append((vector_id, text, new_hash))
+        return pending
+
+    def cached_embeddings(self, hashes: Sequence[str]) -> Dict[str, object]:
+        """
+        Embeddings already in `embedding_cache` for the given hashes.
+        """
+        found = {}
+        hashes = list(hashes)
+        for start in range(0, len(hashes), self.write_chunk_size):
+            chunk = hashes[start:start + self.write_chunk_size]
+            binds = {f"h{i}": h for i, h in enumerate(chunk)}
+            rows = execute_query(
+                f"SELECT content_hash, embedding FROM embedding_cache "
+                f"WHERE content_hash IN ({', '.join(':' + name for name in binds)})",
+                binds
+            )
+            found.update((h, embedding) for h, embedding in rows)
+        return found
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(1, self.retries + 1):
+            try:
+                return self.backend.embed(texts)
+            except Exception as e:
+                print(f"embedding batch attempt {attempt} failed: {e}")
+                if attempt == self.retries:
+                    raise
+                time.sleep(2 ** attempt)
+
+    def embed_texts(self, texts: Dict[str, str]) -> Dict[str, List[float]]:
+        """
+        Embeds {hash: text} in batches of `batch_size`, with at most
+        `concurrency` requests in flight.
+        """
+        items = list(texts.items())
+        batches = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+        vectors = {}
+        with ThreadPoolExecutor(max_workers=max(1, self.concurrency)) as pool:
+            for batch, result in zip(batches, pool.map(lambda b: self._embed_batch([t for _, t in b]), batches)):
+                vectors.update((h, v) for (h, _), v in zip(batch, result))
+                self.stats["requests"] += 1
+        return vectors
+
+    def write_back(self, rows: List[Tuple[int, str]], vectors: Dict[str, object], new_hashes: Sequence[str]):
+        """
+        Inserts newly embedded vectors into the cache and updates every
+        pending row, in chunks of `write_chunk_size`, in one transaction.
+        """
+        cache_rows = [(h, self.backend.model, to_bind(vectors[h])) for h in new_hashes]
+        update_rows = [(vectors[h] if isinstance(vectors[h], (bytes, array.array)) else to_bind(vectors[h]), h, vid)
+                       for vid, h in rows]
+        with pooled_connection() as conn:
+            with conn.cursor() as cursor:
+                for start in range(0, len(cache_rows), self.write_chunk_size):
+                    cursor.executemany(
+                        "INSERT INTO embedding_cache (content_hash, model, embedding) VALUES (:1, :2, :3)",
+                        cache_rows[start:start + self.write_chunk_size], batcherrors=True
+                    )
+                for start in range(0, len(update_rows), self.write_chunk_size):
+                    cursor.executemany(
+                        "UPDATE metadata_vectors SET embedding = :1, content_hash = :2 WHERE vector_id = :3",
+                        update_rows[start:start + self.write_chunk_size]
+                    )
+            conn.commit()
+
+    def run(self, customer_id: Optional[str] = None, recheck: bool = False) -> Dict[str, int]:
+        start = time.perf_counter()
+        # 1. Delta
+        pending = self.pending_rows(customer_id, recheck)
+        self.stats["rows"] = len(pending)
+        if not pending:
+            return dict(self.stats, elapsed_s=round(time.perf_counter() - start, 3))
+
+        # 2. Cache lookup (also de-duplicates identical texts within the run)
+        texts = {h: text for _, text, h in pending}
+        vectors = self.cached_embeddings(texts)
+        self.stats["cache_hits"] = sum(1 for _, _, h in pending if h in vectors)
+
+        # 3. Embed the misses
+        misses = {h: text for h, text in texts.items() if h not in vectors}
+        vectors.update(self.embed_texts(misses))
+        self.stats["embedded"] = len(misses)
+
+        # 4. Bulk write-back
+        self.write_back([(vid, h) for vid, _, h in pending], vectors, list(misses))
+        return dict(self.stats, elapsed_s=round(time.perf_counter() - start, 3))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed new or changed metadata_vectors rows.")
+    parser.add_argument("--customer", help="only this customer's rows")
+    parser.add_argument("--backend", choices=["openai", "local"], help="defaults to EMBEDDING_BACKEND")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("EMBEDDING_BATCH_SIZE", "256")))
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("EMBEDDING_CONCURRENCY", "4")))
+    parser.add_argument("--recheck", action="store_true", help="re-hash every row to catch edited texts")
+    args = parser.parse_args()
+
+    pipeline = EmbeddingPipeline(get_backend(args.backend), batch_size=args.batch_size, concurrency=args.concurrency)
+    print(pipeline.run(args.customer, args.recheck))
@@ -0,0 +1,357 @@
+# File: db/local_db.py
+"""
+Embedded SQLite storage backend (DB_BACKEND=local) for tests, CI,
+benchmarks and offline bulk runs. It exposes the subset of the
+python-oracledb pool/connection/cursor API the app uses (see
+db/connection.py) and rewrites the few Oracle-only constructs in our SQL.
+
+A new database can be loaded from the CSVs in data/ (LOCAL_DB_SEED_DIR,
+or the CLI below): one executemany per file straight from the csv
+reader, inside one transaction, with indexes rebuilt after the load.
+
+CLI usage (from the repo root):
+    python -m db.local_db --db recon.db --load data/
+"""
+import argparse
+import array
+import csv
+import glob
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Sequence
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql")
+
+# Oracle types/defaults in db/schema.sql -> SQLite equivalents
+_DDL_REWRITES = [
+    (re.compile(r"NUMBER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY", re.I), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"VARCHAR2", re.I), "VARCHAR"),
+    (re.compile(r"\bCLOB\b", re.I), "TEXT"),
+    (re.compile(r"\bJSON\b", re.I), "TEXT"),
+    (re.compile(r"VECTOR\(\d+,\s*\w+\)", re.I), "BLOB"),
+]
+
+# Oracle-only SQL used by the app -> SQLite equivalents
+_SQL_REWRITES = [
+    (re.compile(r"FETCH FIRST (\d+) ROWS ONLY", re.I), r"LIMIT \1"),
+    (re.compile(r"TRUNCATE TABLE", re.I), "DELETE FROM"),
+    (re.compile(r"\bCURRENT_TIMESTAMP\b", re.I), "(datetime('now', 'localtime'))"),
+]
+
+# VECTOR binds (array.array('f', ...)) are stored as raw float32 bytes
+sqlite3.register_adapter(array.array, lambda a: a.tobytes())
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_adapter(date, lambda d: d.isoformat() + " 00:00:00")
+sqlite3.register_converter("DATE", lambda b: datetime.fromisoformat(b.decode()))
+sqlite3.register_converter("TIMESTAMP", lambda b: datetime.fromisoformat(b.decode()))
+
+
+def translate_sql(sql: str) -> str:
+    for pattern, repl in _SQL_REWRITES:
+        sql = pattern.sub(repl, sql)
+    return sql
+
+
+# Per-connection settings for bulk work: WAL lets readers run alongside the
+# single writer, and NORMAL sync only fsyncs at checkpoints
+_FILE_PRAGMAS = ("PRAGMA journal_mode = WAL", "PRAGMA synchronous = NORMAL")
+_PRAGMAS = ("PRAGMA temp_store = MEMORY", "PRAGMA cache_size = -65536")
+
+# CSV files in a seed directory -> table (first match wins)
+SEED_TABLES = (("invoices", "*invoices*.csv"), ("payments", "*payments*.csv"))
+
+
+def _to_date(text, fmt=None):
+    # Only the ISO formats used by the app are needed locally
+    return None if text is None else str(text)[:10] + " 00:00:00"
+
+
+class BatchError:
+    """
+    Same attributes as the errors returned by oracledb's getbatcherrors().
+    """
+
+    def __init__(self, offset: int, message: str):
+        self.offset = offset
+        self.message = message
+
+
+class LocalCursor:
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+        self._rowcount = None
+        self._batch_errors = []
+        self.arraysize = 100
+        self.prefetchrows = 2
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, statement, params=None):
+        self._rowcount = None
+        self._cursor.execute(translate_sql(statement), params if params is not None else ())
+        return self
+
+    def executemany(self, statement, rows, batcherrors=False, **kwargs):
+        statement = translate_sql(statement)
+        self._rowcount = None
+        self._batch_errors = []
+        if not batcherrors:
+            self._cursor.executemany(statement, rows)
+            return
+        # Like oracledb batcherrors: failing rows are reported, the rest applied
+        count = 0
+        for offset, row in enumerate(rows):
+            try:
+                self._cursor.execute(statement, row)
+                count += self._cursor.rowcount
+            except sqlite3.DatabaseError as e:
+                self._batch_errors.append(BatchError(offset, str(e)))
+        self._rowcount = count
+
+    def getbatcherrors(self):
+        return self._batch_errors
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size or self.arraysize)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def setinputsizes(self, *args, **kwargs):
+        pass
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount if self._rowcount is None else self._rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class LocalConnection:
+    def __init__(self, pool: "LocalPool", conn: sqlite3.Connection):
+        self._pool = pool
+        self._conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def cursor(self):
+        return LocalCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def ping(self):
+        self._conn.execute("SELECT 1")
+
+    def close(self):
+        # Returns the connection to the pool, like a pooled oracledb connection
+        self._pool.release(self)
+
+
+class LocalPool:
+    """
+    Minimal pool of SQLite connections to one database file. `path`
+    ':memory:' gives a private shared in-memory database. A database
+    created by the pool is loaded from the CSVs in `seed_dir`, if given.
+    acquire() waits at most `wait_timeout` seconds (None: forever).
+    """
+
+    def __init__(self, path: str = ":memory:", min: int = 1, max: int = 4, increment: int = 1,
+                 seed_dir: Optional[str] = None, wait_timeout: Optional[float] = None, **kwargs):
+        if path == ":memory:":
+            self._dsn, self._uri = f"file:recon_{id(self)}?mode=memory&cache=shared", True
+        else:
+            self._dsn, self._uri = path, False
+        self.min, self.max, self.increment = min, max, increment
+        self.wait_timeout = wait_timeout
+        self._idle = []
+        self._lock = threading.Condition()
+        self.opened = 0
+        self.busy = 0
+        # Keeps a shared in-memory database alive while the pool exists
+        self._keepalive = self._open()
+        if self._ensure_schema(self._keepalive) and seed_dir:
+            load_dir(self._keepalive, seed_dir)
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._dsn, uri=self._uri, detect_types=sqlite3.PARSE_DECLTYPES,
+                               check_same_thread=False, timeout=30)
+        conn.create_function("NVL", 2, lambda value, default: default if value is None else value)
+        conn.create_function("TO_DATE", 2, _to_date)
+        for pragma in _PRAGMAS + (() if self._uri else _FILE_PRAGMAS):
+            conn.execute(pragma)
+        return conn
+
+    def _ensure_schema(self, conn: sqlite3.Connection) -> bool:
+        """
+        Creates the tables of db/schema.sql; returns False if they exist.
+        """
+        if conn.execute("SELECT name FROM sqlite_master WHERE name = 'invoices'").fetchone():
+            return False
+        with open(SCHEMA_PATH) as f:
+            ddl = re.sub(r"--.*", "", f.read())
+        for pattern, repl in _DDL_REWRITES:
+            ddl = pattern.sub(repl, ddl)
+        conn.executescript(translate_sql(ddl))
+        # Oracle's one-row DUAL table, so `SELECT ... FROM dual` works unchanged
+        conn.executescript("CREATE TABLE IF NOT EXISTS dual (dummy VARCHAR(1)); INSERT INTO dual VALUES ('X');")
+        conn.commit()
+        return True
+
+    def acquire(self, timeout: float = None) -> LocalConnection:
+        """
+        Waits up to `timeout` seconds (default: the pool's wait_timeout, as
+        Oracle's POOL_GETMODE_TIMEDWAIT) for a free connection.
+        """
+        timeout = self.wait_timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while not self._idle and self.opened >= self.max:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if (remaining is not None and remaining <= 0) or not self._lock.wait(remaining):
+                    raise TimeoutError("Timed out waiting for a local pool connection")
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                conn = LocalConnection(self, self._open())
+                self.opened += 1
+            self.busy += 1
+            return conn
+
+    def release(self, conn: LocalConnection):
+        with self._lock:
+            conn._conn.rollback()
+            self._idle.append(conn)
+            self.busy -= 1
+            self._lock.notify()
+
+    def close(self, force: bool = False):
+        with self._lock:
+            for conn in self._idle:
+                conn._conn.close()
+            self._idle.clear()
+            self.opened = self.busy
+            self._keepalive.close()
+
+
+# --- Bulk loading ---------------------------------------------------------------
+
+def _column_types(conn: sqlite3.Connection, table: str) -> Dict[str, str]:
+    return {row[1]: row[2].upper() for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def bulk_insert(conn: sqlite3.Connection, table: str, columns: Sequence[str], rows: Iterable[Sequence],
+                raw_csv: bool = False) -> int:
+    """
+    Inserts `rows` with a single executemany, without committing. The
+    table's secondary indexes are dropped for the load and rebuilt after
+    it, which is much cheaper than maintaining them row by row. Rows whose
+    key already exists are skipped, so reloading a file is harmless.
+
+    With `raw_csv` the values are CSV strings, normalized in SQL rather
+    than per row in Python: empty fields become NULL and bare dates get
+    the time part the DATE adapter writes. Returns the rows inserted.
+    """
+    values = []
+    if raw_csv:
+        types = _column_types(conn, table)
+        for n, column in enumerate(columns, 1):
+            if types.get(column) in ("DATE", "TIMESTAMP"):
+                values.append(f"CASE WHEN length(?{n}) = 10 THEN ?{n} || ' 00:00:00' ELSE NULLIF(?{n}, '') END")
+            else:
+                values.append(f"NULLIF(?{n}, '')")
+    else:
+        values = ["?"] * len(columns)
+    statement = f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({', '.join(values)})"
+
+    indexes = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? "
+                           "AND sql IS NOT NULL", (table,)).fetchall()
+    for name, _ in indexes:
+        conn.execute(f"DROP INDEX {name}")
+    before = conn.total_changes
+    conn.executemany(statement, rows)
+    inserted = conn.total_changes - before
+    for _, sql in indexes:
+        conn.execute(sql)
+    return inserted
+
+
+def load_csv(conn: sqlite3.Connection, table: str, path: str) -> int:
+    """
+    Loads a CSV whose header names columns of `table` (the csv reader
+    feeds executemany directly), and registers the customers it
+    references. Returns the rows inserted.
+    """
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        columns = next(reader)
+        inserted = bulk_insert(conn, table, columns, reader, raw_csv=True)
+    if "customer_id" in columns:
+        conn.execute(f"INSERT OR IGNORE INTO customers (customer_id, name) "
+                     f"SELECT DISTINCT customer_id, customer_id FROM {table}")
+    return inserted
+
+
+def load_dir(conn: sqlite3.Connection, data_dir: str) -> Dict[str, int]:
+    """
+    Loads the invoice and payment CSVs in `data_dir` (see SEED_TABLES) in
+    one transaction. Returns rows inserted per table.
+    """
+    counts = {}
+    try:
+        for table, pattern in SEED_TABLES:
+            paths = sorted(glob.glob(os.path.join(data_dir, pattern)))
+            if paths:
+                counts[table] = load_csv(conn, table, paths[0])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return counts
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Create (or extend) an embedded reconciliation database from CSVs.")
+    parser.add_argument("--db", default=os.getenv("LOCAL_DB_PATH", "recon.db"), help="SQLite database file")
+    parser.add_argument("--load", default="data", help="directory with *invoices*.csv / *payments*.csv")
+    args = parser.parse_args(argv)
+
+    pool = LocalPool(args.db, max=1)
+    try:
+        start = time.perf_counter()
+        counts = load_dir(pool._keepalive, args.load)
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.close()
+    rows = sum(counts.values())
+    print(f"Loaded {counts} into {args.db} in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -69,6 +69,7 @@ CREATE TABLE metadata_vectors (
     customer_id VARCHAR2(50) REFERENCES customers(customer_id),
     metadata_text CLOB,
     embedding VECTOR(1536, FLOAT32), -- Oracle 26AI VECTOR type (OpenAI embedding size)
+    content_hash VARCHAR2(64), -- SHA-256 of model + metadata_text the embedding was built from
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -84,14 +85,55 @@ CREATE TABLE audit_trail (
     new_state JSON,
     agent_version VARCHAR2(20),
     prompt_hash VARCHAR2(64),
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    chain_hash VARCHAR2(64) -- SHA-256 over this record and the customer's previous chain_hash
+);
+
+-- Newest chain_hash per customer; locked by every audit_trail writer
+CREATE TABLE audit_chain_heads (
+    customer_id VARCHAR2(50) PRIMARY KEY REFERENCES customers(customer_id),
+    chain_hash VARCHAR2(64),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 8. Incremental Reconciliation Watermarks (one row per tenant)
+CREATE TABLE reconciliation_watermarks (
+    customer_id VARCHAR2(50) PRIMARY KEY REFERENCES customers(customer_id),
+    last_created_at TIMESTAMP, -- newest payments.created_at already reconciled
+    last_run_at TIMESTAMP, -- start of the last incremental run
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 9. Embedding Cache (keyed by content hash, survives re-seeding)
+CREATE TABLE embedding_cache (
+    content_hash VARCHAR2(64) PRIMARY KEY,
+    model VARCHAR2(100),
+    embedding VECTOR(1536, FLOAT32),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 10. Exact pairs of a pushdown intake, staged while its residual rows load
+CREATE TABLE pushdown_matches (
+    run_id VARCHAR2(36),
+    customer_id VARCHAR2(50),
+    invoice_id VARCHAR2(50),
+    payment_id VARCHAR2(50),
+    invoice_amount NUMBER(18, 2),
+    payment_amount NUMBER(18, 2),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Indexes for performance
 CREATE INDEX idx_inv_cust ON invoices(customer_id);
 CREATE INDEX idx_pay_cust ON payments(customer_id);
+CREATE INDEX idx_inv_cust_status ON invoices(customer_id, status);
+CREATE INDEX idx_pay_cust_created ON payments(customer_id, created_at);
+CREATE INDEX idx_pay_cust_amount ON payments(customer_id, amount); -- exact-match pushdown join
+CREATE INDEX idx_match_cust_inv ON reconciliation_matches(customer_id, invoice_id);
+CREATE INDEX idx_match_cust_pay ON reconciliation_matches(customer_id, payment_id);
 CREATE INDEX idx_match_cust ON reconciliation_matches(customer_id);
 CREATE INDEX idx_audit_cust ON audit_trail(customer_id);
+CREATE INDEX idx_pushdown_run ON pushdown_matches(run_id);
 
 -- Vector Index (Example)
 -- CREATE VECTOR INDEX vidx_metadata ON metadata_vectors(embedding) ORGANIZATION NEIGHBOR PARTITIONS;
@@ -1,29 +1,109 @@
 # File: db/seed_db.py
-import pandas as pd
+"""
+Seeds the database from the invoice/payment CSVs: truncates the tenant
+tables, then bulk-loads customers, invoices, payments and their
+metadata_vectors rows and reports rows per second per table.
+
+Each file is read in chunks of `chunk_size` rows; bind arrays are built
+from whole columns of a chunk (no per-row Python work) and inserted with
+one executemany per chunk and table, using batch errors so a bad row is
+reported instead of aborting the load. Chunks are committed as they go
+and inserted by `workers` threads on their own pooled connections, so
+invoices and payments (and chunks of one file) load in parallel.
+
+CLI usage (from the repo root):
+    python -m db.seed_db
+    python -m db.seed_db --invoices data/large_invoices.csv --payments data/large_payments.csv \\
+        --chunk-size 50000 --workers 8 --no-embeddings
+"""
+import argparse
 import os
-import oracledb
-from openai import OpenAI
-from connection import get_connection
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
 from dotenv import load_dotenv
 
+if __package__:
+    from .connection import backend_name, get_connection, oracledb, pooled_connection
+else:
+    from connection import backend_name, get_connection, oracledb, pooled_connection
+
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+SEED_CHUNK_ROWS = int(os.getenv("SEED_CHUNK_ROWS", "50000"))
+# Batch errors listed per table in the report
+MAX_REPORTED_ERRORS = 10
+
+# Everything clean_db empties; children before parents
+CLEAN_TABLES = [
+    "reconciliation_matches",
+    "remittance_extractions",
+    "metadata_vectors",
+    "reconciliation_watermarks",
+    "pushdown_matches",
+    "invoices",
+    "payments",
+    "audit_trail",
+    "audit_chain_heads",
+    "customers",
+]
+
+INSERT_CUSTOMER_SQL = "INSERT INTO customers (customer_id, name) VALUES (:1, :2)"
+INSERT_VECTOR_SQL = ("INSERT INTO metadata_vectors (source_type, source_id, customer_id, metadata_text) "
+                     "VALUES (:1, :2, :3, :4)")
+
+# file kind -> (insert SQL, [(CSV column, bind type)]); bind types: str (VARCHAR2,
+# sized per chunk), clob, float, date
+SEED_FILES = {
+    "invoices": (
+        "INSERT INTO invoices (invoice_id, customer_id, vendor_name, amount, currency, invoice_date, po_number, status) "
+        "VALUES (:1, :2, :3, :4, :5, :6, :7, 'PENDING')",
+        [("invoice_id", "str"), ("customer_id", "str"), ("vendor_name", "str"), ("amount", "float"),
+         ("currency", "str"), ("invoice_date", "date"), ("po_number", "str")],
+    ),
+    "payments": (
+        "INSERT INTO payments (payment_id, customer_id, sender_name, amount, currency, payment_date, trace_id, "
+        "remittance_raw, status) VALUES (:1, :2, :3, :4, :5, :6, :7, :8, 'UNMATCHED')",
+        [("payment_id", "str"), ("customer_id", "str"), ("sender_name", "str"), ("amount", "float"),
+         ("currency", "str"), ("payment_date", "date"), ("trace_id", "str"), ("remittance_raw", "clob")],
+    ),
+}
+
 
 def get_embedding(text):
     """
     Generates an embedding for the given text using OpenAI's text-embedding-3-small.
+    For many rows use embed_metadata_vectors(), which batches and caches.
     """
+    from openai import OpenAI
+
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
     text = text.replace("\n", " ")
     return client.embeddings.create(input=[text], model="text-embedding-3-small").data[0].embedding
 
 
+def embed_metadata_vectors():
+    """
+    Fills embeddings for the seeded metadata_vectors rows (only rows that
+    are new or changed; see db/embeddings.py).
+    """
+    if __package__:
+        from .embeddings import EmbeddingPipeline
+    else:
+        from embeddings import EmbeddingPipeline
+    print("Embedding metadata vectors...")
+    print(EmbeddingPipeline().run())
+
+
 def exec_stmt(statement, params=None, retries=3, timeout=10):
     """
     Execute a single statement with its own short-lived connection.
     Retries on transient connection errors.
     """
-    import time
     last_exc = None
     for attempt in range(1, retries + 1):
         try:
@@ -48,14 +128,13 @@ def create_schema():
     print("Creating Oracle 26AI Schema...")
     with open("db/schema.sql", "r") as f:
         schema_sql = f.read()
-    
+
     # Improved SQL splitting: Remove comments first, then split by semicolon
-    import re
     # Remove single line comments
     clean_sql = re.sub(r'--.*', '', schema_sql)
     # Split by semicolon and filter empty
     statements = [s.strip() for s in clean_sql.split(";") if s.strip()]
-    
+
     with get_connection(timeout=10) as conn:
         with conn.cursor() as cursor:
             for statement in statements:
@@ -69,110 +148,241 @@ def create_schema():
                     print(f"Statement skipped: {statement[:40]}... Error: {e}")
             conn.commit()
 
-def clean_db():
-    print("Cleaning existing data for a fresh seed...")
-    print("Deleting tables individually (robust to reconnects)...")
-    tables = [
-        "reconciliation_matches",
-        "metadata_vectors",
-        "invoices",
-        "payments",
-        "audit_trail",
-        "customers",
-    ]
-    for t in tables:
-        try:
-            print(f"Deleting from {t}...")
-            exec_stmt(f"DELETE FROM {t}")
-            print(f"Deleted from {t}.")
-        except Exception as e:
-            print(f"Warning deleting from {t}: {e}")
-    print("Cleanup complete (individual commits).")
+def _foreign_keys(cursor, tables: Sequence[str]) -> List[tuple]:
+    """
+    (table, constraint) of the enabled foreign keys on `tables`; Oracle
+    refuses to TRUNCATE a table referenced by one (ORA-02266).
+    """
+    names = ", ".join(f"'{t.upper()}'" for t in tables)
+    cursor.execute("SELECT table_name, constraint_name FROM user_constraints "
+                   f"WHERE constraint_type = 'R' AND status = 'ENABLED' AND table_name IN ({names})")
+    return cursor.fetchall()
 
-def seed_data():
-    clean_db()
-    
-    invoices_df = pd.read_csv("data/synthetic_invoices.csv", comment='#')
-    payments_df = pd.read_csv("data/synthetic_payments.csv", comment='#')
-    
-    with get_connection() as conn:
+def clean_db(tables: Sequence[str] = CLEAN_TABLES):
+    """
+    Empties `tables` with TRUNCATE on one connection. On Oracle their
+    foreign keys are disabled around the truncates and re-enabled once
+    every table is empty (which makes validating them instant).
+    """
+    print("Cleaning existing data for a fresh seed...")
+    start = time.perf_counter()
+    with pooled_connection() as conn:
         with conn.cursor() as cursor:
-            # 1. Seed Customers
-            print("Seeding customers...")
-            customer_ids = set(invoices_df['customer_id']).union(set(payments_df['customer_id']))
-            cust_data = [[cid, f"Tenant {cid}"] for cid in customer_ids]
-            cursor.executemany("INSERT INTO customers (customer_id, name) VALUES (:1, :2)", cust_data)
-            
-            # 2. Seed Invoices
-            print(f"Seeding {len(invoices_df)} invoices...")
-            inv_rows = []
-            vec_rows = []
-            for _, row in invoices_df.iterrows():
-                iid = str(row['invoice_id'])
-                cid = str(row['customer_id'])
-                vname = str(row['vendor_name'])
-                amt = float(row['amount'])
-                curr = str(row['currency'])
-                idat = str(row['invoice_date']).split(' ')[0]
-                pno = str(row['po_number']) if pd.notna(row['po_number']) else None
-                
-                inv_rows.append([iid, cid, vname, amt, curr, idat, pno])
-                
-                metadata_text = f"Invoice {iid} from {vname} for {amt} {curr}. PO: {pno}"
-                vec_rows.append([iid, cid, metadata_text])
-
-            cursor.executemany(
-                "INSERT INTO invoices (invoice_id, customer_id, vendor_name, amount, currency, invoice_date, po_number, status) "
-                "VALUES (:1, :2, :3, :4, :5, TO_DATE(:6, 'YYYY-MM-DD'), :7, 'PENDING')",
-                inv_rows
-            )
-            
-            cursor.executemany(
-                "INSERT INTO metadata_vectors (source_type, source_id, customer_id, metadata_text) "
-                "VALUES ('INVOICE', :1, :2, :3)",
-                vec_rows
-            )
-
-            # 3. Seed Payments
-            print(f"Seeding {len(payments_df)} payments...")
-            pay_rows = []
-            pay_vec_rows = []
-            for _, row in payments_df.iterrows():
-                pid = str(row['payment_id'])
-                cid = str(row['customer_id'])
-                sname = str(row['sender_name'])
-                amt = float(row['amount'])
-                curr = str(row['currency'])
-                pdat = str(row['payment_date']).split(' ')[0]
-                trid = str(row['trace_id'])
-                rraw = str(row['remittance_raw'])
-                
-                pay_rows.append([pid, cid, sname, amt, curr, pdat, trid, rraw])
-                
-                metadata_text = f"Payment {pid} from {sname} for {amt} {curr}. Trace: {trid}. Remittance: {rraw}"
-                pay_vec_rows.append([pid, cid, metadata_text])
-
-            cursor.executemany(
-                "INSERT INTO payments (payment_id, customer_id, sender_name, amount, currency, payment_date, trace_id, remittance_raw, status) "
-                "VALUES (:1, :2, :3, :4, :5, TO_DATE(:6, 'YYYY-MM-DD'), :7, :8, 'UNMATCHED')",
-                pay_rows
-            )
-            
-            cursor.executemany(
-                "INSERT INTO metadata_vectors (source_type, source_id, customer_id, metadata_text) "
-                "VALUES ('PAYMENT', :1, :2, :3)",
-                pay_vec_rows
-            )
+            constraints = _foreign_keys(cursor, tables) if backend_name() == "oracle" else []
+            for table, name in constraints:
+                cursor.execute(f"ALTER TABLE {table} DISABLE CONSTRAINT {name}")
+            try:
+                for t in tables:
+                    cursor.execute(f"TRUNCATE TABLE {t}")
+            finally:
+                for table, name in constraints:
+                    cursor.execute(f"ALTER TABLE {table} ENABLE CONSTRAINT {name}")
+        conn.commit()
+    print(f"Truncated {len(tables)} tables in {time.perf_counter() - start:.1f}s.")
+
 
+def _read_chunks(path: str, chunk_size: int, columns: Optional[List[str]] = None):
+    # Strings stay strings (IDs, PO numbers); amounts are converted explicitly
+    return pd.read_csv(path, comment="#", dtype=str, usecols=columns, chunksize=chunk_size)
+
+
+def _bind_column(col: pd.Series, kind: str) -> list:
+    """
+    A CSV column as a list of bind values, None where missing.
+    """
+    if kind == "float":
+        return col.astype("float64").tolist()
+    if kind == "date":
+        # Midnight datetimes bind as DATE on every backend
+        dates = pd.to_datetime(col, format="ISO8601").dt.normalize()
+        return dates.to_numpy(dtype="datetime64[us]").tolist()
+    return col.astype(object).where(col.notna(), None).tolist()
+
+
+def _input_sizes(df: pd.DataFrame, spec) -> list:
+    """
+    Bind sizes for cursor.setinputsizes: the longest value of each VARCHAR2
+    column in the chunk, so the driver allocates its buffers once instead
+    of growing them mid-batch. Other columns keep the driver default.
+    """
+    return [int(df[c].str.len().max()) if kind == "str" and df[c].notna().any() else None for c, kind in spec]
+
+
+def _metadata_text(kind: str, df: pd.DataFrame) -> pd.Series:
+    """
+    The metadata_vectors text of each row (same wording as before, so
+    embedding_cache keeps hitting across re-seeds). Missing values read as
+    the old row loop wrote them: "None" for a PO number, "nan" for a
+    payment's trace ID or remittance, although the columns now hold NULL.
+    """
+    text = lambda c, missing="None": df[c].fillna(missing)
+    amount = df["amount"].astype("float64").astype(str)
+    if kind == "invoices":
+        return ("Invoice " + text("invoice_id") + " from " + text("vendor_name") + " for " + amount + " "
+                + text("currency") + ". PO: " + text("po_number"))
+    return ("Payment " + text("payment_id") + " from " + text("sender_name") + " for " + amount + " "
+            + text("currency") + ". Trace: " + text("trace_id", "nan") + ". Remittance: "
+            + text("remittance_raw", "nan"))
+
+
+class BulkLoader:
+    """
+    Inserts bind arrays chunk by chunk on `workers` threads, each chunk on
+    a pooled connection in a transaction of its own. At most
+    2 * `workers` chunks are held in memory at a time.
+    """
+
+    def __init__(self, chunk_size: int = SEED_CHUNK_ROWS, workers: Optional[int] = None):
+        self.chunk_size = chunk_size
+        # SQLite has a single writer; parallel inserts would only queue
+        self.workers = workers or (int(os.getenv("ORACLE_POOL_MAX", "10")) // 2 if backend_name() == "oracle" else 1)
+        self.reports: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(2 * self.workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _report(self, table: str) -> Dict:
+        with self._lock:
+            return self.reports.setdefault(table, {"rows": 0, "inserted": 0, "failed": 0, "errors": [],
+                                                   "started": time.perf_counter(), "finished": None})
+
+    def _execute(self, cursor, table: str, sql: str, rows: List[tuple], sizes: Optional[list], offset: int) -> set:
+        """
+        One executemany with batch errors; returns the offsets of the rows
+        that failed.
+        """
+        if sizes and any(sizes):
+            cursor.setinputsizes(*sizes)
+        cursor.executemany(sql, rows, batcherrors=True)
+        errors = cursor.getbatcherrors()
+        report = self._report(table)
+        with self._lock:
+            report["rows"] += len(rows)
+            report["inserted"] += len(rows) - len(errors)
+            report["failed"] += len(errors)
+            for error in errors[:max(MAX_REPORTED_ERRORS - len(report["errors"]), 0)]:
+                report["errors"].append({"row": offset + error.offset + 1, "message": error.message})
+            report["finished"] = time.perf_counter()
+        return {error.offset for error in errors}
+
+    def _insert(self, table: str, sql: str, columns: List[list], sizes: Optional[list], offset: int,
+                vectors: Optional[List[list]] = None):
+        with pooled_connection() as conn:
+            with conn.cursor() as cursor:
+                failed = self._execute(cursor, table, sql, list(zip(*columns)), sizes, offset)
+                if vectors is not None:
+                    # No metadata_vectors rows for rows that were rejected
+                    rows = [row for i, row in enumerate(zip(*vectors)) if i not in failed]
+                    self._execute(cursor, "metadata_vectors", INSERT_VECTOR_SQL, rows, None, offset)
             conn.commit()
+
+    def submit(self, table: str, sql: str, columns: List[list], sizes: Optional[list] = None, offset: int = 0,
+               vectors: Optional[List[list]] = None):
+        """
+        Queues one chunk (equal-length bind value lists, one per column, plus
+        optionally the chunk's metadata_vectors columns, inserted in the same
+        transaction); blocks while 2 * workers chunks are pending.
+        """
+        self._report(table)
+        if vectors is not None:
+            self._report("metadata_vectors")
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._insert, table, sql, columns, sizes, offset, vectors)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def load_file(self, kind: str, path: str) -> list:
+        """
+        Reads a seed CSV chunk by chunk and queues its rows with their
+        metadata_vectors rows. Returns the futures of the chunks.
+        """
+        sql, spec = SEED_FILES[kind]
+        source_type = "INVOICE" if kind == "invoices" else "PAYMENT"
+        futures, offset = [], 0
+        for df in _read_chunks(path, self.chunk_size):
+            columns = [_bind_column(df[c], bind) for c, bind in spec]
+            # columns[0] / columns[1] are the row ID and customer_id
+            vectors = [[source_type] * len(df), columns[0], columns[1], _metadata_text(kind, df).tolist()]
+            futures.append(self.submit(kind, sql, columns, _input_sizes(df, spec), offset, vectors))
+            offset += len(df)
+        return futures
+
+    def run(self, invoices_path: str, payments_path: str) -> Dict[str, Dict]:
+        """
+        Loads customers (every customer_id in either file), then invoices
+        and payments side by side. Returns the per-table reports.
+        """
+        start = time.perf_counter()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="seed")
+        try:
+            # 1. Customers first: the other tables reference them
+            customer_ids = set()
+            for path in (invoices_path, payments_path):
+                for df in _read_chunks(path, self.chunk_size, ["customer_id"]):
+                    customer_ids.update(df["customer_id"].dropna().unique().tolist())
+            customer_ids = sorted(customer_ids)
+            self.submit("customers", INSERT_CUSTOMER_SQL,
+                        [customer_ids, [f"Tenant {cid}" for cid in customer_ids]]).result()
+
+            # 2. Both files are read on their own thread and share the insert workers
+            with ThreadPoolExecutor(max_workers=2, thread_name_prefix="seed-read") as readers:
+                reads = [readers.submit(self.load_file, kind, path)
+                         for kind, path in (("invoices", invoices_path), ("payments", payments_path))]
+                futures = [f for read in reads for f in read.result()]
+            for future in futures:
+                future.result()
+        finally:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+        for report in self.reports.values():
+            seconds = (report.pop("finished") or time.perf_counter()) - report.pop("started")
+            report["seconds"] = round(seconds, 3)
+            report["rows_per_s"] = round(report["rows"] / seconds) if seconds > 0 else None
+        elapsed = time.perf_counter() - start
+        rows = sum(r["rows"] for r in self.reports.values())
+        self.reports["total"] = {"rows": rows, "seconds": round(elapsed, 3),
+                                 "rows_per_s": round(rows / elapsed) if elapsed > 0 else None}
+        return self.reports
+
+
+def seed_data(invoices_path: str = "data/synthetic_invoices.csv", payments_path: str = "data/synthetic_payments.csv",
+              chunk_size: int = SEED_CHUNK_ROWS, workers: Optional[int] = None) -> Dict[str, Dict]:
+    clean_db()
+    loader = BulkLoader(chunk_size, workers)
+    print(f"Seeding {invoices_path} and {payments_path} ({loader.workers} workers, {chunk_size} rows per chunk)...")
+    reports = loader.run(invoices_path, payments_path)
+    for table, r in reports.items():
+        failed = f", {r['failed']} failed" if r.get("failed") else ""
+        print(f"  {table}: {r['rows']:,} rows in {r['seconds']:.1f}s ({r['rows_per_s'] or 0:,} rows/s){failed}")
+        for error in r.get("errors", []):
+            print(f"    row {error['row']}: {error['message']}")
     print("Seeding process completed!")
+    return reports
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Truncate and bulk-load the seed CSVs.")
+    parser.add_argument("--invoices", default="data/synthetic_invoices.csv")
+    parser.add_argument("--payments", default="data/synthetic_payments.csv")
+    parser.add_argument("--chunk-size", type=int, default=SEED_CHUNK_ROWS, help="rows per executemany")
+    parser.add_argument("--workers", type=int, help="insert threads (default: half the pool on oracle, 1 on sqlite)")
+    parser.add_argument("--create-schema", action="store_true", help="run db/schema.sql first (oracle)")
+    parser.add_argument("--no-embeddings", action="store_true", help="skip embedding metadata_vectors")
+    args = parser.parse_args()
     try:
         # Step 1: Ensure Schema exists
-        # create_schema() # We can skip if already created, or run it once more
-        
+        if args.create_schema:
+            create_schema()
+
         # Step 2: Seed
-        seed_data()
+        seed_data(args.invoices, args.payments, args.chunk_size, args.workers)
+
+        # Step 3: Embeddings (EMBEDDING_BACKEND=local for offline runs)
+        if not args.no_embeddings and os.getenv("SEED_EMBEDDINGS", "true").lower() == "true":
+            embed_metadata_vectors()
     except Exception as e:
         print(f"Error during seeding: {e}")
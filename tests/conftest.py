@@ -0,0 +1,25 @@
+# File: tests/conftest.py
+import os
+import sys
+
+# Tests run against the embedded SQLite backend, seeded from the CSVs in data/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ["LOCAL_DB_PATH"] = ":memory:"
+os.environ["LOCAL_DB_SEED_DIR"] = os.path.join(ROOT, "data")
+sys.path.insert(0, ROOT)
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def client():
+    """
+    API client over one app lifespan for the whole session (shutdown
+    drains jobs, the audit sink and the DB pool).
+    """
+    from fastapi.testclient import TestClient
+    from backend.main import app
+
+    with TestClient(app) as c:
+        yield c
@@ -0,0 +1,117 @@
+# File: tests/test_jobs.py
+import threading
+
+import pytest
+
+from backend.agents.matching_agent import MatchingAgent
+from backend.jobs import JobManager
+
+TIMEOUT_S = 30
+
+
+def request(customer_id, **extra):
+    return dict({"customer_id": customer_id, "tenant_name": "Test", "use_cache": False}, **extra)
+
+
+def wait_done(manager, job):
+    after = None
+    while not job.done:
+        assert manager.wait(job, after, TIMEOUT_S), "job made no progress"
+        after = len(job.events) - 1
+    return job
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(max_workers=1)
+    yield manager
+    manager.shutdown()
+
+
+@pytest.fixture
+def matching_gate(monkeypatch):
+    """
+    Holds every run inside the matching stage until `release` is set;
+    `entered` is set once a run reaches it.
+    """
+    entered, release = threading.Event(), threading.Event()
+    hybrid_match = MatchingAgent.hybrid_match
+
+    def gated(self, state):
+        entered.set()
+        assert release.wait(TIMEOUT_S)
+        return hybrid_match(self, state)
+
+    monkeypatch.setattr(MatchingAgent, "hybrid_match", gated)
+    yield entered, release
+    release.set()
+
+
+def test_progress_events_follow_the_stage_order(manager):
+    job, attached = manager.submit(request("CUST-1004", persist=True))
+    assert not attached
+    wait_done(manager, job)
+
+    snapshot = job.snapshot()
+    assert snapshot["status"] == "SUCCEEDED", snapshot["error"]
+    assert snapshot["progress"] == 1.0 and snapshot["stage"] == "persistence"
+    events = snapshot["events"]
+    assert [e["seq"] for e in events] == list(range(len(events)))
+    assert [e["stage"] for e in events[:2]] == ["queued", "started"]
+    assert events[1]["data"]["stages"] == job.stages
+    assert [e["stage"] for e in events if e["stage"] in job.stages] == job.stages
+    assert job.completed_stages == job.stages
+    assert events[-1]["stage"] == "succeeded" and events[-1]["data"]["run_id"] == job.run_id
+    assert [t["stage"] for t in job.timings if t["stage"] in job.stages] == job.stages
+
+    # Polling after a seq only returns the later events
+    assert job.snapshot(after=2)["events"] == events[3:]
+    assert job.snapshot(after=len(events) - 1)["events"] == []
+
+
+def test_cancel_running_job_stops_at_the_next_stage(manager, matching_gate):
+    entered, release = matching_gate
+    job, _ = manager.submit(request("CUST-1004"))
+    assert entered.wait(TIMEOUT_S)
+
+    # A second submission for the tenant attaches to the running job
+    again, attached = manager.submit(request("CUST-1004"))
+    assert attached and again is job
+
+    assert manager.cancel(job.job_id) is job
+    assert job.status == "RUNNING"
+    release.set()
+    wait_done(manager, job)
+
+    assert job.status == "CANCELLED"
+    assert job.error == "Cancelled before stage 'exceptions'"
+    assert job.completed_stages == ["intake", "extraction", "matching"]
+    stages = [e["stage"] for e in job.events]
+    assert stages.index("cancel_requested") < stages.index("matching") < stages.index("cancelled")
+    assert stages[-1] == "cancelled"
+
+    # The tenant can submit again once the job has ended
+    retry, attached = manager.submit(request("CUST-1004"))
+    assert not attached and retry is not job
+    wait_done(manager, retry)
+    assert retry.status == "SUCCEEDED", retry.error
+
+
+def test_cancel_queued_job_never_starts(manager, matching_gate):
+    entered, release = matching_gate
+    running, _ = manager.submit(request("CUST-1004"))
+    assert entered.wait(TIMEOUT_S)
+    # One worker: this job waits behind the running one
+    queued, _ = manager.submit(request("CUST-1001"))
+    assert queued.status == "QUEUED"
+
+    manager.cancel(queued.job_id)
+    assert queued.status == "CANCELLED" and queued.started_at is None
+    assert [e["stage"] for e in queued.events] == ["queued", "cancelled"]
+    # Cancelling a finished job changes nothing
+    assert manager.cancel(queued.job_id).status == "CANCELLED"
+
+    release.set()
+    wait_done(manager, running)
+    assert running.status == "SUCCEEDED", running.error
+    assert queued.events[-1]["stage"] == "cancelled"
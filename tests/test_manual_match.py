@@ -0,0 +1,73 @@
+# File: tests/test_manual_match.py
+import json
+
+import pytest
+
+from db.connection import execute_query
+
+CUSTOMER_ID = "CUST-1004"
+
+
+@pytest.fixture(scope="module")
+def proposed_pairs(client):
+    """
+    Persists an auto-matching run for the tenant and returns the stored
+    PROPOSED (invoice_id, payment_id, match_type) rows.
+    """
+    resp = client.post("/reconcile", json={"customer_id": CUSTOMER_ID, "tenant_name": "Test", "persist": True})
+    assert resp.status_code == 200, resp.text
+    rows = execute_query(
+        "SELECT invoice_id, payment_id, match_type FROM reconciliation_matches "
+        "WHERE customer_id = :cid AND status = 'PROPOSED' ORDER BY invoice_id, payment_id",
+        {"cid": CUSTOMER_ID})
+    assert len(rows) >= 2
+    return rows
+
+
+def stored(invoice_id, payment_id):
+    return execute_query(
+        "SELECT match_type, status, explanation, confidence_score FROM reconciliation_matches "
+        "WHERE customer_id = :cid AND invoice_id = :inv AND payment_id = :pay",
+        {"cid": CUSTOMER_ID, "inv": invoice_id, "pay": payment_id})
+
+
+def override_audit(invoice_id, payment_id):
+    rows = execute_query(
+        "SELECT previous_state, new_state FROM audit_trail "
+        "WHERE customer_id = :cid AND action = 'MANUAL_OVERRIDE' AND entity_id = :eid",
+        {"cid": CUSTOMER_ID, "eid": f"{invoice_id}:{payment_id}"})
+    return [(json.loads(p) if p else None, json.loads(n)) for p, n in rows]
+
+
+def test_override_replaces_a_proposed_pair(client, proposed_pairs):
+    invoice_id, payment_id, match_type = proposed_pairs[0]
+    resp = client.post("/manual-match", json={"customer_id": CUSTOMER_ID, "invoice_id": invoice_id,
+                                              "payment_id": payment_id, "reason": "confirmed by ops"})
+    assert resp.status_code == 200, resp.text
+    assert "replaced the stored match" in resp.json()["message"]
+
+    assert stored(invoice_id, payment_id) == [("MANUAL_OVERRIDE", "FIXED", "confirmed by ops", 1.0)]
+    (previous, new), = override_audit(invoice_id, payment_id)
+    assert previous["match_type"] == match_type and previous["status"] == "PROPOSED"
+    assert new == {"match_type": "MANUAL_OVERRIDE", "status": "FIXED", "reason": "confirmed by ops"}
+    assert client.get(f"/audit/verify/{CUSTOMER_ID}").json()["valid"]
+
+
+def test_bulk_override_mixes_stored_new_and_unknown_pairs(client, proposed_pairs):
+    invoice_id, payment_id, _ = proposed_pairs[1]
+    other_payment = next(p for i, p, _ in proposed_pairs if p != payment_id)
+    resp = client.post("/manual-match/bulk", json={"customer_id": CUSTOMER_ID, "reason": "bulk fix", "links": [
+        {"invoice_ids": [invoice_id], "payment_ids": [payment_id]},
+        {"invoice_ids": [invoice_id], "payment_ids": [other_payment], "reason": "new pair"},
+        {"invoice_ids": ["INV-MISSING"], "payment_ids": [payment_id]},
+    ]})
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert (body["status"], body["applied"], body["failed"]) == ("partial", 2, 1)
+    assert [r["status"] for r in body["results"]] == ["APPLIED", "APPLIED", "FAILED"]
+
+    assert stored(invoice_id, payment_id) == [("MANUAL_OVERRIDE", "FIXED", "bulk fix", 1.0)]
+    assert stored(invoice_id, other_payment) == [("MANUAL_OVERRIDE", "FIXED", "new pair", 1.0)]
+    assert override_audit(invoice_id, payment_id)[0][0]["status"] == "PROPOSED"
+    assert override_audit(invoice_id, other_payment)[0][0] is None
+    assert client.get(f"/audit/verify/{CUSTOMER_ID}").json()["valid"]
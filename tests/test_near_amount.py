@@ -0,0 +1,95 @@
+# File: tests/test_near_amount.py
+import pytest
+
+from backend.agents.amount_index import tolerance_cents
+from backend.agents.matching_agent import MatchingAgent
+from backend.agents.models import CustomerContext, Invoice, MatchSettings, Payment, ReconciliationState
+
+
+def _invoice(invoice_id, amount, vendor="Acme", currency="USD"):
+    return Invoice(invoice_id=invoice_id, amount=amount, currency=currency, vendor_name=vendor,
+                   invoice_date="2024-01-01")
+
+
+def _payment(payment_id, amount, remittance="", sender="Acme", currency="USD"):
+    return Payment(payment_id=payment_id, amount=amount, currency=currency, sender_name=sender,
+                   remittance_raw=remittance, payment_date="2024-01-10")
+
+
+def near_matches(invoices, payments, **settings):
+    state = ReconciliationState(
+        context=CustomerContext(customer_id="CUST-T", tenant_name="Test", settings=MatchSettings(**settings)),
+        invoices=invoices, payments=payments,
+    )
+    MatchingAgent(None).hybrid_match(state)
+    return [m for m in state.matches if m["match_type"] == "AUTO_1_1_TOLERANCE"]
+
+
+@pytest.mark.parametrize("cents, abs_tol, pct_tol, expected", [
+    (10_000, 0.5, 0.0, 50),
+    (10_000, 0.0, 2.0, 200),
+    (10_000, 0.5, 2.0, 200),
+    (1_000, 0.5, 2.0, 50),
+    (-10_000, 0.0, 1.0, 100),
+    (10_000, 0.0, 0.0, 0),
+])
+def test_tolerance_is_the_larger_allowance(cents, abs_tol, pct_tol, expected):
+    assert tolerance_cents(cents, abs_tol, pct_tol) == expected
+
+
+@pytest.mark.parametrize("paid, matched", [(99.50, True), (100.50, True), (99.49, False), (100.51, False)])
+def test_absolute_tolerance_boundary(paid, matched):
+    found = near_matches([_invoice("INV-1", 100.0)], [_payment("PAY-1", paid, "fee for INV-1")],
+                         amount_tolerance_abs=0.5)
+    assert [(m["invoice_id"], m["payment_id"]) for m in found] == ([("INV-1", "PAY-1")] if matched else [])
+
+
+@pytest.mark.parametrize("paid, matched", [(4902.0, True), (4901.0, False)])
+def test_percentage_tolerance_boundary(paid, matched):
+    # 2% of the payment amount: 98.04 allowed on 4902.00, 98.02 on 4901.00
+    found = near_matches([_invoice("INV-1", 5000.0)], [_payment("PAY-1", paid, "INV-1 less 2%")],
+                         amount_tolerance_abs=0.5, amount_tolerance_pct=2.0)
+    assert len(found) == (1 if matched else 0)
+
+
+def test_disabled_without_tolerance():
+    assert near_matches([_invoice("INV-1", 100.0)], [_payment("PAY-1", 99.9, "INV-1")]) == []
+
+
+def test_reference_match_prefers_the_closest_amount():
+    found = near_matches([_invoice("INV-1", 100.0), _invoice("INV-2", 99.0)],
+                         [_payment("PAY-1", 99.2, "INV-1 INV-2")], amount_tolerance_abs=1.0)
+    assert [(m["invoice_id"], m["confidence"]) for m in found] == [("INV-2", 0.88)]
+
+
+def test_referenced_invoice_in_another_currency_is_skipped():
+    found = near_matches([_invoice("INV-1", 100.0, currency="USD")],
+                         [_payment("PAY-1", 99.9, "INV-1", currency="EUR")], amount_tolerance_abs=0.5)
+    assert found == []
+
+
+def test_reference_falls_back_to_the_vendor_invoice_in_the_payment_currency():
+    # The remittance names the USD invoice; the sender's only EUR invoice within tolerance is used instead
+    found = near_matches([_invoice("INV-1", 100.0, currency="USD"), _invoice("INV-2", 100.2, currency="EUR")],
+                         [_payment("PAY-1", 99.9, "INV-1", currency="EUR")], amount_tolerance_abs=0.5)
+    assert [(m["invoice_id"], m["confidence"]) for m in found] == [("INV-2", 0.64)]
+
+
+def test_vendor_candidate_needs_same_vendor_and_currency():
+    invoices = [_invoice("INV-1", 100.0, vendor="Other"), _invoice("INV-2", 100.0, currency="EUR")]
+    assert near_matches(invoices, [_payment("PAY-1", 99.8)], amount_tolerance_abs=0.5) == []
+
+
+def test_ambiguous_vendor_candidates_are_not_matched():
+    invoices = [_invoice("INV-1", 100.0), _invoice("INV-2", 100.3)]
+    assert near_matches(invoices, [_payment("PAY-1", 99.9)], amount_tolerance_abs=0.5) == []
+    found = near_matches(invoices, [_payment("PAY-1", 99.9)], amount_tolerance_abs=0.2)
+    assert [m["invoice_id"] for m in found] == ["INV-1"]
+
+
+def test_exact_matches_are_not_reopened():
+    # INV-1 is settled exactly in Phase 1; the near payment cannot take it again
+    found = near_matches([_invoice("INV-1", 100.0)],
+                         [_payment("PAY-1", 100.0, "INV-1"), _payment("PAY-2", 99.9, "INV-1")],
+                         amount_tolerance_abs=0.5)
+    assert found == []
@@ -0,0 +1,60 @@
+# File: tests/test_reference_index.py
+import pytest
+
+from backend.agents.reference_index import ReferenceIndex
+from benchmarks.bench_reference_extraction import build_tenant, legacy_find
+
+
+@pytest.fixture(scope="module")
+def seeded_refs():
+    """
+    Invoice references and remittances of every tenant in the seeded database.
+    """
+    from db.connection import execute_query
+
+    invoice_by_ref = {}
+    for invoice_id, po_number in execute_query("SELECT invoice_id, po_number FROM invoices ORDER BY invoice_id"):
+        invoice_by_ref[invoice_id] = invoice_id
+        if po_number:
+            invoice_by_ref[po_number] = invoice_id
+    remittances = [r[0] for r in execute_query("SELECT remittance_raw FROM payments ORDER BY payment_id")]
+    return invoice_by_ref, remittances
+
+
+def test_matches_legacy_scan_on_seed_data(seeded_refs):
+    invoice_by_ref, remittances = seeded_refs
+    assert remittances
+    index = ReferenceIndex(invoice_by_ref)
+    for text in remittances:
+        assert index.find(text) == legacy_find(invoice_by_ref, text), text
+
+
+def test_matches_legacy_scan_on_generated_tenant():
+    invoice_by_ref, remittances = build_tenant(2_000)
+    index = ReferenceIndex(invoice_by_ref)
+    assert len(index) == len(invoice_by_ref)
+    for text in remittances:
+        assert index.find(text) == legacy_find(invoice_by_ref, text), text
+
+
+@pytest.mark.parametrize("text", [
+    None,
+    "",
+    "INV-1",
+    "INV-10 and INV-1",
+    "Settles PO-77 / INV-2 / INV-10",
+    "INV-100",
+    "inv-1 lower case",
+    "PO-7",
+])
+def test_overlapping_references(text):
+    # Prefixes of longer references, repeats and PO numbers, in insertion order
+    invoice_by_ref = {"INV-10": 0, "INV-1": 1, "PO-77": 1, "INV-2": 2, "PO-7": 2, "INV-100": 3}
+    index = ReferenceIndex(invoice_by_ref)
+    assert index.find(text) == legacy_find(invoice_by_ref, text)
+
+
+def test_duplicate_references_are_indexed_once():
+    index = ReferenceIndex(["INV-1", "INV-2", "INV-1"])
+    assert len(index) == 2
+    assert index.find("INV-2 then INV-1") == ["INV-1", "INV-2"]
@@ -0,0 +1,103 @@
+# File: tests/test_subset_sum.py
+import itertools
+import random
+
+import pytest
+
+from backend.agents import subset_sum
+from backend.agents.matching_agent import MatchingAgent
+from backend.agents.models import CustomerContext, Invoice, MatchSettings, Payment, ReconciliationState
+from backend.agents.subset_sum import BudgetExceeded, find_subset
+
+
+def brute_force(target, values, max_size, min_size=2):
+    for size in range(min_size, max_size + 1):
+        for combo in itertools.combinations(range(len(values)), size):
+            if sum(values[i] for i in combo) == target:
+                return True
+    return False
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_agrees_with_brute_force(seed):
+    rng = random.Random(seed)
+    values = [rng.randint(1, 50) * 100 + rng.choice((0, 1, 99)) for _ in range(rng.randint(0, 12))]
+    max_size = rng.randint(2, 4)
+    if values and rng.random() < 0.5:
+        # A group that exists
+        picked = rng.sample(range(len(values)), min(len(values), rng.randint(2, max_size)))
+        target = sum(values[i] for i in picked)
+    else:
+        target = rng.randint(1, 20_000)
+
+    found = find_subset(target, values, max_size)
+    if found is None:
+        assert not brute_force(target, values, max_size)
+    else:
+        assert found == sorted(set(found))
+        assert 2 <= len(found) <= max_size
+        assert sum(values[i] for i in found) == target
+
+
+def test_group_size_bounds():
+    values = [500, 300, 200, 100]
+    assert find_subset(500, values, max_size=4) == [1, 2]
+    # 1100 needs all four items
+    assert find_subset(1100, values, max_size=3) is None
+    assert find_subset(1100, values, max_size=4) == [0, 1, 2, 3]
+    # A single matching item is not a group
+    assert find_subset(300, [300, 1000], max_size=4) is None
+    assert find_subset(300, [300, 1000], max_size=4, min_size=1) == [0]
+
+
+@pytest.mark.parametrize("target, values", [(0, [1, 2]), (-5, [1, 2]), (10, [10]), (10, [1, 2, 3]), (10, [])])
+def test_no_group(target, values):
+    assert find_subset(target, values, max_size=4) is None
+
+
+def test_past_deadline_raises():
+    with pytest.raises(BudgetExceeded):
+        find_subset(300, [100, 200], max_size=2, deadline=subset_sum.time.perf_counter() - 1)
+
+
+def test_deadline_checked_during_search(monkeypatch):
+    # Every clock read advances one second; the search must stop part way
+    clock = itertools.count()
+    monkeypatch.setattr(subset_sum.time, "perf_counter", lambda: next(clock))
+    # Even values and an odd target: no group exists, so the whole space is enumerated
+    with pytest.raises(BudgetExceeded):
+        find_subset(41, [2] * 40, max_size=4, deadline=5)
+    assert find_subset(41, [2] * 40, max_size=4) is None
+
+
+def _state(invoices, payments, **settings):
+    return ReconciliationState(
+        context=CustomerContext(customer_id="CUST-T", tenant_name="Test", settings=MatchSettings(**settings)),
+        invoices=invoices, payments=payments,
+    )
+
+
+def _invoice(invoice_id, amount, vendor="Acme", date="2024-01-01"):
+    return Invoice(invoice_id=invoice_id, amount=amount, currency="USD", vendor_name=vendor, invoice_date=date)
+
+
+def _payment(payment_id, amount, sender="Acme", date="2024-01-20"):
+    return Payment(payment_id=payment_id, amount=amount, currency="USD", sender_name=sender,
+                   remittance_raw="garbled", payment_date=date)
+
+
+def test_amount_sum_phase_matches_reference_less_bulk():
+    state = _state([_invoice("INV-1", 100.0), _invoice("INV-2", 250.5), _invoice("INV-3", 75.0)],
+                   [_payment("PAY-1", 325.5)], subset_sum_enabled=True)
+    MatchingAgent(None).hybrid_match(state)
+    assert sorted((m["invoice_id"], m["payment_id"], m["match_type"]) for m in state.matches) == [
+        ("INV-2", "PAY-1", "AUTO_MANY_1"), ("INV-3", "PAY-1", "AUTO_MANY_1"),
+    ]
+
+
+def test_amount_sum_phase_escalates_when_budget_is_spent():
+    state = _state([_invoice("INV-1", 100.0), _invoice("INV-2", 250.5)], [_payment("PAY-1", 350.5)],
+                   subset_sum_enabled=True, subset_time_budget_s=0.0)
+    MatchingAgent(None).hybrid_match(state)
+    assert state.matches == []
+    assert [(h.status, h.data["phase"]) for h in state.history] == [("ESCALATED", "amount_sum")]
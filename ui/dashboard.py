@@ -2,9 +2,47 @@
 import streamlit as st
 import pandas as pd
 import requests
+import time
 
 st.set_page_config(page_title="Reconciliation Dashboard", layout="wide")
 
+API_URL = "http://localhost:8000"
+PAGE_SIZE = 100
+REQUEST_TIMEOUT_S = 30
+# How long one page render follows a running job before asking for a refresh
+JOB_WAIT_S = 300
+
+def fetch_page(run_id, resource, params):
+    """
+    One page of a run's matches / exceptions / audit events from the API.
+    """
+    resp = requests.get(f"{API_URL}/runs/{run_id}/{resource}",
+                        params={k: v for k, v in params.items() if v is not None}, timeout=REQUEST_TIMEOUT_S)
+    resp.raise_for_status()
+    return resp.json()
+
+def paged_items(run_id, resource, params, key):
+    """
+    Returns the current page for `key` and renders Previous/Next buttons.
+    The keyset cursors of visited pages are kept per run and filter set.
+    """
+    filters = repr((run_id, sorted(params.items())))
+    if st.session_state.get(f"{key}_filters") != filters:
+        st.session_state[f"{key}_filters"] = filters
+        st.session_state[f"{key}_cursors"] = [None]
+    cursors = st.session_state[f"{key}_cursors"]
+    page = fetch_page(run_id, resource, dict(params, after=cursors[-1], limit=PAGE_SIZE))
+
+    nav1, nav2, nav3 = st.columns([1, 1, 6])
+    if nav1.button("◀ Previous", key=f"{key}_prev", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    if nav2.button("Next ▶", key=f"{key}_next", disabled=not page['has_more']):
+        cursors.append(page['next_after'])
+        st.rerun()
+    nav3.caption(f"Page {len(cursors)}")
+    return page['items']
+
 st.title("🚀 Bank-Grade Reconciliation AI")
 st.markdown("### Operational Overview & Agentic Metrics")
 
@@ -14,33 +52,65 @@ customer_id = st.sidebar.text_input("Customer ID", value="CUST-1001")
 tenant_name = st.sidebar.text_input("Tenant Name", value="Global Agri-Corp")
 
 if st.sidebar.button("Run Auto-Reconciliation"):
-    with st.spinner("Agents are orchestrating..."):
-        try:
-            response = requests.post("http://localhost:8000/reconcile", json={
-                "customer_id": customer_id,
-                "tenant_name": tenant_name
-            })
-            if response.status_code == 200:
-                st.session_state['reconciliation_data'] = response.json()
-                st.success("Reconciliation Complete!")
-            else:
-                st.error("Failed to run reconciliation.")
-        except Exception as e:
-            st.error(f"Error connecting to backend: {e}")
+    try:
+        # The run happens in a background job; poll it instead of holding one long request open
+        response = requests.post(f"{API_URL}/jobs", json={
+            "customer_id": customer_id,
+            "tenant_name": tenant_name
+        }, timeout=REQUEST_TIMEOUT_S)
+        if response.status_code == 202:
+            st.session_state['reconciliation_job'] = response.json()['job_id']
+            if response.json()['attached']:
+                st.info("A reconciliation for this customer is already running; following it.")
+        else:
+            st.error("Failed to start reconciliation.")
+    except Exception as e:
+        st.error(f"Error connecting to backend: {e}")
+
+if 'reconciliation_job' in st.session_state:
+    job_id = st.session_state['reconciliation_job']
+    progress_bar = st.progress(0.0, text="Queued...")
+    if st.sidebar.button("Cancel Reconciliation"):
+        requests.post(f"{API_URL}/jobs/{job_id}/cancel", timeout=REQUEST_TIMEOUT_S)
+    job = None
+    try:
+        deadline = time.monotonic() + JOB_WAIT_S
+        after = None
+        while time.monotonic() < deadline:
+            job = requests.get(f"{API_URL}/jobs/{job_id}", params={"wait": 10, **({"after": after} if after is not None else {})},
+                               timeout=REQUEST_TIMEOUT_S + 10).json()
+            if job['events']:
+                after = job['events'][-1]['seq']
+                last = job['events'][-1]
+                progress_bar.progress(job['progress'], text=f"{last['stage']}: {last['data']}" if last['data'] else last['stage'])
+            if job['status'] not in ("QUEUED", "RUNNING"):
+                break
+    except Exception as e:
+        st.error(f"Error polling reconciliation job: {e}")
+
+    if job and job['status'] == "SUCCEEDED":
+        del st.session_state['reconciliation_job']
+        progress_bar.empty()
+        summary = requests.get(f"{API_URL}/runs/{job['run_id']}", timeout=REQUEST_TIMEOUT_S)
+        st.session_state['reconciliation_data'] = summary.json()
+        st.success("Reconciliation Complete!")
+    elif job and job['status'] in ("FAILED", "CANCELLED"):
+        del st.session_state['reconciliation_job']
+        st.error(f"Reconciliation {job['status'].lower()}: {job['error']}")
+    elif job:
+        st.warning(f"Still running (job {job_id}); refresh the page to keep following it.")
 
 # Metrics Display
 if 'reconciliation_data' in st.session_state:
+    # Run summary; details are paged from the API
     data = st.session_state['reconciliation_data']
+    run_id = data['run_id']
     
     col1, col2, col3, col4 = st.columns(4)
-    total_inv = len(data['invoices'])
-    total_matches = len(data['matches'])
-    recon_rate = (total_matches / total_inv * 100) if total_inv > 0 else 0
-    
-    col1.metric("Total Invoices", total_inv)
-    col2.metric("Total Payments", len(data['payments']))
-    col3.metric("Auto-Matches", total_matches)
-    col4.metric("Reconciliation Rate", f"{recon_rate:.1f}%")
+    col1.metric("Total Invoices", data['invoices'])
+    col2.metric("Total Payments", data['payments'])
+    col3.metric("Auto-Matches", data['matches'])
+    col4.metric("Reconciliation Rate", f"{data['reconciliation_rate']:.1f}%")
 
     # Layout: Matches and Exceptions
     st.divider()
@@ -49,31 +119,49 @@ if 'reconciliation_data' in st.session_state:
     with tab1:
         if data['matches']:
             st.write("Suggested matches from Hybrid Agent (Rules + Semantics)")
-            df_matches = pd.DataFrame(data['matches'])
-            # Reorder and rename for better visibility
-            cols = ["invoice_id", "invoice_amount", "payment_id", "payment_amount", "confidence", "match_type", "reasons"]
-            df_matches = df_matches[cols]
-            st.dataframe(df_matches.rename(columns={
-                "invoice_id": "Invoice ID",
-                "invoice_amount": "Inv Amount",
-                "payment_id": "Payment ID",
-                "payment_amount": "Pay Amount",
-                "confidence": "Conf",
-                "match_type": "Type",
-                "reasons": "Reasons"
-            }), use_container_width=True)
+            fcol1, fcol2 = st.columns(2)
+            match_type = fcol1.selectbox("Match Type", ["All"] + sorted(data['matches_by_type']))
+            conf_range = fcol2.slider("Confidence", 0.0, 1.0, (0.0, 1.0), step=0.05)
+            matches = paged_items(run_id, "matches", {
+                "match_type": None if match_type == "All" else match_type,
+                "min_confidence": conf_range[0],
+                "max_confidence": conf_range[1]
+            }, key="matches")
+            if matches:
+                df_matches = pd.DataFrame(matches)
+                # Reorder and rename for better visibility
+                cols = ["invoice_id", "invoice_amount", "payment_id", "payment_amount", "confidence", "match_type", "reasons"]
+                df_matches = df_matches[cols]
+                st.dataframe(df_matches.rename(columns={
+                    "invoice_id": "Invoice ID",
+                    "invoice_amount": "Inv Amount",
+                    "payment_id": "Payment ID",
+                    "payment_amount": "Pay Amount",
+                    "confidence": "Conf",
+                    "match_type": "Type",
+                    "reasons": "Reasons"
+                }), use_container_width=True)
+            else:
+                st.write("No matches for these filters.")
         else:
             st.write("No matches found.")
 
     with tab2:
         if data['exceptions']:
             st.write("Exceptions flagged by Classification Agent")
-            st.table(data['exceptions'])
+            fcol1, fcol2 = st.columns(2)
+            exc_type = fcol1.selectbox("Exception Type", ["All"] + sorted(data['exceptions_by_type']))
+            severity = fcol2.selectbox("Severity", ["All"] + sorted(data['exceptions_by_severity']))
+            exceptions = paged_items(run_id, "exceptions", {
+                "type": None if exc_type == "All" else exc_type,
+                "severity": None if severity == "All" else severity
+            }, key="exceptions")
+            st.table([{k: v for k, v in e.items() if k != 'seq'} for e in exceptions])
         else:
             st.write("No exceptions detected.")
 
     with tab3:
         st.write("Immutable Audit Trail (Agent Activity)")
-        st.json(data['audit_trail'])
+        st.json(paged_items(run_id, "audit", {}, key="audit"))
 else:
     st.info("👈 Set customer context and run auto-reconciliation to see results.")
@@ -1,20 +1,53 @@
 # File: ui/pages/audit_viewer.py
 import streamlit as st
 import pandas as pd
+import requests
 
 st.set_page_config(page_title="Audit Viewer", layout="wide")
 
+API_URL = "http://localhost:8000"
+REQUEST_TIMEOUT_S = 30
+PAGE_SIZE = 200
+
+def fetch_audit_page(run_id, after, action=None):
+    params = {"limit": PAGE_SIZE}
+    if after is not None:
+        params["after"] = after
+    if action:
+        params["action"] = action
+    resp = requests.get(f"{API_URL}/runs/{run_id}/audit", params=params, timeout=REQUEST_TIMEOUT_S)
+    resp.raise_for_status()
+    return resp.json()
+
 st.title("📜 Immutable Audit Explorer")
 
 if 'reconciliation_data' not in st.session_state:
     st.warning("No data available. Please run reconciliation first.")
 else:
     data = st.session_state['reconciliation_data']
-    audit_logs = data.get('audit_trail', [])
+    run_id = data['run_id']
     
     st.write("Complete history of agent decisions and manual overrides.")
     
-    search_query = st.text_input("Search audit logs (by ID, Action, or Agent)...")
+    fcol1, fcol2 = st.columns([1, 3])
+    action = fcol1.selectbox("Action", ["All", "AUTO_MATCH", "MANUAL_OVERRIDE"])
+    search_query = fcol2.text_input("Search audit logs (by ID, Action, or Agent)...")
+
+    # Keyset cursors of the visited pages, reset when the run or filter changes
+    if st.session_state.get('audit_view_filter') != (run_id, action):
+        st.session_state['audit_view_filter'] = (run_id, action)
+        st.session_state['audit_view_cursors'] = [None]
+    cursors = st.session_state['audit_view_cursors']
+
+    audit_logs = []
+    has_more = False
+    if action != "MANUAL_OVERRIDE":
+        page = fetch_audit_page(run_id, cursors[-1], None if action == "All" else action)
+        audit_logs = page['items']
+        has_more = page['has_more']
+    if action != "AUTO_MATCH" and len(cursors) == 1:
+        # Overrides made from this session
+        audit_logs = st.session_state.get('manual_overrides', []) + audit_logs
     
     df_audit = pd.DataFrame(audit_logs)
     
@@ -22,7 +55,24 @@ else:
         df_audit = df_audit[df_audit.apply(lambda row: search_query.lower() in str(row).lower(), axis=1)]
         
     st.dataframe(df_audit, use_container_width=True)
+
+    nav1, nav2, nav3 = st.columns([1, 1, 6])
+    if nav1.button("◀ Previous", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    if nav2.button("Next ▶", disabled=not has_more):
+        cursors.append(page['next_after'])
+        st.rerun()
+    nav3.caption(f"Page {len(cursors)}")
     
     if st.button("Export CSV for Compliance"):
-        df_audit.to_csv("reconciliation_audit_export.csv", index=False)
+        # Export every page, not only the one on screen
+        rows, after = list(st.session_state.get('manual_overrides', [])), None
+        while True:
+            page = fetch_audit_page(run_id, after)
+            rows.extend(page['items'])
+            if not page['has_more']:
+                break
+            after = page['next_after']
+        pd.DataFrame(rows).to_csv("reconciliation_audit_export.csv", index=False)
         st.success("Exported to 'reconciliation_audit_export.csv'")
@@ -6,13 +6,50 @@ from datetime import datetime
 
 st.set_page_config(page_title="Manual Reconciliation", layout="wide")
 
+API_URL = "http://localhost:8000"
+REQUEST_TIMEOUT_S = 30
+# Upper bound of open exceptions loaded into the link pickers
+MAX_EXCEPTIONS = 5000
+
+def fetch_exceptions(run_id):
+    """
+    Follows the keyset pages of a run's exceptions.
+    """
+    items, after = [], None
+    while len(items) < MAX_EXCEPTIONS:
+        resp = requests.get(f"{API_URL}/runs/{run_id}/exceptions",
+                            params={"limit": 1000, **({"after": after} if after is not None else {})},
+                            timeout=REQUEST_TIMEOUT_S)
+        resp.raise_for_status()
+        page = resp.json()
+        items.extend({k: v for k, v in e.items() if k != 'seq'} for e in page['items'])
+        if not page['has_more']:
+            break
+        after = page['next_after']
+    return items
+
+def record_override(invoice_id, payment_id, reason=""):
+    # Shown in the Audit Viewer next to the run's agent events
+    st.session_state.setdefault('manual_overrides', []).append({
+        "entity_type": "MATCH",
+        "entity_id": f"{invoice_id}:{payment_id}",
+        "action": "MANUAL_OVERRIDE",
+        "operator": "USER-01",
+        "note": reason,
+        "timestamp": str(datetime.now())
+    })
+
 st.title("⚠️ Exception Management & Manual Override")
 
 if 'reconciliation_data' not in st.session_state:
     st.warning("Please run reconciliation from the Dashboard first.")
 else:
     data = st.session_state['reconciliation_data']
-    exceptions = data.get('exceptions', [])
+    try:
+        exceptions = fetch_exceptions(data['run_id'])
+    except Exception as e:
+        st.error(f"Could not load exceptions for this run: {e}")
+        exceptions = []
     
     if not exceptions:
         st.success("No exceptions found! All items reconciled.")
@@ -54,28 +91,91 @@ else:
         if st.button("Confirm Manual Override"):
             try:
                 # Call real backend persistence
-                resp = requests.post("http://localhost:8000/manual-match", json={
+                resp = requests.post(f"{API_URL}/manual-match", json={
                     "invoice_id": invoice_to_link,
                     "payment_id": payment_to_link,
                     "customer_id": data['context']['customer_id'],
                     "reason": reason
-                })
+                }, timeout=REQUEST_TIMEOUT_S)
                 
                 if resp.status_code == 200:
                     st.success(f"Successfully persisted link: {invoice_to_link} to {payment_to_link} in Oracle 26AI.")
                     st.info("Audit entry created: MANUAL_OVERRIDE by operator.")
                     
                     # Update local session state to reflect the change immediately
-                    data['audit_trail'].append({
-                        "entity_type": "MATCH",
-                        "entity_id": f"{invoice_to_link}:{payment_to_link}",
-                        "action": "MANUAL_OVERRIDE",
-                        "operator": "USER-01",
-                        "note": reason,
-                        "timestamp": str(datetime.now())
-                    })
-                    st.session_state['reconciliation_data'] = data
+                    record_override(invoice_to_link, payment_to_link, reason)
                 else:
                     st.error(f"Failed to persist match: {resp.text}")
             except Exception as e:
                 st.error(f"Backend connection error: {e}")
+
+        st.divider()
+        st.subheader("Bulk Link Action")
+        st.caption("Select one or more invoices and payments to form a link group (1:1, N:1, 1:N or N:M), "
+                   "queue as many groups as needed, then submit them as one batch.")
+
+        if 'pending_links' not in st.session_state:
+            st.session_state['pending_links'] = []
+        pending_links = st.session_state['pending_links']
+        queued_inv = {i for link in pending_links for i in link['invoice_ids']}
+        queued_pay = {p for link in pending_links for p in link['payment_ids']}
+
+        bcol1, bcol2 = st.columns(2)
+        with bcol1:
+            bulk_invoices = st.multiselect("Invoices", [i for i in inv_options if i not in queued_inv])
+        with bcol2:
+            bulk_payments = st.multiselect("Payments", [p for p in pay_options if p not in queued_pay])
+        amounts = {e['entity_id']: e['amount'] for e in exceptions}
+        if bulk_invoices or bulk_payments:
+            st.info(f"Invoices total: {sum(amounts[i] for i in bulk_invoices):,.2f} | "
+                    f"Payments total: {sum(amounts[p] for p in bulk_payments):,.2f}")
+        bulk_reason = st.text_input("Group Reason / Note")
+
+        if st.button("Add Group to Batch", disabled=not (bulk_invoices and bulk_payments)):
+            pending_links.append({"invoice_ids": bulk_invoices, "payment_ids": bulk_payments, "reason": bulk_reason})
+            st.rerun()
+
+        if pending_links:
+            st.dataframe(pd.DataFrame([{
+                "Invoices": ", ".join(link['invoice_ids']),
+                "Payments": ", ".join(link['payment_ids']),
+                "Reason": link['reason']
+            } for link in pending_links]), use_container_width=True)
+
+            scol1, scol2 = st.columns(2)
+            with scol1:
+                submit = st.button(f"Submit {len(pending_links)} Link Group(s)", type="primary")
+            with scol2:
+                if st.button("Clear Batch"):
+                    st.session_state['pending_links'] = []
+                    st.rerun()
+
+            if submit:
+                try:
+                    resp = requests.post(f"{API_URL}/manual-match/bulk", json={
+                        "customer_id": data['context']['customer_id'],
+                        "links": pending_links
+                    }, timeout=REQUEST_TIMEOUT_S)
+                    if resp.status_code == 200:
+                        body = resp.json()
+                        st.success(f"Applied {body['applied']} of {len(pending_links)} link groups in one transaction.")
+                        st.dataframe(pd.DataFrame([{
+                            "Invoices": ", ".join(r['invoice_ids']),
+                            "Payments": ", ".join(r['payment_ids']),
+                            "Status": r['status'],
+                            "Error": r.get('error', "")
+                        } for r in body['results']]), use_container_width=True)
+
+                        # Update local session state to reflect the applied links
+                        for link, r in zip(pending_links, body['results']):
+                            if r['status'] != 'APPLIED': continue
+                            for inv in r['invoice_ids']:
+                                for pay in r['payment_ids']:
+                                    record_override(inv, pay, link['reason'])
+                        st.session_state['pending_links'] = [
+                            link for link, r in zip(pending_links, body['results']) if r['status'] != 'APPLIED'
+                        ]
+                    else:
+                        st.error(f"Failed to persist batch: {resp.text}")
+                except Exception as e:
+                    st.error(f"Backend connection error: {e}")